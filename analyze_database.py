@@ -67,7 +67,7 @@ def test_models_compatibility():
             rdv_count = RendezVous.objects.count()
             print(f"   ✅ {rdv_count} RDV trouvés")
             if rdv_count > 0:
-                rdv = RendezVous.objects.first()
+                rdv = RendezVous.objects.select_related('patient').first()
                 print(f"   Premier: {rdv.patient} - {rdv.date_heure}")
         except Exception as e:
             print(f"   ❌ Erreur RendezVous: {e}")
@@ -102,7 +102,7 @@ def test_models_compatibility():
             cert_count = CertificatMedical.objects.count()
             print(f"   ✅ {cert_count} certificats trouvés")
             if cert_count > 0:
-                cert = CertificatMedical.objects.first()
+                cert = CertificatMedical.objects.select_related('patient').first()
                 print(f"   Premier: {cert.numero_certificat} - {cert.patient}")
         except Exception as e:
             print(f"   ❌ Erreur CertificatMedical: {e}")
@@ -125,7 +125,8 @@ def show_sample_data():
         
         # Échantillon de RDV
         print("\n📅 Échantillons de RDV:")
-        rdvs = RendezVous.objects.all()[:3]
+        # Patient chargé par jointure : une requête au lieu d'une par RDV
+        rdvs = RendezVous.objects.select_related('patient')[:3]
         for rdv in rdvs:
             print(f"   - {rdv.date_heure.strftime('%d/%m/%Y %H:%M')} - {rdv.patient} - {rdv.statut}")
         
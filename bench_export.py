@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark de l'export CSV en flux : mémoire résidente pendant l'export
+
+Usage:
+    python bench_export.py [factures|consultations|patients] [--annee AAAA]
+
+Le RSS est relevé tous les 100 000 lignes : il doit rester plat quel que
+soit le volume (charger un jeu de données d'un million de lignes avant).
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import django
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from core.services.export import EXPORTS, lignes_csv
+
+INTERVALLE_MESURE = 100_000
+
+
+def rss_mo():
+    """Mémoire résidente actuelle du processus (Mo)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        # Hors Linux : pic de mémoire seulement
+        pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pic / (1024 * 1024) if sys.platform == 'darwin' else pic / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mémoire de l'export CSV")
+    parser.add_argument('modele', nargs='?', default='factures', choices=list(EXPORTS))
+    parser.add_argument('--annee', type=int)
+    args = parser.parse_args()
+
+    print(f"=== BENCHMARK EXPORT {args.modele.upper()} ===")
+    rss_initial = rss_mo()
+    print(f"RSS initial: {rss_initial:.1f} Mo")
+
+    debut = time.perf_counter()
+    octets = 0
+    lignes = 0
+    mesures = []
+    for ligne in lignes_csv(args.modele, args.annee):
+        octets += len(ligne)
+        lignes += 1
+        if lignes % INTERVALLE_MESURE == 0:
+            mesures.append((lignes, rss_mo()))
+            print(f"  {lignes:>10} lignes - RSS {mesures[-1][1]:.1f} Mo")
+    duree = time.perf_counter() - debut
+
+    rss_final = rss_mo()
+    print(f"\n✅ {lignes - 2} lignes, {octets / (1024 * 1024):.1f} Mo de CSV en {duree:.2f}s "
+          f"({(lignes - 2) / duree:.0f} lignes/s)" if duree > 0 else "")
+    print(f"📊 RSS final: {rss_final:.1f} Mo (+{rss_final - rss_initial:.1f} Mo)")
+    if mesures:
+        ecart = max(rss for _, rss in mesures) - min(rss for _, rss in mesures)
+        print(f"📈 Variation du RSS pendant l'export: {ecart:.1f} Mo")
+
+
+if __name__ == '__main__':
+    main()
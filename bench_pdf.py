@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Benchmark du rendu des certificats PDF : ms par PDF, sans et avec gabarits
+
+Usage:
+    python bench_pdf.py [--nombre 1000] [--police chemin.ttf] [--logo chemin.png]
+
+« sans gabarit » reconstruit tout à chaque certificat, comme avant :
+lecture de CabinetConfig, police, logo, styles et en-tête.
+« avec gabarit » ne met en page que les paragraphes du patient.
+Les certificats sont ceux de la base (générer des données avec
+`python manage_erp.py demo --scale 2000` si besoin), relus en boucle.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import django
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.test import override_settings
+
+from core.models_certificates import CertificatMedical
+from core.services import rendu_pdf, travaux_pdf
+
+
+def certificats(nombre):
+    return list(CertificatMedical.objects.select_related('patient').order_by('pk')[:nombre])
+
+
+def sans_gabarit(certificat):
+    rendu_pdf.vider_caches()
+    rendu_pdf._police.cache_clear()
+    valeurs = travaux_pdf.donnees_certificat(certificat, travaux_pdf._lire_cabinet())
+    return rendu_pdf.rendre('certificat', valeurs)
+
+
+def avec_gabarit(certificat):
+    valeurs = travaux_pdf.donnees_certificat(certificat, travaux_pdf.donnees_cabinet())
+    return rendu_pdf.rendre('certificat', valeurs)
+
+
+def mesurer(fonction, liste, nombre):
+    durees = []
+    for rang in range(nombre):
+        debut = time.perf_counter()
+        fonction(liste[rang % len(liste)])
+        durees.append((time.perf_counter() - debut) * 1000)
+    return statistics.mean(durees), statistics.median(durees)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du rendu des certificats PDF")
+    parser.add_argument('--nombre', type=int, default=1000)
+    parser.add_argument('--police', default='', help="Police TrueType de l'en-tête (PDF_POLICE)")
+    parser.add_argument('--logo', default='', help="Logo du cabinet (PDF_LOGO)")
+    args = parser.parse_args()
+
+    liste = certificats(args.nombre)
+    if not liste:
+        print("❌ Aucun certificat en base")
+        sys.exit(1)
+
+    with override_settings(PDF_POLICE=args.police, PDF_LOGO=args.logo):
+        travaux_pdf.invalider_cabinet()
+        print(f"=== BENCHMARK PDF ({args.nombre} certificats, {len(liste)} distincts) ===")
+        for titre, fonction in (('sans gabarit', sans_gabarit), ('avec gabarit', avec_gabarit)):
+            fonction(liste[0])  # échauffement (imports, polices standard)
+            moyenne, mediane = mesurer(fonction, liste, args.nombre)
+            print(f"{titre:<14} {moyenne:7.2f} ms/PDF (médiane {mediane:.2f} ms)")
+        travaux_pdf.invalider_cabinet()
+
+
+if __name__ == '__main__':
+    main()
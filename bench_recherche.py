@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Benchmark de la recherche de patients : latence par saisie (p50 / p95 / p99)
+
+Usage:
+    python bench_recherche.py [--requetes 500] [--comparer]
+
+Les saisies sont des préfixes de 2 à 5 lettres de noms et prénoms réels,
+seuls ou combinés (« ben sa »), comme pendant une frappe au clavier, et
+pour une sur cinq un CIN complet (saisie très sélective).
+--comparer mesure aussi l'ancienne recherche par icontains.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import django
+
+# Configuration Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db.models import Q
+
+from core.models import Patient
+from core.services.recherche_patients import LIMITE, rechercher
+
+
+def saisies(nombre, graine=1):
+    """Préfixes tirés d'un échantillon de patients"""
+    rng = random.Random(graine)
+    dernier = Patient.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    echantillon = list(
+        Patient.objects.filter(pk__in=[rng.randint(1, dernier) for _ in range(nombre * 2)])
+        .values_list('nom', 'prenom', 'cin')[:nombre]
+    )
+    resultat = []
+    for nom, prenom, cin in echantillon:
+        if cin and rng.random() < 0.2:
+            resultat.append(cin)
+            continue
+        saisie = nom[:rng.randint(2, 5)]
+        if rng.random() < 0.4:
+            saisie += ' ' + prenom[:rng.randint(1, 3)]
+        resultat.append(saisie)
+    return resultat
+
+
+def icontains(q):
+    filtre = Q()
+    for mot in q.split():
+        filtre &= Q(nom__icontains=mot) | Q(prenom__icontains=mot) | Q(telephone__icontains=mot) | Q(cin__icontains=mot)
+    return list(Patient.objects.filter(filtre).values('id', 'nom', 'prenom')[:LIMITE])
+
+
+def mesurer(fonction, requetes):
+    durees = []
+    for q in requetes:
+        debut = time.perf_counter()
+        fonction(q)
+        durees.append((time.perf_counter() - debut) * 1000)
+    centiles = statistics.quantiles(durees, n=100)
+    return {'p50': centiles[49], 'p95': centiles[94], 'p99': centiles[98], 'max': max(durees)}
+
+
+def afficher(titre, mesure):
+    print(f"{titre:<12} p50 {mesure['p50']:7.2f} ms   p95 {mesure['p95']:7.2f} ms   "
+          f"p99 {mesure['p99']:7.2f} ms   max {mesure['max']:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la recherche de patients")
+    parser.add_argument('--requetes', type=int, default=500)
+    parser.add_argument('--comparer', action='store_true', help="Mesure aussi la recherche par icontains")
+    args = parser.parse_args()
+
+    total = Patient.objects.count()
+    requetes = saisies(args.requetes)
+    if len(requetes) < 2:
+        print("❌ Pas assez de patients pour le benchmark")
+        sys.exit(1)
+
+    print(f"=== BENCHMARK RECHERCHE PATIENTS ({total:,} patients, {len(requetes)} saisies) ===")
+    rechercher(requetes[0])  # échauffement du cache de pages
+    afficher('index', mesurer(rechercher, requetes))
+    if args.comparer:
+        afficher('icontains', mesurer(icontains, requetes[:max(2, len(requetes) // 10)]))
+
+
+if __name__ == '__main__':
+    main()
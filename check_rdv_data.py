@@ -11,6 +11,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
 from core.models import RendezVous, Patient, Consultation, Facture
+from core.services.periodes import filtre_periode
 from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Count
@@ -38,10 +39,10 @@ def main():
         print(f"{statut['statut']}: {statut['nombre']} ({pourcentage:.1f}%)")
     
     # RDV du mois en cours
-    today = timezone.now().date()
+    today = timezone.localdate()
     debut_mois = today.replace(day=1)
     rdv_mois = RendezVous.objects.filter(
-        date_heure__date__range=[debut_mois, today]
+        filtre_periode(RendezVous, 'date_heure', debut_mois, today + timedelta(days=1))
     )
     
     print(f"\n=== RDV DU MOIS ACTUEL ({debut_mois} à {today}) ===")
@@ -66,7 +67,7 @@ def main():
     
     # Derniers RDV
     print(f"\n=== DERNIERS RDV ===")
-    derniers_rdv = RendezVous.objects.order_by('-date_creation')[:5]
+    derniers_rdv = RendezVous.objects.select_related('patient').order_by('-date_creation')[:5]
     for rdv in derniers_rdv:
         print(f"  {rdv.date_heure.strftime('%d/%m/%Y %H:%M')} - {rdv.patient} - {rdv.statut}")
 
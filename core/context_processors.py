@@ -0,0 +1,17 @@
+"""
+Processeurs de contexte, à déclarer dans TEMPLATES['OPTIONS']['context_processors']:
+
+    'core.context_processors.alertes',
+"""
+
+from django.utils.functional import SimpleLazyObject
+
+from core.services import flux_alertes
+
+
+def alertes(request):
+    """
+    Badge des alertes non lues de l'en-tête : {{ alertes_non_lues.total }},
+    {{ alertes_non_lues.critique }}... Lu seulement si le gabarit l'affiche.
+    """
+    return {'alertes_non_lues': SimpleLazyObject(flux_alertes.compteurs)}
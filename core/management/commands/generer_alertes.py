@@ -0,0 +1,40 @@
+"""
+Génération des alertes (factures impayées, rappels de RDV, certificats expirés)
+
+Usage:
+    python manage.py generer_alertes                    # une fois (cron)
+    python manage.py generer_alertes --boucle --intervalle 300
+"""
+
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services import alertes
+
+
+class Command(BaseCommand):
+    help = "Crée les nouvelles alertes et expire les alertes dépassées"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--boucle', action='store_true', help="Relancer indéfiniment (Ctrl+C pour arrêter)")
+        parser.add_argument('--intervalle', type=int, default=alertes.INTERVALLE,
+                            help="Secondes entre deux générations avec --boucle")
+
+    def handle(self, *args, **options):
+        if options['intervalle'] <= 0:
+            raise CommandError("--intervalle doit être positif")
+
+        if options['boucle']:
+            self.stdout.write(f"🔔 Génération des alertes toutes les {options['intervalle']} s")
+            try:
+                alertes.boucle(options['intervalle'], threading.Event())
+            except KeyboardInterrupt:
+                self.stdout.write("⏹️  Arrêt")
+            return
+
+        resultat = alertes.generer()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultat['candidates']} alerte(s) candidate(s) (doublons ignorés), {resultat['expirees']} expirée(s), "
+            f"{resultat['escaladees']} escaladée(s)"
+        ))
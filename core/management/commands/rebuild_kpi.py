@@ -0,0 +1,34 @@
+"""
+Reconstruction de la table de cumul journalier des KPI
+
+Usage:
+    python manage.py rebuild_kpi
+    python manage.py rebuild_kpi --debut 2024-01-01 --fin 2025-01-01
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.kpi_journalier import reconstruire
+
+
+class Command(BaseCommand):
+    help = "Recalcule core_kpi_daily à partir des données brutes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Premier jour inclus (AAAA-MM-JJ)")
+        parser.add_argument('--fin', help="Dernier jour exclu (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        if bool(options['debut']) != bool(options['fin']):
+            raise CommandError("--debut et --fin doivent être fournis ensemble")
+
+        try:
+            debut = date.fromisoformat(options['debut']) if options['debut'] else None
+            fin = date.fromisoformat(options['fin']) if options['fin'] else None
+        except ValueError as e:
+            raise CommandError(f"Date invalide: {e}")
+
+        jours = reconstruire(debut, fin)
+        self.stdout.write(self.style.SUCCESS(f"✅ {jours} jour(s) de KPI recalculé(s)"))
@@ -0,0 +1,77 @@
+"""
+Journal d'audit de chaque requête HTTP
+
+Après la réponse, une entrée (utilisateur, méthode, chemin, vue, statut,
+durée, adresse IP) est déposée dans la file de core.services.audit,
+écrite par lots hors de la requête. Le middleware ne provoque aucune
+requête SQL : l'utilisateur n'est relevé que s'il a déjà été chargé
+pendant la requête (vues protégées par login_required, notamment).
+
+Réglages (settings):
+    AUDIT_ACTIF    actif si vrai (défaut: True)
+    AUDIT_EXCLURE  préfixes de chemins non audités (défaut: /static/, /media/, /metrics)
+
+    MIDDLEWARE += ['core.middleware_audit.AuditMiddleware']  # après AuthenticationMiddleware
+"""
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+
+from core.services import audit
+
+EXCLURE = ('/static/', '/media/', '/metrics')
+
+
+def entree_audit(request, response, duree_ms):
+    """Valeurs simples de l'entrée, sans requête SQL"""
+    # Utilisateur déjà chargé par AuthenticationMiddleware et la vue, sinon inconnu
+    utilisateur = request.__dict__.get('_cached_user')
+    correspondance = getattr(request, 'resolver_match', None)
+    return {
+        'date': timezone.now(),
+        'utilisateur_id': utilisateur.pk if utilisateur is not None and utilisateur.is_authenticated else None,
+        'methode': request.method[:8],
+        'chemin': request.path[:500],
+        'vue': (correspondance.view_name or correspondance.route)[:200] if correspondance else '',
+        'statut': response.status_code,
+        'duree_ms': round(duree_ms),
+        'adresse_ip': request.META.get('REMOTE_ADDR') or None,
+    }
+
+
+class AuditMiddleware:
+    """Trace chaque requête dans le journal d'audit, sans écriture pendant la requête"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.actif = getattr(settings, 'AUDIT_ACTIF', True)
+        self.exclure = tuple(getattr(settings, 'AUDIT_EXCLURE', EXCLURE))
+        self.asynchrone = iscoroutinefunction(get_response)
+        if self.asynchrone:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asynchrone:
+            return self.__acall__(request)
+        if not self.actif or request.path.startswith(self.exclure):
+            return self.get_response(request)
+
+        debut = time.perf_counter()
+        response = self.get_response(request)
+        audit.enregistrer(entree_audit(request, response, (time.perf_counter() - debut) * 1000))
+        return response
+
+    async def __acall__(self, request):
+        if not self.actif or request.path.startswith(self.exclure):
+            return await self.get_response(request)
+
+        debut = time.perf_counter()
+        response = await self.get_response(request)
+        audit.enregistrer(entree_audit(request, response, (time.perf_counter() - debut) * 1000))
+        return response
@@ -0,0 +1,136 @@
+"""
+Mesure des temps de réponse et des requêtes SQL, par vue
+
+Pour chaque requête HTTP : durée totale, temps SQL et nombre de requêtes
+SQL, enregistrés dans les histogrammes de la vue (core.services.metriques),
+exposés par /metrics et résumés par `manage_erp.py perf`. Les requêtes SQL
+plus lentes que PERF_SEUIL_SQL_MS sont relevées avec leur empreinte et la
+ligne du code applicatif qui les a lancées ; les vues plus lentes que
+PERF_SEUIL_VUE_MS sont signalées dans le journal 'core.performance'.
+
+Les vues asynchrones (recherche de patients) restent asynchrones : seule
+leur durée totale est mesurée, leurs requêtes SQL s'exécutant dans un
+autre thread.
+
+Les vues sont identifiées par leur nom d'URL (ou leur route), jamais par
+le chemin : /patients/12/ et /patients/13/ sont la même vue.
+
+Réglages (settings):
+    PERF_ACTIF          actif si vrai (défaut: True)
+    PERF_SEUIL_SQL_MS   requête SQL lente (défaut: 100)
+    PERF_SEUIL_VUE_MS   vue lente (défaut: 1000)
+    PERF_ECRITURE_S     intervalle d'écriture de l'instantané (défaut: 10)
+
+    MIDDLEWARE += ['core.middleware_performance.PerformanceMiddleware']
+"""
+
+import atexit
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from core.middleware_requetes import _origine
+from core.services import metriques
+
+logger = logging.getLogger('core.performance')
+
+SEUIL_SQL_MS = 100
+SEUIL_VUE_MS = 1000
+ECRITURE_S = 10
+
+NON_RESOLUE = '<non résolue>'
+
+
+def nom_vue(request):
+    """Nom d'URL de la vue (ou sa route), indépendant des paramètres du chemin"""
+    correspondance = getattr(request, 'resolver_match', None)
+    if correspondance is None:
+        return f'{request.method} {NON_RESOLUE}'
+    return f'{request.method} {correspondance.view_name or correspondance.route}'
+
+
+class _ChronometreSql:
+    """execute_wrapper qui cumule le temps SQL et relève les requêtes lentes"""
+
+    def __init__(self, request, seuil_ms):
+        self.request = request
+        self.seuil_ms = seuil_ms
+        self.requetes = 0
+        self.duree_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree_ms = (time.perf_counter() - debut) * 1000
+            self.requetes += 1
+            self.duree_ms += duree_ms
+            if duree_ms >= self.seuil_ms:
+                metriques.registre.observer_requete_lente(sql, duree_ms, nom_vue(self.request), _origine())
+
+
+class PerformanceMiddleware:
+    """Histogrammes par vue (durée, temps SQL, nombre de requêtes) et requêtes SQL lentes"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.actif = getattr(settings, 'PERF_ACTIF', True)
+        self.seuil_sql = getattr(settings, 'PERF_SEUIL_SQL_MS', SEUIL_SQL_MS)
+        self.seuil_vue = getattr(settings, 'PERF_SEUIL_VUE_MS', SEUIL_VUE_MS)
+        self.ecriture = getattr(settings, 'PERF_ECRITURE_S', ECRITURE_S)
+        self.derniere_ecriture = time.monotonic()
+        self.asynchrone = iscoroutinefunction(get_response)
+        if self.asynchrone:
+            markcoroutinefunction(self)
+        if self.actif:
+            atexit.register(self._enregistrer)
+
+    def __call__(self, request):
+        if self.asynchrone:
+            return self.__acall__(request)
+        if not self.actif:
+            return self.get_response(request)
+
+        debut = time.perf_counter()
+        chronometre = _ChronometreSql(request, self.seuil_sql)
+        with ExitStack() as pile:
+            for alias in connections:
+                pile.enter_context(connections[alias].execute_wrapper(chronometre))
+            response = self.get_response(request)
+        self._observer(request, debut, chronometre.duree_ms, chronometre.requetes)
+        return response
+
+    async def __acall__(self, request):
+        if not self.actif:
+            return await self.get_response(request)
+        debut = time.perf_counter()
+        response = await self.get_response(request)
+        self._observer(request, debut)
+        return response
+
+    def _observer(self, request, debut, sql_ms=None, requetes=None):
+        duree_ms = (time.perf_counter() - debut) * 1000
+        vue = nom_vue(request)
+        metriques.registre.observer_vue(vue, duree_ms, sql_ms, requetes)
+        if duree_ms >= self.seuil_vue:
+            logger.warning(
+                "Vue lente: %s %s en %.0f ms (%s requête(s) SQL, %s ms)", vue, request.path, duree_ms,
+                '?' if requetes is None else requetes, '?' if sql_ms is None else f'{sql_ms:.0f}',
+            )
+        if time.monotonic() - self.derniere_ecriture >= self.ecriture:
+            self._enregistrer()
+
+    def _enregistrer(self):
+        self.derniere_ecriture = time.monotonic()
+        try:
+            metriques.enregistrer()
+        except OSError as e:
+            logger.warning("Instantané des métriques non écrit: %s", e)
@@ -0,0 +1,110 @@
+"""
+Détection des requêtes SQL répétées (N+1) pendant le développement
+
+Pendant chaque requête HTTP, les requêtes SQL sont regroupées par forme :
+le SQL paramétré tel que l'envoie l'ORM, les listes IN (%s, %s, ...)
+ramenées à une seule forme. Une forme exécutée au moins NPLUS1_SEUIL fois
+est signalée dans le journal 'core.nplus1', avec la ligne du code
+applicatif qui l'a déclenchée, ou lève RequetesRepeteesError si
+NPLUS1_LEVER est vrai (pratique dans les tests).
+
+Réglages (settings):
+    NPLUS1_DETECTION  actif si vrai (par défaut: DEBUG)
+    NPLUS1_SEUIL      répétitions tolérées d'une même forme (défaut: 5)
+    NPLUS1_LEVER      lever une exception plutôt que journaliser
+
+    MIDDLEWARE += ['core.middleware_requetes.DetecteurRequetesRepeteesMiddleware']
+"""
+
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.nplus1')
+
+SEUIL_DEFAUT = 5
+
+_LISTE_PARAMETRES = re.compile(r'\((?:%s, )+%s\)')
+
+
+class RequetesRepeteesError(Exception):
+    """Une même forme de requête SQL a été exécutée trop de fois dans une requête HTTP"""
+
+
+def forme_sql(sql):
+    """Forme d'une requête : SQL paramétré, listes IN ramenées à (%s...)"""
+    return _LISTE_PARAMETRES.sub('(%s...)', sql)
+
+
+def _origine():
+    """Première ligne de la pile hors de Django et des bibliothèques installées"""
+    for cadre in reversed(traceback.extract_stack()[:-3]):
+        chemin = cadre.filename
+        if f'{os.sep}django{os.sep}' not in chemin and 'site-packages' not in chemin and chemin != __file__:
+            return f'{chemin}:{cadre.lineno} ({cadre.name})'
+    return 'inconnue'
+
+
+class _Compteur:
+    """execute_wrapper qui compte les formes et note l'origine de la première répétition suspecte"""
+
+    def __init__(self, seuil):
+        self.seuil = seuil
+        self.formes = Counter()
+        self.origines = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        forme = forme_sql(sql)
+        self.formes[forme] += 1
+        # La pile n'est relevée qu'une fois par forme suspecte
+        if self.formes[forme] == self.seuil:
+            self.origines[forme] = _origine()
+        return execute(sql, params, many, context)
+
+    def repetitions(self):
+        return [
+            (forme, nombre, self.origines.get(forme, 'inconnue'))
+            for forme, nombre in self.formes.most_common()
+            if nombre >= self.seuil
+        ]
+
+
+class DetecteurRequetesRepeteesMiddleware:
+    """Signale les formes de requêtes SQL répétées au sein d'une même requête HTTP"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.actif = getattr(settings, 'NPLUS1_DETECTION', settings.DEBUG)
+        self.seuil = getattr(settings, 'NPLUS1_SEUIL', SEUIL_DEFAUT)
+        self.lever = getattr(settings, 'NPLUS1_LEVER', False)
+
+    def __call__(self, request):
+        if not self.actif:
+            return self.get_response(request)
+
+        compteur = _Compteur(self.seuil)
+        with ExitStack() as pile:
+            for alias in connections:
+                pile.enter_context(connections[alias].execute_wrapper(compteur))
+            response = self.get_response(request)
+
+        repetitions = compteur.repetitions()
+        if repetitions:
+            self._signaler(request, repetitions)
+        return response
+
+    def _signaler(self, request, repetitions):
+        lignes = [
+            f"{nombre} x {forme[:300]}\n    depuis {origine}"
+            for forme, nombre, origine in repetitions
+        ]
+        message = f"Requêtes SQL répétées sur {request.method} {request.path}:\n" + "\n".join(lignes)
+        if self.lever:
+            raise RequetesRepeteesError(message)
+        logger.warning(message)
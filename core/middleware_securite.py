@@ -0,0 +1,87 @@
+"""
+Limitation du nombre de requêtes par adresse IP
+
+Chaque requête est comptée pour son adresse par core.services.limitation
+(fenêtre glissante, mémoire fixe par adresse) ; au-delà de LIMITE_REQUETES
+requêtes sur LIMITE_FENETRE_S secondes, la réponse est un 429 avec
+l'en-tête Retry-After. Les requêtes refusées comptent aussi : une adresse
+qui insiste reste bloquée jusqu'à ce qu'elle ralentisse.
+
+Complète django.middleware.security.SecurityMiddleware (en-têtes HTTP),
+qu'il ne remplace pas. Avec plusieurs workers gunicorn, LIMITE_BACKEND
+'sqlite' (une machine) ou 'cache' (Redis) partage les compteurs.
+
+Derrière un proxy, REMOTE_ADDR est celle du proxy : LIMITE_EN_TETE_IP
+désigne l'en-tête qu'il renseigne ('HTTP_X_FORWARDED_FOR' par exemple),
+dont seule la dernière adresse, ajoutée par le proxy, est retenue.
+
+Réglages (settings), en plus de ceux de core.services.limitation:
+    LIMITE_ACTIF        actif si vrai (défaut: True)
+    LIMITE_EXCLURE      préfixes de chemins non limités (défaut: /static/, /media/)
+    LIMITE_EN_TETE_IP   en-tête de l'adresse du client (défaut: REMOTE_ADDR)
+
+    MIDDLEWARE += ['core.middleware_securite.SecurityMiddleware']  # avant AuthenticationMiddleware
+"""
+
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+
+from core.services import limitation
+
+logger = logging.getLogger('core.securite')
+
+EXCLURE = ('/static/', '/media/')
+
+
+def adresse_client(request, en_tete='REMOTE_ADDR'):
+    valeur = request.META.get(en_tete) or request.META.get('REMOTE_ADDR') or ''
+    return valeur.rsplit(',', 1)[-1].strip()
+
+
+class SecurityMiddleware:
+    """Rate limiting par IP : 429 au-delà de la limite de la fenêtre glissante"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.actif = getattr(settings, 'LIMITE_ACTIF', True)
+        self.exclure = tuple(getattr(settings, 'LIMITE_EXCLURE', EXCLURE))
+        self.en_tete = getattr(settings, 'LIMITE_EN_TETE_IP', 'REMOTE_ADDR')
+        self.limiteur = limitation.limiteur_configure() if self.actif else None
+        # Compteurs du processus : quelques microsecondes, moins qu'un passage par un thread
+        self.direct = self.limiteur is None or isinstance(self.limiteur, limitation.LimiteurMemoire)
+        self.asynchrone = iscoroutinefunction(get_response)
+        if self.asynchrone:
+            markcoroutinefunction(self)
+
+    def _refus(self, request):
+        """Réponse 429 si l'adresse a dépassé sa limite, None sinon"""
+        if not self.actif or request.path.startswith(self.exclure):
+            return None
+        adresse = adresse_client(request, self.en_tete)
+        decision = self.limiteur.verifier(adresse)
+        if decision.autorise:
+            return None
+        logger.info("Requête refusée pour %s: %s %s", adresse, request.method, request.path)
+        response = HttpResponse("Trop de requêtes, réessayez plus tard.", status=429,
+                                content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(limitation.en_secondes(decision.reessayer_dans))
+        return response
+
+    def __call__(self, request):
+        if self.asynchrone:
+            return self.__acall__(request)
+        return self._refus(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.direct:
+            refus = self._refus(request)
+        else:
+            # SQLite ou cache : une attente d'E/S (verrou, réseau) ne doit pas bloquer la boucle d'événements
+            refus = await sync_to_async(self._refus, thread_sensitive=False)(request)
+        return refus or await self.get_response(request)
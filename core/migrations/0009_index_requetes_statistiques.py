@@ -0,0 +1,33 @@
+# Index composites pour les requêtes de statistiques et de santé du système
+
+from django.db import migrations
+
+
+INDEX = [
+    ('core_rdv_statut_date_idx', 'core_rendezvous', ('statut', 'date_heure')),
+    ('core_facture_date_statut_idx', 'core_facture', ('date_facture', 'statut')),
+    ('core_consultation_date_idx', 'core_consultation', ('date_consultation',)),
+    ('core_alerte_statut_prio_exp_idx', 'core_alerte', ('statut', 'priorite', 'date_expiration')),
+]
+
+
+def creer_index(nom, table, colonnes):
+    liste = ', '.join(f'"{colonne}"' for colonne in colonnes)
+    return f'CREATE INDEX IF NOT EXISTS "{nom}" ON "{table}" ({liste});'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alerte_remove_alerterappel_patient_and_more'),
+    ]
+
+    # RunSQL plutôt qu'AddIndex : les index ne concernent que le plan
+    # d'exécution et ne modifient pas l'état des modèles
+    operations = [
+        migrations.RunSQL(
+            sql=creer_index(nom, table, colonnes),
+            reverse_sql=f'DROP INDEX IF EXISTS "{nom}";',
+        )
+        for nom, table, colonnes in INDEX
+    ]
@@ -0,0 +1,18 @@
+# Index sur la date des rendez-vous pour les filtres de période tous statuts confondus
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_index_requetes_statistiques'),
+    ]
+
+    # L'index (statut, date_heure) ne sert pas les requêtes sans filtre de statut
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS "core_rdv_date_idx" ON "core_rendezvous" ("date_heure");',
+            reverse_sql='DROP INDEX IF EXISTS "core_rdv_date_idx";',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Table de cumul journalier des KPI
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_index_rendezvous_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KPIJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(unique=True, verbose_name='Jour')),
+                ('consultations', models.PositiveIntegerField(default=0, verbose_name='Consultations')),
+                ('revenus_ht', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Revenus HT')),
+                ('revenus_tva', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='TVA')),
+                ('revenus_ttc', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Revenus TTC')),
+                ('nouveaux_patients', models.PositiveIntegerField(default=0, verbose_name='Nouveaux patients')),
+                ('rdv_prevus', models.PositiveIntegerField(default=0, verbose_name='RDV prévus')),
+                ('rdv_confirmes', models.PositiveIntegerField(default=0, verbose_name='RDV confirmés')),
+                ('rdv_termines', models.PositiveIntegerField(default=0, verbose_name='RDV terminés')),
+                ('rdv_annules', models.PositiveIntegerField(default=0, verbose_name='RDV annulés')),
+                ('rdv_absents', models.PositiveIntegerField(default=0, verbose_name='RDV absents')),
+                ('certificats', models.PositiveIntegerField(default=0, verbose_name='Certificats émis')),
+                ('date_maj', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+            ],
+            options={
+                'verbose_name': 'KPI journalier',
+                'verbose_name_plural': 'KPI journaliers',
+                'db_table': 'core_kpi_daily',
+                'ordering': ['jour'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Index de la pagination par clé de la liste des patients (nom, prénom, id)
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_kpijournalier'),
+    ]
+
+    # Sans lui, chaque page trie toute la table pour reprendre après la clé
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS "core_patient_nom_prenom_idx" ON "core_patient" ("nom", "prenom", "id");',
+            reverse_sql='DROP INDEX IF EXISTS "core_patient_nom_prenom_idx";',
+        ),
+    ]
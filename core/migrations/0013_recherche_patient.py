@@ -0,0 +1,95 @@
+# Index plein texte de la recherche de patients (nom, prénom, téléphone, CIN)
+#
+# SQLite : table virtuelle FTS5 à contenu externe, tenue à jour par triggers,
+# tokenizer unicode61 sans diacritiques (« Hélène » = « helene »).
+# PostgreSQL : colonne tsvector générée (unaccent, config 'simple') + index GIN.
+# Les autres moteurs gardent la recherche par icontains.
+
+from django.db import migrations
+
+SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS "core_patient_fts" USING fts5(
+        nom, prenom, telephone, cin,
+        content='core_patient', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "core_patient_fts_ai" AFTER INSERT ON "core_patient" BEGIN
+        INSERT INTO core_patient_fts(rowid, nom, prenom, telephone, cin)
+        VALUES (new.id, new.nom, new.prenom, new.telephone, new.cin);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "core_patient_fts_ad" AFTER DELETE ON "core_patient" BEGIN
+        INSERT INTO core_patient_fts(core_patient_fts, rowid, nom, prenom, telephone, cin)
+        VALUES ('delete', old.id, old.nom, old.prenom, old.telephone, old.cin);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "core_patient_fts_au" AFTER UPDATE OF nom, prenom, telephone, cin ON "core_patient" BEGIN
+        INSERT INTO core_patient_fts(core_patient_fts, rowid, nom, prenom, telephone, cin)
+        VALUES ('delete', old.id, old.nom, old.prenom, old.telephone, old.cin);
+        INSERT INTO core_patient_fts(rowid, nom, prenom, telephone, cin)
+        VALUES (new.id, new.nom, new.prenom, new.telephone, new.cin);
+    END;
+    """,
+    # Indexation des patients existants
+    """INSERT INTO core_patient_fts(core_patient_fts) VALUES ('rebuild');""",
+]
+
+SQLITE_INVERSE = [
+    'DROP TRIGGER IF EXISTS "core_patient_fts_ai";',
+    'DROP TRIGGER IF EXISTS "core_patient_fts_ad";',
+    'DROP TRIGGER IF EXISTS "core_patient_fts_au";',
+    'DROP TABLE IF EXISTS "core_patient_fts";',
+]
+
+POSTGRESQL = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent;',
+    # unaccent() n'est pas IMMUTABLE : l'enveloppe l'est, ce qu'exige une colonne générée
+    """
+    CREATE OR REPLACE FUNCTION core_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent', $1) $$;
+    """,
+    """
+    ALTER TABLE "core_patient" ADD COLUMN IF NOT EXISTS "recherche" tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', core_unaccent(
+            coalesce("nom", '') || ' ' || coalesce("prenom", '') || ' ' ||
+            coalesce("telephone", '') || ' ' || coalesce("cin", '')
+        ))
+    ) STORED;
+    """,
+    'CREATE INDEX IF NOT EXISTS "core_patient_recherche_idx" ON "core_patient" USING GIN ("recherche");',
+]
+
+POSTGRESQL_INVERSE = [
+    'DROP INDEX IF EXISTS "core_patient_recherche_idx";',
+    'ALTER TABLE "core_patient" DROP COLUMN IF EXISTS "recherche";',
+    'DROP FUNCTION IF EXISTS core_unaccent(text);',
+]
+
+
+def _executer(requetes):
+    def operation(apps, schema_editor):
+        for sql in requetes.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_index_pagination_patient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _executer({'sqlite': SQLITE, 'postgresql': POSTGRESQL}),
+            _executer({'sqlite': SQLITE_INVERSE, 'postgresql': POSTGRESQL_INVERSE}),
+        ),
+    ]
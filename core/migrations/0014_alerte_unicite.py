@@ -0,0 +1,50 @@
+# Unicité des alertes générées (core.services.alertes)
+#
+# Une seule alerte non expirée par type et par objet : facture, rendez-vous
+# ou certificat (clé 'certificat' de donnees_supplementaires). Index unique
+# partiel sur expression, limité aux alertes liées à leur objet : les
+# alertes saisies à la main sans lien ne sont pas contraintes.
+# bulk_create(ignore_conflicts=True) s'appuie dessus (INSERT OR IGNORE /
+# ON CONFLICT DO NOTHING).
+
+from django.db import migrations
+
+
+def _index(certificat):
+    objet = f'COALESCE("facture_id", "rendez_vous_id", {certificat})'
+    return f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS "core_alerte_unicite" ON "core_alerte" ("type_alerte", {objet})
+    WHERE "statut" <> 'expiree' AND (
+        ("type_alerte" = 'facture_impayee' AND "facture_id" IS NOT NULL)
+        OR ("type_alerte" = 'rdv_rappel' AND "rendez_vous_id" IS NOT NULL)
+        OR ("type_alerte" = 'certificat_expire' AND {certificat} IS NOT NULL)
+    );
+    """
+
+
+SQLITE = [_index('''json_extract("donnees_supplementaires", '$.certificat')''')]
+
+POSTGRESQL = [_index('''(("donnees_supplementaires" ->> 'certificat')::bigint)''')]
+
+INVERSE = ['DROP INDEX IF EXISTS "core_alerte_unicite";']
+
+
+def _executer(requetes):
+    def operation(apps, schema_editor):
+        for sql in requetes.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recherche_patient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _executer({'sqlite': SQLITE, 'postgresql': POSTGRESQL}),
+            _executer({'sqlite': INVERSE, 'postgresql': INVERSE}),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Index du fil d'alertes et des compteurs de non lues
+#
+# (statut, priorite, date_creation, id) : fil filtré par priorité, lu dans
+# l'ordre de la pagination par clé, et comptage des alertes actives par
+# priorité sans lire la table. (statut, date_creation, id) : fil de toutes
+# les priorités, sans tri.
+
+from django.db import migrations
+
+
+INDEX = [
+    ('core_alerte_statut_prio_date_idx', 'core_alerte', ('statut', 'priorite', 'date_creation', 'id')),
+    ('core_alerte_statut_date_idx', 'core_alerte', ('statut', 'date_creation', 'id')),
+]
+
+
+def creer_index(nom, table, colonnes):
+    liste = ', '.join(f'"{colonne}"' for colonne in colonnes)
+    return f'CREATE INDEX IF NOT EXISTS "{nom}" ON "{table}" ({liste});'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_alerte_unicite'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=creer_index(nom, table, colonnes),
+            reverse_sql=f'DROP INDEX IF EXISTS "{nom}";',
+        )
+        for nom, table, colonnes in INDEX
+    ]
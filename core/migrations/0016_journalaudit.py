@@ -0,0 +1,36 @@
+# Journal d'audit des requêtes HTTP
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0015_index_flux_alertes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(db_index=True, verbose_name='Date')),
+                ('methode', models.CharField(max_length=8, verbose_name='Méthode')),
+                ('chemin', models.CharField(max_length=500, verbose_name='Chemin')),
+                ('vue', models.CharField(blank=True, max_length=200, verbose_name='Vue')),
+                ('statut', models.PositiveSmallIntegerField(verbose_name='Statut HTTP')),
+                ('duree_ms', models.PositiveIntegerField(verbose_name='Durée (ms)')),
+                ('adresse_ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='Adresse IP')),
+                ('utilisateur', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Entrée d'audit",
+                'verbose_name_plural': "Journal d'audit",
+                'db_table': 'core_audit',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
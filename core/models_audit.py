@@ -0,0 +1,37 @@
+"""
+Journal d'audit des requêtes HTTP
+
+Une ligne par requête, insérée par lots par core.services.audit, jamais
+pendant la requête elle-même.
+"""
+
+from django.conf import settings
+from django.db import models
+
+
+class JournalAudit(models.Model):
+    """Trace d'une requête HTTP : qui, quoi, quand, avec quel résultat"""
+
+    date = models.DateTimeField(db_index=True, verbose_name="Date")
+    utilisateur = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.DO_NOTHING,
+        # Pas de contrainte : un lot ne doit pas échouer pour un utilisateur supprimé entre-temps ;
+        # DO_NOTHING : supprimer un utilisateur ne parcourt ni ne modifie le journal, qui garde son id
+        db_constraint=False, related_name='+', verbose_name="Utilisateur",
+    )
+    methode = models.CharField(max_length=8, verbose_name="Méthode")
+    chemin = models.CharField(max_length=500, verbose_name="Chemin")
+    vue = models.CharField(max_length=200, blank=True, verbose_name="Vue")
+    statut = models.PositiveSmallIntegerField(verbose_name="Statut HTTP")
+    duree_ms = models.PositiveIntegerField(verbose_name="Durée (ms)")
+    adresse_ip = models.GenericIPAddressField(null=True, blank=True, verbose_name="Adresse IP")
+
+    class Meta:
+        app_label = 'core'
+        db_table = 'core_audit'
+        ordering = ['-date']
+        verbose_name = "Entrée d'audit"
+        verbose_name_plural = "Journal d'audit"
+
+    def __str__(self):
+        return f"{self.date:%d/%m/%Y %H:%M:%S} {self.methode} {self.chemin} ({self.statut})"
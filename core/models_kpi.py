@@ -0,0 +1,41 @@
+"""
+Table de cumul journalier des indicateurs (KPI)
+
+Une ligne par jour, tenue à jour par les signaux de
+core.services.kpi_journalier : les KPI d'une période deviennent une somme
+sur au plus 366 lignes au lieu d'un parcours des tables brutes.
+"""
+
+from django.db import models
+
+
+class KPIJournalier(models.Model):
+    """Indicateurs agrégés d'une journée"""
+
+    jour = models.DateField(unique=True, verbose_name="Jour")
+
+    consultations = models.PositiveIntegerField(default=0, verbose_name="Consultations")
+    revenus_ht = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Revenus HT")
+    revenus_tva = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="TVA")
+    revenus_ttc = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Revenus TTC")
+    nouveaux_patients = models.PositiveIntegerField(default=0, verbose_name="Nouveaux patients")
+
+    rdv_prevus = models.PositiveIntegerField(default=0, verbose_name="RDV prévus")
+    rdv_confirmes = models.PositiveIntegerField(default=0, verbose_name="RDV confirmés")
+    rdv_termines = models.PositiveIntegerField(default=0, verbose_name="RDV terminés")
+    rdv_annules = models.PositiveIntegerField(default=0, verbose_name="RDV annulés")
+    rdv_absents = models.PositiveIntegerField(default=0, verbose_name="RDV absents")
+
+    certificats = models.PositiveIntegerField(default=0, verbose_name="Certificats émis")
+
+    date_maj = models.DateTimeField(auto_now=True, verbose_name="Dernière mise à jour")
+
+    class Meta:
+        app_label = 'core'
+        db_table = 'core_kpi_daily'
+        ordering = ['jour']
+        verbose_name = "KPI journalier"
+        verbose_name_plural = "KPI journaliers"
+
+    def __str__(self):
+        return f"KPI du {self.jour}"
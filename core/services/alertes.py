@@ -0,0 +1,163 @@
+"""
+Génération périodique des alertes (core_alerte)
+
+generer() trouve toutes les conditions d'alerte d'un coup, une requête par
+type, sans boucle par objet :
+- facture_impayee   : factures non payées depuis DELAI_PAIEMENT jours
+                      (critiques après DELAI_CRITIQUE jours) ;
+- rdv_rappel        : rendez-vous des prochaines HORIZON_RAPPEL heures ;
+- certificat_expire : certificats actifs arrivés à échéance depuis moins
+                      de FENETRE_CERTIFICAT jours.
+
+Les objets ayant déjà une alerte non expirée sont écartés par la requête,
+et les nouvelles alertes insérées par bulk_create. L'index unique de la
+migration 0014 (type et objet de l'alerte, pour les alertes non expirées)
+fait ignorer les doublons de deux générations
+simultanées : generer() rapporte donc les alertes candidates à l'insertion,
+dont certaines peuvent avoir été écartées par l'index.
+
+Les alertes dépassées (date_expiration passée, facture payée, rendez-vous
+annulé) passent au statut 'expiree' en un seul UPDATE.
+
+La génération tourne uniquement par la commande generer_alertes, lancée
+par cron ou en processus dédié (--boucle) : jamais dans les workers web,
+où chaque worker gunicorn aurait son propre planificateur.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.models import Alerte, Facture, RendezVous
+from core.models_certificates import CertificatMedical
+from core.services import flux_alertes
+
+logger = logging.getLogger(__name__)
+
+# Statuts de facture considérés comme impayés ('en_attente' : anciennes factures)
+STATUTS_IMPAYES = ('en_attente', 'envoyee')
+DELAI_PAIEMENT = 30
+DELAI_CRITIQUE = 60
+HORIZON_RAPPEL = timedelta(hours=24)
+FENETRE_CERTIFICAT = 30
+TAILLE_LOT = 500
+INTERVALLE = 15 * 60
+
+
+def _sans_alerte(type_alerte, champ):
+    """Filtre des objets sans alerte non expirée de ce type"""
+    return ~Exists(
+        Alerte.objects.filter(type_alerte=type_alerte, **{champ: OuterRef('pk')}).exclude(statut='expiree')
+    )
+
+
+def _factures_impayees(aujourd_hui):
+    factures = (
+        Facture.objects
+        .filter(statut__in=STATUTS_IMPAYES, date_facture__lte=aujourd_hui - timedelta(days=DELAI_PAIEMENT))
+        .filter(_sans_alerte('facture_impayee', 'facture'))
+        .values_list('pk', 'consultation__patient_id', 'montant_total', 'date_facture')
+    )
+    for pk, patient_id, montant, date_facture in factures:
+        jours = (aujourd_hui - date_facture).days
+        yield Alerte(
+            titre='Facture impayée', type_alerte='facture_impayee',
+            message=f"Facture de {montant:.0f} DH impayée depuis {jours} jours",
+            priorite='critique' if jours >= DELAI_CRITIQUE else 'haute',
+            facture_id=pk, patient_id=patient_id,
+        )
+
+
+def _rappels_rdv(maintenant):
+    rendez_vous = (
+        RendezVous.objects
+        .filter(date_heure__range=(maintenant, maintenant + HORIZON_RAPPEL))
+        .exclude(statut='annule')
+        .filter(_sans_alerte('rdv_rappel', 'rendez_vous'))
+        .values_list('pk', 'patient_id', 'patient__prenom', 'patient__nom', 'date_heure')
+    )
+    for pk, patient_id, prenom, nom, date_heure in rendez_vous:
+        yield Alerte(
+            titre='Rappel RDV', type_alerte='rdv_rappel',
+            message=f"{prenom} {nom} a un RDV le {timezone.localtime(date_heure):%d/%m à %Hh%M}",
+            priorite='normale', date_expiration=date_heure,
+            rendez_vous_id=pk, patient_id=patient_id,
+        )
+
+
+def _certificats_expires(aujourd_hui):
+    # Le certificat n'est pas une clé étrangère de l'alerte : ceux déjà signalés sont lus à part
+    signales = set(
+        Alerte.objects.filter(type_alerte='certificat_expire').exclude(statut='expiree')
+        .values_list('donnees_supplementaires__certificat', flat=True)
+    )
+    certificats = (
+        CertificatMedical.objects
+        .filter(est_active=True, date_fin__range=(
+            aujourd_hui - timedelta(days=FENETRE_CERTIFICAT), aujourd_hui - timedelta(days=1)
+        ))
+        .values_list('pk', 'patient_id', 'numero_certificat', 'date_fin')
+    )
+    fuseau = timezone.get_current_timezone()
+    for pk, patient_id, numero, date_fin in certificats:
+        if pk in signales:
+            continue
+        yield Alerte(
+            titre='Certificat expiré', type_alerte='certificat_expire',
+            message=f"Le certificat {numero} a expiré le {date_fin:%d/%m/%Y}",
+            priorite='normale', patient_id=patient_id, donnees_supplementaires={'certificat': pk},
+            # Hors de la fenêtre, le certificat n'est plus signalé : l'alerte expire avec elle
+            date_expiration=datetime.combine(date_fin + timedelta(days=FENETRE_CERTIFICAT), time.min, fuseau),
+        )
+
+
+def expirer(maintenant=None):
+    """Passe en 'expiree' les alertes actives dépassées, en un UPDATE ; retourne leur nombre"""
+    maintenant = maintenant or timezone.now()
+    return Alerte.objects.filter(statut='active').filter(
+        Q(date_expiration__lte=maintenant)
+        | (Q(type_alerte='facture_impayee', facture__isnull=False) & ~Q(facture__statut__in=STATUTS_IMPAYES))
+        | Q(type_alerte='rdv_rappel', rendez_vous__statut='annule')
+    ).update(statut='expiree', date_traitement=maintenant)
+
+
+def generer(maintenant=None):
+    """Crée les nouvelles alertes et expire les dépassées ; retourne les nombres par opération"""
+    maintenant = maintenant or timezone.now()
+    aujourd_hui = timezone.localdate(maintenant)
+
+    with transaction.atomic():
+        expirees = expirer(maintenant)
+        # Factures devenues critiques depuis la création de leur alerte
+        escaladees = Alerte.objects.filter(
+            type_alerte='facture_impayee', statut='active', priorite='haute',
+            facture__date_facture__lte=aujourd_hui - timedelta(days=DELAI_CRITIQUE),
+        ).update(priorite='critique')
+
+        nouvelles = [
+            *_factures_impayees(aujourd_hui),
+            *_rappels_rdv(maintenant),
+            *_certificats_expires(aujourd_hui),
+        ]
+        Alerte.objects.bulk_create(nouvelles, batch_size=TAILLE_LOT, ignore_conflicts=True)
+        if nouvelles or expirees or escaladees:
+            # Écritures en masse, sans signaux : les compteurs de non lues sont recalculés
+            transaction.on_commit(flux_alertes.invalider)
+
+    logger.info("Alertes: %d candidate(s), %d expirée(s), %d escaladée(s)", len(nouvelles), expirees, escaladees)
+    return {'candidates': len(nouvelles), 'expirees': expirees, 'escaladees': escaladees}
+
+
+def boucle(intervalle, arret):
+    """Appelle generer() toutes les `intervalle` secondes jusqu'à arret.set()"""
+    while not arret.is_set():
+        try:
+            generer()
+        except Exception:
+            logger.exception("Échec de la génération des alertes")
+        finally:
+            close_old_connections()
+        arret.wait(intervalle)
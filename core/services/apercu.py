@@ -0,0 +1,97 @@
+"""
+Aperçu consolidé des statistiques du système
+
+Tous les compteurs de la vue d'ensemble (totaux, relations orphelines,
+activité du jour et du mois) sont calculés en une seule requête UNION ALL,
+chaque branche étant un agrégat sans GROUP BY. Sur PostgreSQL distant,
+c'est le nombre d'allers-retours qui domine la latence.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+from core.models import Consultation, Facture, Patient, RendezVous
+from core.services.periodes import bornes_periode, filtre_periode
+
+
+STATUTS_PROGRAMMES = ['prevu', 'confirme']
+
+# Type commun aux branches de l'UNION (compteurs et montants)
+_VALEUR = DecimalField(max_digits=14, decimal_places=2)
+
+# Indicateurs dont la valeur est un nombre entier
+_COMPTEURS = {
+    'patients', 'rendez_vous', 'consultations', 'factures',
+    'consultations_orphelines', 'rdv_orphelins',
+    'consultations_jour', 'rdv_programmes',
+    'consultations_mois', 'patients_uniques',
+}
+
+
+def _branche(cle, queryset, agregat):
+    """Une ligne (cle, valeur) calculée sur tout le queryset"""
+    return queryset.order_by().annotate(
+        cle=Value(cle)
+    ).values('cle').annotate(
+        valeur=Cast(Coalesce(agregat, Value(0)), _VALEUR)
+    ).values_list('cle', 'valeur')
+
+
+def apercu_systeme(reference=None):
+    """
+    Retourne les statistiques de la vue d'ensemble en un aller-retour.
+
+    reference: date du jour considéré (aujourd'hui par défaut)
+    """
+    jour = bornes_periode('jour', reference)
+    mois = bornes_periode('mois', reference)
+
+    consultations_jour = Consultation.objects.filter(
+        filtre_periode(Consultation, 'date_consultation', *jour)
+    )
+    consultations_mois = Consultation.objects.filter(
+        filtre_periode(Consultation, 'date_consultation', *mois)
+    )
+    factures_payees = Facture.objects.filter(statut='payee')
+
+    branches = [
+        _branche('patients', Patient.objects.all(), Count('pk')),
+        _branche('rendez_vous', RendezVous.objects.all(), Count('pk')),
+        _branche('consultations', Consultation.objects.all(), Count('pk')),
+        _branche('factures', Facture.objects.all(), Count('pk')),
+        _branche('consultations_orphelines',
+                 Consultation.objects.filter(patient__isnull=True), Count('pk')),
+        _branche('rdv_orphelins',
+                 RendezVous.objects.filter(patient__isnull=True), Count('pk')),
+        _branche('consultations_jour', consultations_jour, Count('pk')),
+        _branche('revenus_jour',
+                 factures_payees.filter(filtre_periode(Facture, 'date_facture', *jour)),
+                 Sum('montant_total')),
+        _branche('rdv_programmes',
+                 RendezVous.objects.filter(
+                     filtre_periode(RendezVous, 'date_heure', *jour),
+                     statut__in=STATUTS_PROGRAMMES
+                 ),
+                 Count('pk')),
+        _branche('consultations_mois', consultations_mois, Count('pk')),
+        _branche('revenus_mois',
+                 factures_payees.filter(filtre_periode(Facture, 'date_facture', *mois)),
+                 Sum('montant_total')),
+        _branche('patients_uniques', consultations_mois, Count('patient', distinct=True)),
+    ]
+
+    resultats = dict(branches[0].union(*branches[1:], all=True))
+
+    apercu = {
+        cle: int(valeur) if cle in _COMPTEURS else Decimal(valeur)
+        for cle, valeur in resultats.items()
+    }
+    apercu['date'] = jour[0]
+    apercu['periode'] = mois[0].strftime('%m/%Y')
+    apercu['revenu_moyen'] = (
+        round(apercu['revenus_mois'] / apercu['consultations_mois'], 2)
+        if apercu['consultations_mois'] else Decimal('0')
+    )
+    return apercu
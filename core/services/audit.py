@@ -0,0 +1,297 @@
+"""
+Écriture du journal d'audit hors du chemin des requêtes
+
+enregistrer() dépose l'entrée (un dict de valeurs simples) dans une file
+bornée et rend la main : quelques microsecondes, sans accès à la base.
+Un thread du processus vide la file par lots : dès TAILLE_LOT entrées ou
+INTERVALLE_MS après la première entrée du lot, le lot part vers la
+destination :
+- 'bdd'     : bulk_create de JournalAudit (une requête par lot) ;
+- 'fichier' : lignes JSON ajoutées à un fichier gzip, remplacé par un
+              nouveau fichier chaque jour ou au-delà de FICHIER_MAX_OCTETS.
+
+File pleine (destination trop lente ou indisponible) : l'entrée est
+rejetée, ou attendue au plus AUDIT_ATTENTE_MS, jamais bloquante au-delà.
+statistiques() donne la contre-pression : taille de la file et son
+maximum, entrées rejetées, lots écrits, erreurs, durée du dernier lot.
+
+La file est vidée à l'arrêt du processus (atexit, donc aussi à l'arrêt
+normal d'un worker gunicorn) ; arreter() le fait explicitement.
+
+Réglages (settings):
+    AUDIT_DESTINATION   'bdd' ou 'fichier' (défaut: 'bdd')
+    AUDIT_DOSSIER       dossier des fichiers (défaut: <BASE_DIR>/logs/audit)
+    AUDIT_FILE_MAX      entrées en attente au plus (défaut: 10000)
+    AUDIT_LOT           entrées par lot (défaut: 500)
+    AUDIT_INTERVALLE_MS attente maximale d'un lot incomplet (défaut: 200)
+    AUDIT_ATTENTE_MS    attente tolérée quand la file est pleine (défaut: 0)
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FILE_MAX = 10000
+TAILLE_LOT = 500
+INTERVALLE_MS = 200
+FICHIER_MAX_OCTETS = 50 * 1024 * 1024
+# Attente du vidage à l'arrêt (secondes)
+DELAI_ARRET = 10
+
+_ARRET = object()
+
+
+class _Barriere:
+    """Jeton de vidage : le thread écrit le lot en cours puis le signale"""
+
+    def __init__(self):
+        self.evenement = threading.Event()
+
+
+class DestinationBdd:
+    """Lots insérés dans core_audit, une requête par lot"""
+
+    def ecrire(self, lot):
+        from core.models_audit import JournalAudit
+
+        try:
+            JournalAudit.objects.bulk_create([JournalAudit(**entree) for entree in lot])
+        finally:
+            close_old_connections()
+
+    def fermer(self):
+        pass
+
+
+class DestinationFichier:
+    """Lignes JSON dans des fichiers gzip, un nouveau par jour ou au-delà de max_octets"""
+
+    def __init__(self, dossier, max_octets=FICHIER_MAX_OCTETS):
+        self.dossier = dossier
+        self.max_octets = max_octets
+        self.brut = None
+        self.fichier = None
+        self.jour = None
+
+    def _ouvrir(self):
+        self.fermer()
+        os.makedirs(self.dossier, exist_ok=True)
+        self.jour = timezone.localdate()
+        nom = f"audit-{timezone.localtime():%Y%m%d-%H%M%S}-{os.getpid()}-{time.monotonic_ns()}.jsonl.gz"
+        self.brut = open(os.path.join(self.dossier, nom), 'wb')
+        self.fichier = gzip.GzipFile(fileobj=self.brut, mode='wb')
+
+    def ecrire(self, lot):
+        if self.fichier is None or self.jour != timezone.localdate() or self.brut.tell() >= self.max_octets:
+            self._ouvrir()
+        lignes = ''.join(json.dumps(entree, default=str, ensure_ascii=False) + '\n' for entree in lot)
+        self.fichier.write(lignes.encode('utf-8'))
+        # Vidage à chaque lot : après un arrêt brutal, le fichier reste lisible jusqu'au dernier lot (zcat)
+        self.fichier.flush()
+
+    def fermer(self):
+        if self.fichier is not None:
+            self.fichier.close()
+            self.brut.close()
+            self.fichier = self.brut = None
+
+
+def destination_configuree():
+    if getattr(settings, 'AUDIT_DESTINATION', 'bdd') == 'fichier':
+        dossier = getattr(settings, 'AUDIT_DOSSIER', None) or os.path.join(settings.BASE_DIR, 'logs', 'audit')
+        return DestinationFichier(dossier)
+    return DestinationBdd()
+
+
+class FileAudit:
+    """File bornée vidée par lots dans un thread"""
+
+    def __init__(self, destination=None, taille_max=None, taille_lot=None, intervalle_ms=None, attente_ms=None):
+        self.destination = destination
+        self.taille_max = taille_max or getattr(settings, 'AUDIT_FILE_MAX', FILE_MAX)
+        self.taille_lot = taille_lot or getattr(settings, 'AUDIT_LOT', TAILLE_LOT)
+        self.intervalle = (intervalle_ms or getattr(settings, 'AUDIT_INTERVALLE_MS', INTERVALLE_MS)) / 1000
+        self.attente = (attente_ms if attente_ms is not None else getattr(settings, 'AUDIT_ATTENTE_MS', 0)) / 1000
+        self.file = None
+        self.thread = None
+        self.pid = None
+        self._verrou = threading.Lock()
+        self._verrou_compteurs = threading.Lock()
+        self.compteurs = dict.fromkeys(
+            ('recues', 'rejetees', 'ecrites', 'lots', 'erreurs', 'taille_max_atteinte'), 0
+        )
+        self.duree_dernier_lot_ms = 0.0
+
+    def _demarrer(self):
+        # Après un fork (workers gunicorn avec --preload), le thread du parent n'existe pas : on repart de zéro
+        with self._verrou:
+            if self.pid != os.getpid():
+                self.destination = self.destination or destination_configuree()
+                self.file = queue.Queue(self.taille_max)
+                self.thread = threading.Thread(target=self._vider, name='audit', daemon=True)
+                self.pid = os.getpid()
+                self.thread.start()
+
+    def enregistrer(self, entree):
+        """Dépose une entrée ; retourne False si elle a été rejetée (file pleine)"""
+        if self.pid != os.getpid():
+            self._demarrer()
+        try:
+            if self.attente:
+                self.file.put(entree, timeout=self.attente)
+            else:
+                self.file.put_nowait(entree)
+            depose = True
+        except queue.Full:
+            depose = False
+        taille = self.file.qsize()
+        with self._verrou_compteurs:
+            self.compteurs['recues'] += 1
+            if not depose:
+                self.compteurs['rejetees'] += 1
+            if taille > self.compteurs['taille_max_atteinte']:
+                self.compteurs['taille_max_atteinte'] = taille
+        return depose
+
+    def _ecrire(self, lot):
+        if not lot:
+            return
+        debut = time.perf_counter()
+        try:
+            self.destination.ecrire(lot)
+            ecrit = True
+        except Exception:
+            ecrit = False
+            logger.exception("Lot d'audit de %d entrée(s) perdu", len(lot))
+        with self._verrou_compteurs:
+            if ecrit:
+                self.compteurs['ecrites'] += len(lot)
+                self.compteurs['lots'] += 1
+            else:
+                self.compteurs['erreurs'] += 1
+        self.duree_dernier_lot_ms = (time.perf_counter() - debut) * 1000
+
+    def _vider(self):
+        lot = []
+        echeance = None
+        while True:
+            try:
+                delai = None if echeance is None else max(0, echeance - time.monotonic())
+                entree = self.file.get(timeout=delai)
+            except queue.Empty:
+                entree = None
+
+            if entree is _ARRET:
+                break
+            if isinstance(entree, _Barriere):
+                self._ecrire(lot)
+                lot, echeance = [], None
+                entree.evenement.set()
+                continue
+            if entree is not None:
+                lot.append(entree)
+                if echeance is None:
+                    echeance = time.monotonic() + self.intervalle
+            if len(lot) >= self.taille_lot or (lot and time.monotonic() >= echeance):
+                self._ecrire(lot)
+                lot, echeance = [], None
+
+        # Arrêt : le lot en cours et tout ce qui reste dans la file
+        while True:
+            try:
+                entree = self.file.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(entree, _Barriere):
+                entree.evenement.set()
+            elif entree is not _ARRET:
+                lot.append(entree)
+                if len(lot) >= self.taille_lot:
+                    self._ecrire(lot)
+                    lot = []
+        self._ecrire(lot)
+        self.destination.fermer()
+
+    def vider(self, delai=DELAI_ARRET):
+        """Attend l'écriture de toutes les entrées déposées jusqu'ici ; False si le délai est dépassé"""
+        if self.pid != os.getpid() or not self.thread.is_alive():
+            return True
+        barriere = _Barriere()
+        try:
+            self.file.put(barriere, timeout=delai)
+        except queue.Full:
+            return False
+        return barriere.evenement.wait(delai)
+
+    def arreter(self, delai=DELAI_ARRET):
+        """Vide la file et arrête le thread"""
+        with self._verrou:
+            if self.pid != os.getpid() or not self.thread.is_alive():
+                return
+            # Bloquant : à l'arrêt, on attend une place plutôt que de perdre des entrées
+            try:
+                self.file.put(_ARRET, timeout=delai)
+            except queue.Full:
+                logger.warning("Audit: file toujours pleine après %ss, %d entrée(s) non écrite(s)",
+                               delai, self.file.qsize())
+                return
+            self.thread.join(delai)
+            self.pid = None
+
+    def statistiques(self):
+        with self._verrou_compteurs:
+            compteurs = dict(self.compteurs)
+        return {
+            **compteurs,
+            'en_attente': self.file.qsize() if self.file is not None else 0,
+            'capacite': self.taille_max,
+            'duree_dernier_lot_ms': round(self.duree_dernier_lot_ms, 2),
+        }
+
+
+_file = None
+_verrou_file = threading.Lock()
+
+
+def file_audit():
+    """File du processus, créée au premier appel"""
+    global _file
+    if _file is None:
+        with _verrou_file:
+            if _file is None:
+                _file = FileAudit()
+                atexit.register(_file.arreter)
+    return _file
+
+
+def enregistrer(entree):
+    return file_audit().enregistrer(entree)
+
+
+def statistiques():
+    return file_audit().statistiques()
+
+
+def exposition():
+    """Compteurs du processus courant au format texte Prometheus"""
+    stats = statistiques()
+    etiquette = f'pid="{os.getpid()}"'
+    lignes = []
+    for nom in ('recues', 'rejetees', 'ecrites', 'lots', 'erreurs'):
+        lignes.append(f'# TYPE erp_audit_{nom}_total counter')
+        lignes.append(f'erp_audit_{nom}_total{{{etiquette}}} {stats[nom]}')
+    for nom in ('en_attente', 'capacite', 'taille_max_atteinte', 'duree_dernier_lot_ms'):
+        lignes.append(f'# TYPE erp_audit_{nom} gauge')
+        lignes.append(f'erp_audit_{nom}{{{etiquette}}} {stats[nom]}')
+    return '\n'.join(lignes) + '\n'
@@ -0,0 +1,149 @@
+"""
+Budget de requêtes des pages principales (celles listées par rapport_final.py)
+
+Chaque page est appelée par le client de test Django, connecté en
+superutilisateur : une requête d'échauffement, puis REPETITIONS mesures dont
+on garde la médiane. Pour chaque page on relève le nombre de requêtes SQL
+(le plus grand de tous les appels, échauffement à froid compris), leur durée
+cumulée, la durée totale et le pic de mémoire Python (tracemalloc).
+
+Une page échoue si elle dépasse son budget (BUDGETS, surchargeable par
+settings.BENCH_BUDGETS) ou si elle régresse par rapport à la référence JSON :
+plus de requêtes qu'avant (typiquement un N+1), ou une durée au-delà de
+TOLERANCE_TEMPS fois celle de la référence.
+"""
+
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+REPETITIONS = 3
+TOLERANCE_TEMPS = 1.5
+
+# (nom, url) ; une url None est résolue par _url_certificat_pdf()
+PAGES = [
+    ('dashboard', '/'),
+    ('patients', '/patients/'),
+    ('rdv', '/rdv/'),
+    ('consultations', '/consultations/'),
+    ('factures', '/factures/'),
+    ('ordonnances', '/ordonnances/'),
+    ('kpi', '/kpi/'),
+    ('certificats', '/certificats/'),
+    ('certificat_pdf', None),
+]
+
+# Plafonds par page : nombre de requêtes, durée totale (ms), pic mémoire (Mo)
+BUDGET_DEFAUT = {'requetes': 30, 'temps_ms': 1000, 'memoire_mo': 50}
+BUDGETS = {
+    'dashboard': {'requetes': 20},
+    'kpi': {'requetes': 25},
+    'certificat_pdf': {'requetes': 10, 'temps_ms': 2000},
+}
+
+
+def budget(nom):
+    """Budget effectif d'une page : défaut, puis BUDGETS, puis settings.BENCH_BUDGETS"""
+    return {
+        **BUDGET_DEFAUT,
+        **BUDGETS.get(nom, {}),
+        **getattr(settings, 'BENCH_BUDGETS', {}).get(nom, {}),
+    }
+
+
+def _url_certificat_pdf():
+    from core.models_certificates import CertificatMedical
+
+    certificat = CertificatMedical.objects.order_by('pk').first()
+    return f'/certificats/{certificat.pk}/pdf/' if certificat else None
+
+
+def _appeler(client, url):
+    """Une requête complète, contenu en flux compris ; retourne (statut, requêtes, durée, pic mémoire)"""
+    tracemalloc.reset_peak()
+    avant, _ = tracemalloc.get_traced_memory()
+    debut = time.perf_counter()
+    with CaptureQueriesContext(connection) as requetes:
+        reponse = client.get(url)
+        if reponse.streaming:
+            for _ in reponse.streaming_content:
+                pass
+    duree = time.perf_counter() - debut
+    _, pic = tracemalloc.get_traced_memory()
+    return reponse.status_code, requetes.captured_queries, duree, pic - avant
+
+
+def mesurer_page(client, url, repetitions=REPETITIONS):
+    """
+    Mesures d'une page : durées médianes après une requête d'échauffement,
+    nombre de requêtes SQL maximal sur tous les appels, échauffement compris.
+    Le premier appel, caches froids, est celui que le budget doit couvrir.
+    """
+    froid = _appeler(client, url)
+    essais = [_appeler(client, url) for _ in range(repetitions)]
+    statut = next((e[0] for e in [froid, *essais] if e[0] != 200), essais[-1][0])
+    return {
+        'url': url,
+        'statut': statut,
+        'requetes': max(len(e[1]) for e in [froid, *essais]),
+        'sql_ms': round(statistics.median(sum(float(q['time']) for q in e[1]) * 1000 for e in essais), 1),
+        'temps_ms': round(statistics.median(e[2] for e in essais) * 1000, 1),
+        'memoire_mo': round(max(e[3] for e in essais) / (1024 * 1024), 2),
+    }
+
+
+def mesurer(client, pages=None, repetitions=REPETITIONS):
+    """Mesure chaque page ; les pages sans URL résolue (aucun certificat) sont ignorées"""
+    tracemalloc.start()
+    try:
+        mesures = {}
+        for nom, url in pages or PAGES:
+            url = url or _url_certificat_pdf()
+            if url:
+                mesures[nom] = mesurer_page(client, url, repetitions)
+        return mesures
+    finally:
+        tracemalloc.stop()
+
+
+def comparer(mesures, reference=None):
+    """
+    Liste des dépassements : [(page, message)], vide si tout est dans le budget.
+    reference est un dictionnaire de mesures précédentes (même format).
+    """
+    echecs = []
+    reference = reference or {}
+    for nom, mesure in mesures.items():
+        if mesure['statut'] != 200:
+            echecs.append((nom, f"statut HTTP {mesure['statut']}"))
+            continue
+
+        for cle, plafond in budget(nom).items():
+            if mesure[cle] > plafond:
+                echecs.append((nom, f"{cle} = {mesure[cle]} > budget {plafond}"))
+
+        precedente = reference.get(nom)
+        if precedente:
+            if mesure['requetes'] > precedente['requetes']:
+                echecs.append((nom, f"requetes = {mesure['requetes']} > référence {precedente['requetes']}"))
+            if mesure['temps_ms'] > precedente['temps_ms'] * TOLERANCE_TEMPS:
+                echecs.append((nom, f"temps_ms = {mesure['temps_ms']} > {TOLERANCE_TEMPS} x référence {precedente['temps_ms']}"))
+    return echecs
+
+
+def charger_reference(fichier):
+    try:
+        with open(fichier, encoding='utf-8') as f:
+            return json.load(f)['pages']
+    except FileNotFoundError:
+        return None
+
+
+def enregistrer_reference(fichier, mesures, echelle):
+    with open(fichier, 'w', encoding='utf-8') as f:
+        json.dump({'echelle': echelle, 'vendor': connection.vendor, 'pages': mesures}, f, indent=2, ensure_ascii=False)
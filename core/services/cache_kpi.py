@@ -0,0 +1,168 @@
+"""
+Cache des KPI du tableau de bord, invalidé par période
+
+Chaque résultat (calcul_kpis_jour, calcul_kpis_periode,
+generer_donnees_graphiques...) est mis en cache par (nom, période, type de
+KPI). Sa clé embarque la version de chaque mois entièrement couvert et de
+chaque jour des mois partiels : une modification d'un jour incrémente la
+version de ce jour et de son mois, ce qui n'invalide que les entrées dont
+la période contient ce jour. Une année coûte 12 lectures de version, en un
+seul get_many (un MGET sur Redis).
+
+Le cache utilisé est l'alias KPI_CACHE_ALIAS des settings ('default' par
+défaut). Il doit être partagé par tous les processus (Redis, memcached ou
+cache en base) : les versions y sont incrémentées par le worker qui a
+traité l'écriture, et un LocMemCache par worker gunicorn laisserait les
+autres servir des KPI périmés jusqu'à DUREE_CACHE. Sa taille est bornée
+par le backend, maxmemory-policy allkeys-lru sur Redis. Exemple:
+
+    CACHES['kpi'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/2',
+    }
+    KPI_CACHE_ALIAS = 'kpi'
+
+connecter() branche l'invalidation sur les signaux du cumul journalier ;
+elle signale dans les logs un alias local au processus (LocMemCache).
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.services import kpi_journalier
+from core.services.periodes import bornes_mois, bornes_periode
+
+
+logger = logging.getLogger(__name__)
+
+PREFIXE = 'kpi'
+DUREE_CACHE = 60 * 60
+
+_ABSENT = object()
+
+_compteurs = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_verrou = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'KPI_CACHE_ALIAS', 'default')]
+
+
+def _compter(nom, nombre=1):
+    with _verrou:
+        _compteurs[nom] += nombre
+
+
+def _cle_jour(jour):
+    return f'{PREFIXE}:v:j:{jour.isoformat()}'
+
+
+def _cle_mois(jour):
+    return f'{PREFIXE}:v:m:{jour.year}-{jour.month:02d}'
+
+
+def _cles_version(debut, fin):
+    """Clés de version couvrant [début, fin) : mois complets, sinon jours"""
+    cles = []
+    jour = debut
+    while jour < fin:
+        debut_mois, fin_mois = bornes_mois(jour.year, jour.month)
+        if jour == debut_mois and fin_mois <= fin:
+            cles.append(_cle_mois(jour))
+            jour = fin_mois
+        else:
+            cles.append(_cle_jour(jour))
+            jour += timedelta(days=1)
+    return cles
+
+
+def _versions(cache, cles):
+    """
+    Lit les versions, en initialisant les absentes.
+
+    Une version évincée repart d'une valeur nouvelle (horodatage) et non
+    de zéro, pour ne jamais ressusciter une entrée calculée avant.
+    """
+    versions = cache.get_many(cles)
+    for cle in cles:
+        if cle not in versions:
+            cache.add(cle, time.time_ns(), None)
+            versions[cle] = cache.get(cle)
+    return [str(versions[cle]) for cle in cles]
+
+
+def obtenir(nom, debut, fin, calcul, kpi_type=''):
+    """
+    Retourne le résultat en cache de calcul() pour la période [début, fin),
+    en le calculant et le stockant en cas d'absence.
+
+    Exemple pour DashboardCalculator:
+        obtenir('periode', debut, fin, lambda: self.calcul_kpis_periode(debut, fin), kpi_type)
+    """
+    cache = _cache()
+    versions = _versions(cache, _cles_version(debut, fin))
+    # Empreinte des versions : la clé reste sous la limite de 250 caractères de memcached
+    empreinte = hashlib.md5('-'.join(versions).encode()).hexdigest()
+    cle = f'{PREFIXE}:{nom}:{kpi_type}:{debut.isoformat()}:{fin.isoformat()}:{empreinte}'
+
+    valeur = cache.get(cle, _ABSENT)
+    if valeur is not _ABSENT:
+        _compter('hits')
+        return valeur
+
+    _compter('misses')
+    valeur = calcul()
+    cache.set(cle, valeur, DUREE_CACHE)
+    return valeur
+
+
+def obtenir_periode(nom, type_periode, calcul, kpi_type='', reference=None):
+    """obtenir() pour une période nommée ('jour', 'mois', 'annee'...)"""
+    debut, fin = bornes_periode(type_periode, reference)
+    return obtenir(nom, debut, fin, calcul, kpi_type)
+
+
+def invalider_jours(jours):
+    """Incrémente la version des jours modifiés et de leurs mois"""
+    cache = _cache()
+    cles = {_cle_jour(jour) for jour in jours} | {_cle_mois(jour) for jour in jours}
+    for cle in cles:
+        try:
+            cache.incr(cle)
+        except ValueError:
+            # Version absente ou évincée : aucune entrée ne peut la référencer
+            cache.set(cle, time.time_ns(), None)
+    _compter('invalidations', len(jours))
+
+
+def statistiques():
+    """Compteurs du processus courant : hits, misses, invalidations, taux de hit"""
+    with _verrou:
+        compteurs = dict(_compteurs)
+    total = compteurs['hits'] + compteurs['misses']
+    compteurs['taux_hit'] = round(100 * compteurs['hits'] / total, 1) if total else 0.0
+    return compteurs
+
+
+def connecter():
+    """Invalide le cache après chaque modification de Facture, Consultation ou RDV"""
+    if isinstance(_cache(), LocMemCache):
+        logger.warning(
+            "KPI_CACHE_ALIAS désigne un LocMemCache : l'invalidation ne touche que ce processus, "
+            "les autres workers servent des KPI périmés. Utilisez un cache partagé (Redis)."
+        )
+    kpi_journalier.connecter_signaux()
+    kpi_journalier.abonner(invalider_jours)
+
+
+def deconnecter():
+    """Inverse de connecter() (tests)"""
+    kpi_journalier.desabonner(invalider_jours)
+    kpi_journalier.deconnecter_signaux()
@@ -0,0 +1,218 @@
+"""
+Détection des conflits de rendez-vous et recherche de créneaux libres
+
+Agenda charge les rendez-vous d'une période en une requête (les annulés
+ne comptent pas) et garde pour chaque jour :
+- les rendez-vous triés par heure de début, avec le maximum cumulé des
+  heures de fin : un créneau [debut, fin) est en conflit si un rendez-vous
+  commençant avant `fin` se termine après `debut`, ce que donnent une
+  recherche dichotomique et une lecture du maximum cumulé ;
+- les intervalles libres entre l'ouverture et la fermeture du cabinet, et
+  un arbre des maxima de leurs durées : le premier créneau libre de N
+  minutes est trouvé en O(log n).
+
+Les heures sont en minutes depuis minuit, heure locale. Réserver un
+créneau (vérification en lot d'une série récurrente, déplacement) met à
+jour la journée en O(n), n étant le nombre de rendez-vous du jour.
+
+Réglages (settings):
+    AGENDA_OUVERTURE / AGENDA_FERMETURE  heures d'ouverture (défaut: 08:00 / 18:00)
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import RendezVous
+
+OUVERTURE = time(8)
+FERMETURE = time(18)
+DUREE_DEFAUT = 30
+
+
+def _minutes(heure):
+    return heure.hour * 60 + heure.minute
+
+
+class _ArbreMax:
+    """Maximum de valeurs par intervalles d'indices, pour trouver la première valeur >= minimum"""
+
+    def __init__(self, valeurs):
+        self.taille = 1
+        while self.taille < len(valeurs):
+            self.taille *= 2
+        self.arbre = [0] * (2 * self.taille)
+        self.arbre[self.taille:self.taille + len(valeurs)] = valeurs
+        for noeud in range(self.taille - 1, 0, -1):
+            self.arbre[noeud] = max(self.arbre[2 * noeud], self.arbre[2 * noeud + 1])
+
+    def premier(self, debut, minimum, noeud=1, gauche=0, droite=None):
+        """Premier indice >= debut dont la valeur est >= minimum, ou None"""
+        droite = self.taille if droite is None else droite
+        if droite <= debut or self.arbre[noeud] < minimum:
+            return None
+        if droite - gauche == 1:
+            return gauche
+        milieu = (gauche + droite) // 2
+        indice = self.premier(debut, minimum, 2 * noeud, gauche, milieu)
+        if indice is None:
+            indice = self.premier(debut, minimum, 2 * noeud + 1, milieu, droite)
+        return indice
+
+
+class _Journee:
+    """Rendez-vous d'un jour, triés par début (minutes)"""
+
+    def __init__(self, ouverture, fermeture):
+        self.ouverture = ouverture
+        self.fermeture = fermeture
+        self.debuts = []
+        self.fins = []
+        self.pks = []
+        self.fin_max = []
+        self._libres = None
+
+    def ajouter(self, debut, fin, pk=None):
+        position = bisect_right(self.debuts, debut)
+        self.debuts.insert(position, debut)
+        self.fins.insert(position, fin)
+        self.pks.insert(position, pk)
+        precedent = self.fin_max[position - 1] if position else fin
+        self.fin_max[position:] = []
+        for indice in range(position, len(self.fins)):
+            precedent = max(precedent, self.fins[indice])
+            self.fin_max.append(precedent)
+        self._libres = None
+
+    def conflits(self, debut, fin):
+        """pk des rendez-vous chevauchant [debut, fin)"""
+        indice = bisect_left(self.debuts, fin) - 1
+        resultat = []
+        # Au-delà, aucun rendez-vous antérieur ne se termine après debut
+        while indice >= 0 and self.fin_max[indice] > debut:
+            if self.fins[indice] > debut:
+                resultat.append(self.pks[indice])
+            indice -= 1
+        return resultat
+
+    def libre(self, debut, fin):
+        indice = bisect_left(self.debuts, fin) - 1
+        return indice < 0 or self.fin_max[indice] <= debut
+
+    def _intervalles_libres(self):
+        if self._libres is None:
+            debuts, fins = [], []
+            curseur = self.ouverture
+            for debut, fin in zip(self.debuts, self.fins):
+                if debut > curseur:
+                    debuts.append(curseur)
+                    fins.append(min(debut, self.fermeture))
+                curseur = max(curseur, fin)
+                if curseur >= self.fermeture:
+                    break
+            if curseur < self.fermeture:
+                debuts.append(curseur)
+                fins.append(self.fermeture)
+            durees = [fin - debut for debut, fin in zip(debuts, fins)]
+            self._libres = (debuts, fins, _ArbreMax(durees))
+        return self._libres
+
+    def premier_libre(self, duree, apres):
+        """Début (minutes) du premier créneau libre de `duree` minutes à partir de `apres`, ou None"""
+        debuts, fins, arbre = self._intervalles_libres()
+        indice = bisect_right(fins, apres)
+        if indice == len(fins):
+            return None
+        # Intervalle entamé par `apres` : sa durée restante est plus courte
+        if fins[indice] - max(debuts[indice], apres) >= duree:
+            return max(debuts[indice], apres)
+        suivant = arbre.premier(indice + 1, duree)
+        return None if suivant is None else debuts[suivant]
+
+
+class Agenda:
+    """
+    Rendez-vous de `debut` à `fin` (dates incluses), chargés en une requête.
+
+    exclure : pk à ignorer (le rendez-vous que l'on déplace).
+    """
+
+    def __init__(self, debut, fin, exclure=()):
+        self.debut = debut
+        self.fin = fin
+        self.fuseau = timezone.get_current_timezone()
+        self.ouverture = _minutes(getattr(settings, 'AGENDA_OUVERTURE', OUVERTURE))
+        self.fermeture = _minutes(getattr(settings, 'AGENDA_FERMETURE', FERMETURE))
+        self.jours = {}
+
+        rendez_vous = (
+            RendezVous.objects
+            .filter(date_heure__range=(self._a(debut, 0), self._a(fin + timedelta(days=1), 0)))
+            .exclude(statut='annule')
+            .exclude(pk__in=exclure)
+            .order_by('date_heure')
+            .values_list('pk', 'date_heure', 'duree_prevue')
+        )
+        for pk, date_heure, duree in rendez_vous:
+            locale = timezone.localtime(date_heure, self.fuseau)
+            if debut <= locale.date() <= fin:
+                debut_minutes = _minutes(locale)
+                self._journee(locale.date()).ajouter(debut_minutes, debut_minutes + (duree or DUREE_DEFAUT), pk)
+
+    def _a(self, jour, minutes):
+        return datetime.combine(jour, time(minutes // 60, minutes % 60), tzinfo=self.fuseau)
+
+    def _journee(self, jour):
+        if jour not in self.jours:
+            self.jours[jour] = _Journee(self.ouverture, self.fermeture)
+        return self.jours[jour]
+
+    def _intervalle(self, date_heure, duree):
+        locale = timezone.localtime(date_heure, self.fuseau)
+        if not self.debut <= locale.date() <= self.fin:
+            raise ValueError(f"{locale:%d/%m/%Y} hors de l'agenda chargé ({self.debut} - {self.fin})")
+        debut = _minutes(locale)
+        return self._journee(locale.date()), debut, debut + (duree or DUREE_DEFAUT)
+
+    def conflits(self, date_heure, duree=DUREE_DEFAUT):
+        """pk des rendez-vous chevauchant le créneau (None pour les créneaux réservés sans pk)"""
+        journee, debut, fin = self._intervalle(date_heure, duree)
+        return journee.conflits(debut, fin)
+
+    def est_libre(self, date_heure, duree=DUREE_DEFAUT):
+        journee, debut, fin = self._intervalle(date_heure, duree)
+        return journee.libre(debut, fin)
+
+    def reserver(self, date_heure, duree=DUREE_DEFAUT, pk=None):
+        """Ajoute un créneau à l'agenda (sans l'enregistrer en base)"""
+        journee, debut, fin = self._intervalle(date_heure, duree)
+        journee.ajouter(debut, fin, pk)
+
+    def verifier(self, creneaux, reserver=True):
+        """
+        Vérification en lot : [(date_heure, duree), ...] -> [(date_heure, duree, conflits), ...]
+
+        Avec reserver, chaque créneau libre est réservé : les créneaux du lot
+        qui se chevauchent entre eux sont aussi signalés.
+        """
+        resultat = []
+        for date_heure, duree in creneaux:
+            conflits = self.conflits(date_heure, duree)
+            if reserver and not conflits:
+                self.reserver(date_heure, duree)
+            resultat.append((date_heure, duree, conflits))
+        return resultat
+
+    def premier_creneau_libre(self, duree, apres=None):
+        """Premier créneau libre de `duree` minutes à partir de `apres` (maintenant par défaut), ou None"""
+        apres = timezone.localtime(apres or timezone.now(), self.fuseau)
+        jour = max(apres.date(), self.debut)
+        while jour <= self.fin:
+            minutes = _minutes(apres) if jour == apres.date() else self.ouverture
+            debut = self._journee(jour).premier_libre(duree, max(minutes, self.ouverture))
+            if debut is not None:
+                return self._a(jour, debut)
+            jour += timedelta(days=1)
+        return None
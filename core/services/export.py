@@ -0,0 +1,125 @@
+"""
+Export CSV en flux des patients, consultations et factures
+
+Les lignes sont lues par values_list(...).iterator(chunk_size) : aucune
+instance de modèle n'est créée et la mémoire reste constante quel que soit
+le nombre de lignes (curseur serveur sur PostgreSQL, lecture par blocs sur
+SQLite). Les colonnes liées (consultation, patient) sont obtenues par
+jointure dans la même requête, sans requête par ligne.
+
+Les textes qui commencent par =, @, une tabulation ou un retour chariot
+sont préfixés d'une apostrophe, pour qu'Excel ne les exécute pas comme des
+formules ; ceux qui commencent par + ou - aussi, sauf les nombres et
+numéros de téléphone (« +212 6 12 34 56 78 », « -10 »), laissés intacts.
+"""
+
+import csv
+import re
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.utils import timezone
+
+from core.models import Consultation, Facture, Patient
+from core.services.periodes import bornes_periode, filtre_periode
+
+
+TAILLE_LOT = 2000
+
+# Séparateur attendu par Excel en locale française
+SEPARATEUR = ';'
+
+# Premiers caractères qui font d'une cellule une formule dans Excel ou LibreOffice
+DEBUTS_FORMULE = ('=', '+', '-', '@', '\t', '\r')
+# Valeurs commençant par + ou - qui ne sont qu'un nombre ou un numéro de téléphone
+_NOMBRE_OU_TELEPHONE = re.compile(r'[+-]?[\d .()/-]+')
+
+# nom: (modèle, champ date de la période, [(champ, en-tête), ...])
+EXPORTS = {
+    'patients': (Patient, 'date_creation', [
+        ('id', 'ID'),
+        ('nom', 'Nom'),
+        ('prenom', 'Prénom'),
+        ('date_naissance', 'Date de naissance'),
+        ('sexe', 'Sexe'),
+        ('cin', 'CIN'),
+        ('telephone', 'Téléphone'),
+        ('email', 'Email'),
+        ('adresse', 'Adresse'),
+        ('date_creation', 'Date de création'),
+    ]),
+    'consultations': (Consultation, 'date_consultation', [
+        ('id', 'ID'),
+        ('date_consultation', 'Date'),
+        ('patient_id', 'ID patient'),
+        ('patient__nom', 'Nom'),
+        ('patient__prenom', 'Prénom'),
+        ('patient__cin', 'CIN'),
+        ('motif', 'Motif'),
+        ('diagnostic', 'Diagnostic'),
+        ('traitement', 'Traitement'),
+        ('prix_consultation', 'Prix'),
+    ]),
+    'factures': (Facture, 'date_facture', [
+        ('id', 'ID'),
+        ('date_facture', 'Date facture'),
+        ('statut', 'Statut'),
+        ('montant_ht', 'Montant HT'),
+        ('taux_tva', 'Taux TVA'),
+        ('montant_tva', 'TVA'),
+        ('montant_total', 'Montant TTC'),
+        ('methode_paiement', 'Paiement'),
+        ('date_paiement', 'Date paiement'),
+        ('consultation_id', 'ID consultation'),
+        ('consultation__date_consultation', 'Date consultation'),
+        ('consultation__patient__nom', 'Nom'),
+        ('consultation__patient__prenom', 'Prénom'),
+        ('consultation__patient__cin', 'CIN'),
+    ]),
+}
+
+
+class _Tampon:
+    """Pseudo-fichier pour csv.writer : write() retourne la ligne formatée"""
+
+    def write(self, valeur):
+        return valeur
+
+
+def _formater(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = timezone.localtime(valeur)
+        return valeur.strftime('%Y-%m-%d %H:%M')
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return f'{valeur:.2f}'.replace('.', ',')
+    if isinstance(valeur, str) and valeur.startswith(DEBUTS_FORMULE) and not (
+        valeur[0] in '+-' and _NOMBRE_OU_TELEPHONE.fullmatch(valeur)
+    ):
+        # Texte saisi (nom, adresse, motif...) : l'apostrophe empêche son exécution comme formule
+        return "'" + valeur
+    return valeur
+
+
+def lignes_export(nom, annee=None, taille_lot=TAILLE_LOT):
+    """Génère l'en-tête puis les lignes brutes de l'export, par ordre de clé primaire"""
+    modele, champ_date, colonnes = EXPORTS[nom]
+    queryset = modele.objects.order_by('pk')
+    if annee:
+        bornes = bornes_periode('annee', date(int(annee), 1, 1))
+        queryset = queryset.filter(filtre_periode(modele, champ_date, *bornes))
+
+    yield [entete for _, entete in colonnes]
+    yield from queryset.values_list(*[champ for champ, _ in colonnes]).iterator(chunk_size=taille_lot)
+
+
+def lignes_csv(nom, annee=None, taille_lot=TAILLE_LOT):
+    """Génère l'export en lignes CSV (BOM UTF-8 en tête pour Excel)"""
+    writer = csv.writer(_Tampon(), delimiter=SEPARATEUR)
+    yield '\ufeff'
+    for ligne in lignes_export(nom, annee, taille_lot):
+        yield writer.writerow([_formater(valeur) for valeur in ligne])
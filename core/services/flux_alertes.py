@@ -0,0 +1,184 @@
+"""
+Fil d'alertes du tableau de bord et compteurs d'alertes non lues
+
+Une alerte non lue est une alerte active. Les compteurs par priorité sont
+gardés dans le cache, une clé par priorité, et tenus à jour par les
+signaux d'Alerte après commit (cache.incr, atomique sur Redis) : le badge de l'en-tête ne coûte aucune requête tant que
+les clés sont présentes. Une clé absente (expirée, évincée, invalidée)
+est recalculée pour toutes les priorités en une requête GROUP BY, servie
+par l'index (statut, priorite, date_creation, id) de la migration 0015.
+
+Les clés embarquent une version : un incrément qui trouve sa clé absente
+passe à la version suivante, car un recalcul en cours a pu compter sans
+lui. Ce recalcul écrit alors sous l'ancienne version, que personne ne lit
+plus, au lieu d'écraser l'incrément.
+
+Les écritures en masse (update(), bulk_create) n'émettent pas de
+signaux : elles appellent invalider(), comme core.services.alertes.
+
+Le cache 'default' doit être partagé par tous les processus (Redis,
+memcached ou cache en base) : les alertes sont générées par la commande
+generer_alertes et traitées par un seul worker, dont les incréments et
+invalidations n'atteindraient pas les LocMemCache des autres processus.
+connecter_signaux() signale un LocMemCache dans les logs.
+
+Le fil est paginé par clé (core.services.pagination), du plus récent au
+plus ancien.
+
+connecter_signaux() doit être appelé depuis CoreConfig.ready().
+"""
+
+import time
+import logging
+from collections import Counter
+from functools import partial
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_init, post_save
+
+from core.models import Alerte
+from core.services.pagination import TAILLE_PAGE, paginer
+
+logger = logging.getLogger(__name__)
+
+PRIORITES = ('critique', 'haute', 'normale', 'basse')
+STATUTS = ('active', 'traitee', 'expiree')
+
+PREFIXE = 'alertes:non_lues'
+CLE_VERSION = f'{PREFIXE}:version'
+# Borne la dérive d'un incrément compté deux fois (commit entre le recalcul et son incrément)
+DUREE_CACHE = 5 * 60
+
+
+def _version():
+    # Une version évincée repart d'un horodatage, jamais d'une valeur déjà servie
+    return cache.get_or_set(CLE_VERSION, time.time_ns, None)
+
+
+def _cle(priorite, version):
+    return f'{PREFIXE}:{version}:{priorite}'
+
+
+def compter():
+    """Alertes actives par priorité, calculées en base"""
+    comptes = dict.fromkeys(PRIORITES, 0)
+    lignes = (
+        Alerte.objects.filter(statut='active', priorite__in=PRIORITES)
+        .order_by().values_list('priorite').annotate(nombre=Count('id'))
+    )
+    comptes.update(lignes)
+    return comptes
+
+
+def compteurs():
+    """Alertes non lues par priorité et au total ; sans requête si le cache est complet"""
+    version = _version()
+    cles = [_cle(priorite, version) for priorite in PRIORITES]
+    valeurs = cache.get_many(cles)
+    if len(valeurs) == len(cles):
+        comptes = {priorite: valeurs[cle] for priorite, cle in zip(PRIORITES, cles)}
+    else:
+        comptes = compter()
+        cache.set_many({_cle(priorite, version): nombre for priorite, nombre in comptes.items()}, DUREE_CACHE)
+    comptes['total'] = sum(comptes.values())
+    return comptes
+
+
+def invalider():
+    """Passe à une nouvelle version : les compteurs seront recalculés à la prochaine lecture"""
+    try:
+        cache.incr(CLE_VERSION)
+    except ValueError:
+        cache.set(CLE_VERSION, time.time_ns(), None)
+
+
+def _ajuster(ecarts):
+    version = _version()
+    for priorite, ecart in ecarts.items():
+        if ecart and priorite in PRIORITES:
+            try:
+                cache.incr(_cle(priorite, version), ecart)
+            except ValueError:
+                # Clé absente : un recalcul en cours a pu manquer cet écart, sa valeur ne doit pas être lue
+                invalider()
+                return
+
+
+def _non_lue(instance):
+    """Priorité de l'alerte si elle est active, sinon None (champs non chargés : None)"""
+    if instance.__dict__.get('statut') == 'active':
+        return instance.__dict__.get('priorite')
+    return None
+
+
+def _planifier(avant, apres):
+    if avant != apres:
+        ecarts = Counter()
+        if avant:
+            ecarts[avant] -= 1
+        if apres:
+            ecarts[apres] += 1
+        transaction.on_commit(partial(_ajuster, ecarts))
+
+
+def _memoriser(sender, instance, **kwargs):
+    instance._non_lue_initiale = _non_lue(instance)
+
+
+def _apres_sauvegarde(sender, instance, created, **kwargs):
+    avant = None if created else getattr(instance, '_non_lue_initiale', None)
+    instance._non_lue_initiale = _non_lue(instance)
+    _planifier(avant, instance._non_lue_initiale)
+
+
+def _apres_suppression(sender, instance, **kwargs):
+    _planifier(_non_lue(instance), None)
+
+
+def connecter_signaux():
+    """Branche la tenue des compteurs sur Alerte"""
+    if isinstance(caches['default'], LocMemCache):
+        logger.warning(
+            "Le cache 'default' est un LocMemCache : les compteurs d'alertes non lues des autres "
+            "processus ne voient ni generer_alertes ni les alertes traitées ici. Utilisez un cache partagé (Redis)."
+        )
+    post_init.connect(_memoriser, sender=Alerte, dispatch_uid='alertes_non_lues_init')
+    post_save.connect(_apres_sauvegarde, sender=Alerte, dispatch_uid='alertes_non_lues_save')
+    post_delete.connect(_apres_suppression, sender=Alerte, dispatch_uid='alertes_non_lues_delete')
+
+
+def deconnecter_signaux():
+    post_init.disconnect(sender=Alerte, dispatch_uid='alertes_non_lues_init')
+    post_save.disconnect(sender=Alerte, dispatch_uid='alertes_non_lues_save')
+    post_delete.disconnect(sender=Alerte, dispatch_uid='alertes_non_lues_delete')
+
+
+def flux(statut='active', priorite=None):
+    alertes = Alerte.objects.filter(statut=statut)
+    if priorite:
+        alertes = alertes.filter(priorite=priorite)
+    return alertes
+
+
+def page(statut='active', priorite=None, curseur=None, taille=None):
+    """Page du fil, du plus récent au plus ancien ; lève CurseurInvalide"""
+    return paginer(flux(statut, priorite), curseur, taille or TAILLE_PAGE)
+
+
+def serialiser(alerte):
+    return {
+        'id': alerte.pk,
+        'titre': alerte.titre,
+        'message': alerte.message,
+        'type': alerte.type_alerte,
+        'priorite': alerte.priorite,
+        'statut': alerte.statut,
+        'date_creation': alerte.date_creation.isoformat(),
+        'date_expiration': alerte.date_expiration.isoformat() if alerte.date_expiration else None,
+        'patient_id': alerte.patient_id,
+        'facture_id': alerte.facture_id,
+        'rendez_vous_id': alerte.rendez_vous_id,
+    }
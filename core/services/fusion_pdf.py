@@ -0,0 +1,176 @@
+"""
+Fusion de PDF en flux
+
+Assemble les PDF produits par reportlab (core.services.rendu_pdf) en un
+seul document, écrit au fur et à mesure : chaque PDF ajouté est aussitôt
+converti en objets du document fusionné et rendu à l'appelant, qui peut
+l'envoyer et l'oublier. Seules les positions des objets et la liste des
+pages sont gardées jusqu'à la fin (une cinquantaine d'octets par page).
+
+Les objets de chaque PDF sont renumérotés ; leurs flux (contenu des pages,
+polices, images) sont recopiés tels quels. Seuls les PDF à table xref
+classique sont pris en charge, ce que produit reportlab.
+
+Usage:
+    fusion = FusionPdf()
+    yield fusion.debut()
+    for contenu in pdfs:
+        yield fusion.ajouter(contenu)
+    yield from fusion.fin()
+"""
+
+import re
+from array import array
+
+_REFERENCE = re.compile(rb'(\d+) 0 R')
+_PARENT = re.compile(rb'/Parent \d+ 0 R')
+# Références à renuméroter ; /Parent pointe vers l'arbre des pages du document fusionné
+_A_RENUMEROTER = re.compile(rb'/Parent \d+ 0 R|(\d+) 0 R')
+# Mot-clé stream après le dictionnaire (« stream » peut figurer dans un nom : /BitstreamVera...)
+_FLUX = re.compile(rb'>>\s*(stream\r?\n)')
+_ENTREE_XREF = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+
+# Objets du document fusionné écrits à la fin, numéros réservés
+PAGES = 1
+CATALOGUE = 2
+# Entrées de la table xref envoyées par morceau (20 octets chacune)
+BLOC_XREF = 4096
+
+
+class PdfInvalide(ValueError):
+    """PDF que la fusion ne sait pas lire"""
+
+
+class _Source:
+    """Objets d'un PDF source, lus à partir de sa table xref"""
+
+    def __init__(self, contenu):
+        self.contenu = contenu
+        try:
+            debut_xref = int(contenu[contenu.rindex(b'startxref') + 9:].split()[0])
+        except (ValueError, IndexError):
+            raise PdfInvalide("startxref introuvable") from None
+        if not contenu.startswith(b'xref', debut_xref):
+            raise PdfInvalide("Table xref classique attendue")
+
+        fin_xref = contenu.index(b'trailer', debut_xref)
+        self.positions = {}
+        premier, = re.match(rb'xref\s+(\d+)', contenu[debut_xref:]).groups()
+        for rang, (position, _, etat) in enumerate(_ENTREE_XREF.findall(contenu, debut_xref, fin_xref)):
+            if etat == b'n':
+                self.positions[int(premier) + rang] = int(position)
+        # Un objet s'étend jusqu'au suivant (ou à la table xref) : pas de lecture des flux binaires
+        bornes = sorted(self.positions.values()) + [debut_xref]
+        self.fins = dict(zip(bornes, bornes[1:]))
+
+        racine = re.search(rb'/Root (\d+) 0 R', contenu[fin_xref:])
+        if racine is None:
+            raise PdfInvalide("/Root introuvable")
+        self.racine = int(racine.group(1))
+
+    def objet(self, numero):
+        """(dictionnaire, reste) : le dictionnaire avant le flux éventuel, puis le flux et endobj"""
+        position = self.positions[numero]
+        corps = self.contenu[position:self.fins[position]]
+        corps = corps[corps.index(b'obj') + 3:]
+        flux = _FLUX.search(corps)
+        separation = flux.start(1) if flux else corps.rindex(b'endobj')
+        return corps[:separation], corps[separation:]
+
+    def references(self, dictionnaire):
+        return [int(numero) for numero in _REFERENCE.findall(_PARENT.sub(b'', dictionnaire))]
+
+    def pages(self):
+        """Numéros des pages, dans l'ordre du document"""
+        catalogue, _ = self.objet(self.racine)
+        pages = re.search(rb'/Pages (\d+) 0 R', catalogue)
+        if pages is None:
+            raise PdfInvalide("/Pages introuvable")
+        resultat = []
+        a_parcourir = [int(pages.group(1))]
+        while a_parcourir:
+            numero = a_parcourir.pop()
+            dictionnaire, _ = self.objet(numero)
+            if re.search(rb'/Type\s*/Pages\b', dictionnaire):
+                enfants = re.search(rb'/Kids\s*\[([^\]]*)\]', dictionnaire)
+                # Pile : les enfants sont empilés à l'envers pour garder l'ordre
+                a_parcourir.extend(reversed([int(n) for n in _REFERENCE.findall(enfants.group(1))]))
+            else:
+                resultat.append(numero)
+        return resultat
+
+
+class FusionPdf:
+    """Document PDF fusionné, écrit morceau par morceau"""
+
+    def __init__(self):
+        self.position = 0
+        # Position de chaque objet, indexée par son numéro (0 : entrée libre de la table xref)
+        self.positions = array('q', [0] * (CATALOGUE + 1))
+        self.pages = array('q')
+        self.documents = 0
+
+    def _ecrire(self, numero, corps):
+        self.positions[numero] = self.position
+        morceau = b'%d 0 obj' % numero + corps
+        self.position += len(morceau)
+        return morceau
+
+    def debut(self):
+        entete = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        self.position += len(entete)
+        return entete
+
+    def ajouter(self, contenu):
+        """Ajoute les pages d'un PDF ; retourne les octets à écrire"""
+        source = _Source(contenu)
+        pages = source.pages()
+
+        # Objets utiles aux pages (contenus, polices, images...), sans le reste du document source
+        numeros = {}
+        a_parcourir = list(pages)
+        while a_parcourir:
+            numero = a_parcourir.pop()
+            if numero in numeros:
+                continue
+            numeros[numero] = len(self.positions) + len(numeros)
+            a_parcourir.extend(source.references(source.objet(numero)[0]))
+
+        def renumeroter(correspondance):
+            if correspondance.group(1) is None:
+                return b'/Parent %d 0 R' % PAGES
+            return b'%d 0 R' % numeros[int(correspondance.group(1))]
+
+        self.positions.extend([0] * len(numeros))
+        morceaux = []
+        for numero in sorted(numeros):
+            dictionnaire, reste = source.objet(numero)
+            dictionnaire = _A_RENUMEROTER.sub(renumeroter, dictionnaire)
+            morceaux.append(self._ecrire(numeros[numero], dictionnaire + reste))
+        self.pages.extend(numeros[numero] for numero in pages)
+        self.documents += 1
+        return b''.join(morceaux)
+
+    def fin(self):
+        """Arbre des pages, catalogue, table xref et trailer (générateur, la table xref par blocs)"""
+        enfants = b' '.join(b'%d 0 R' % numero for numero in self.pages)
+        yield self._ecrire(PAGES, b'\n<< /Type /Pages /Count %d /Kids [ %s ] >>\nendobj\n' % (len(self.pages), enfants))
+        yield self._ecrire(CATALOGUE, b'\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n' % PAGES)
+
+        debut_xref = self.position
+        taille = len(self.positions)
+        yield b'xref\n0 %d\n0000000000 65535 f \n' % taille
+        for bloc in range(1, taille, BLOC_XREF):
+            yield b''.join(
+                b'%010d 00000 n \n' % position for position in self.positions[bloc:bloc + BLOC_XREF]
+            )
+        yield b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (taille, CATALOGUE, debut_xref)
+
+
+def fusionner(contenus):
+    """Générateur des octets du PDF fusionné à partir d'un itérable de PDF"""
+    fusion = FusionPdf()
+    yield fusion.debut()
+    for contenu in contenus:
+        yield fusion.ajouter(contenu)
+    yield from fusion.fin()
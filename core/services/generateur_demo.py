@@ -0,0 +1,315 @@
+"""
+Générateur de données de démonstration en volume (jusqu'à plusieurs millions de lignes)
+
+Chaque patient reçoit son propre générateur aléatoire, dérivé de la graine et
+de son rang : le contenu produit est identique d'une exécution à l'autre,
+quel que soit le découpage en lots ou le nombre de processus.
+
+Pour chaque lot de patients, tout l'arbre (rendez-vous, consultations,
+factures, ordonnances, certificats) est écrit par bulk_create dans une seule
+transaction. Les clés primaires sont relues depuis l'INSERT (RETURNING), sans
+requête supplémentaire.
+
+Le CIN des patients (clé d'identité du patient) et les numéros de
+certificat (uniques) dérivent de la graine : deux graines ne produisent
+jamais les mêmes. Une graine déjà générée dans la base, reconnue au CIN
+de ses patients, est refusée avant toute écriture, plutôt que de
+dupliquer les données ou d'échouer sur l'unicité en cours de route.
+
+Les modèles sont importés dans les fonctions pour que le module reste
+importable par un processus fils avant django.setup().
+"""
+
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+TAILLE_LOT = 2000
+# Longueur de Patient.cin
+CIN_MAX = 20
+
+NOMS = [
+    'Alaoui', 'Bennani', 'Berrada', 'Chraibi', 'El Amrani', 'El Idrissi', 'Fassi', 'Benjelloun',
+    'Tazi', 'Lahlou', 'Squalli', 'Ouazzani', 'Kettani', 'Sefrioui', 'Benkirane', 'Hajji',
+    'Dupont', 'Martin', 'Bernard', 'Dubois', 'Moreau', 'Petit', 'Durand', 'Leroy',
+]
+PRENOMS = {
+    'M': ['Mohamed', 'Youssef', 'Ahmed', 'Omar', 'Hamza', 'Karim', 'Mehdi', 'Anas', 'Jean', 'Pierre', 'Paul', 'Luc'],
+    'F': ['Fatima', 'Khadija', 'Salma', 'Imane', 'Sara', 'Nadia', 'Zineb', 'Meryem', 'Marie', 'Sophie', 'Claire', 'Anne'],
+}
+VILLES = ['Casablanca', 'Rabat', 'Marrakech', 'Fès', 'Tanger', 'Agadir', 'Meknès', 'Oujda']
+RUES = ['Rue de la Liberté', 'Avenue Mohammed V', 'Boulevard Zerktouni', 'Rue Ibn Sina', 'Avenue Hassan II']
+PROFESSIONS = ['Enseignant', 'Ingénieur', 'Commerçant', 'Étudiant', 'Retraité', 'Infirmier', 'Artisan', 'Comptable', '']
+
+MOTIFS = [
+    ('Fièvre et toux', 'Rhinopharyngite', 'Paracétamol 1g x3/jour'),
+    ('Douleurs lombaires', 'Lombalgie commune', 'Ibuprofène 400mg x3/jour'),
+    ('Contrôle tension', 'Hypertension artérielle', 'Amlodipine 5mg x1/jour'),
+    ('Maux de tête', 'Céphalée de tension', 'Paracétamol 500mg si besoin'),
+    ('Suivi diabète', 'Diabète de type 2 équilibré', 'Metformine 850mg x2/jour'),
+    ('Douleur gorge', 'Angine', 'Amoxicilline 1g x2/jour'),
+    ('Éruption cutanée', 'Eczéma', 'Dermocorticoïde local'),
+    ('Bilan annuel', 'Examen normal', ''),
+]
+TYPES_CERTIFICAT = ['arret_travail', 'aptitude', 'maladie', 'sport']
+
+# (valeur, poids) : répartitions observées dans un cabinet de taille moyenne
+STATUTS_RDV_PASSES = [('termine', 75), ('annule', 15), ('absent', 10)]
+STATUTS_RDV_FUTURS = [('prevu', 70), ('confirme', 30)]
+STATUTS_FACTURE = [('payee', 80), ('envoyee', 12), ('brouillon', 8)]
+METHODES_PAIEMENT = [('especes', 55), ('carte', 25), ('cheque', 15), ('virement', 5)]
+DUREES_RDV = [(15, 20), (20, 20), (30, 45), (45, 10), (60, 5)]
+TARIFS = [(Decimal('200.00'), 30), (Decimal('250.00'), 35), (Decimal('300.00'), 25), (Decimal('400.00'), 10)]
+
+RDV_PAR_PATIENT = (0, 8)  # bornes d'un tirage triangulaire centré sur 3
+HISTORIQUE_JOURS = 730
+HORIZON_JOURS = 60
+TAUX_FACTURE = 0.9
+TAUX_ORDONNANCE = 0.6
+TAUX_CERTIFICAT = 0.1
+TAUX_TVA = Decimal('20.00')
+
+
+def _choix(rng, valeurs_poids):
+    valeurs, poids = zip(*valeurs_poids)
+    return rng.choices(valeurs, weights=poids)[0]
+
+
+def _creneau(rng, reference):
+    """Créneau de 15 minutes un jour ouvré entre 8h et 18h, autour de la date de référence"""
+    jour = reference + timedelta(days=rng.randint(-HISTORIQUE_JOURS, HORIZON_JOURS))
+    if jour.weekday() == 6:
+        jour += timedelta(days=1)
+    minutes = rng.randrange(8 * 60, 18 * 60, 15)
+    return datetime(jour.year, jour.month, jour.day, minutes // 60, minutes % 60)
+
+
+def _cin(graine, rang):
+    return f"D{graine}-{rang:08d}"
+
+
+def _patient(rng, rang, graine, modeles):
+    sexe = rng.choice('MF')
+    nom, prenom = rng.choice(NOMS), rng.choice(PRENOMS[sexe])
+    naissance = date(1940, 1, 1) + timedelta(days=rng.randint(0, 30000))
+    return modeles['Patient'](
+        nom=nom,
+        prenom=prenom,
+        date_naissance=naissance,
+        sexe=sexe,
+        telephone=f"06{rng.randint(0, 99999999):08d}",
+        email=f"{prenom}.{nom}.{rang}@demo.ma".lower().replace(' ', '') if rng.random() < 0.6 else None,
+        adresse=f"{rng.randint(1, 300)} {rng.choice(RUES)}, {rng.choice(VILLES)}",
+        cin=_cin(graine, rang),
+        profession=rng.choice(PROFESSIONS),
+        antecedents_medicaux='Hypertension' if rng.random() < 0.15 else '',
+        allergies='Pénicilline' if rng.random() < 0.05 else '',
+    )
+
+
+def _generer_lot(debut, fin, graine, reference, modeles):
+    """Écrit les patients de rang [début, fin) et leur historique ; retourne les compteurs"""
+    from django.conf import settings
+    from django.db import transaction
+    from django.utils import timezone
+
+    Patient, RendezVous, Consultation = modeles['Patient'], modeles['RendezVous'], modeles['Consultation']
+    Facture, Ordonnance, CertificatMedical = modeles['Facture'], modeles['Ordonnance'], modeles['CertificatMedical']
+    # Créneaux tirés en heure locale ; le fuseau est attaché directement plutôt que par make_aware() à chaque ligne
+    fuseau = timezone.get_current_timezone() if settings.USE_TZ else None
+    generateurs = [random.Random(graine * 1_000_003 + rang) for rang in range(debut, fin)]
+    patients = [_patient(rng, rang, graine, modeles) for rng, rang in zip(generateurs, range(debut, fin))]
+
+    with transaction.atomic():
+        Patient.objects.bulk_create(patients)
+
+        rdvs = []
+        for rng, patient in zip(generateurs, patients):
+            for _ in range(round(rng.triangular(*RDV_PAR_PATIENT, 3))):
+                creneau = _creneau(rng, reference)
+                statuts = STATUTS_RDV_PASSES if creneau.date() < reference else STATUTS_RDV_FUTURS
+                rdvs.append((rng, RendezVous(
+                    patient=patient,
+                    date_heure=creneau.replace(tzinfo=fuseau),
+                    statut=_choix(rng, statuts),
+                    duree_prevue=_choix(rng, DUREES_RDV),
+                )))
+        RendezVous.objects.bulk_create([rdv for _, rdv in rdvs])
+
+        consultations = []
+        for rng, rdv in rdvs:
+            if rdv.statut != 'termine':
+                continue
+            motif, diagnostic, traitement = rng.choice(MOTIFS)
+            consultations.append((rng, Consultation(
+                patient=rdv.patient,
+                rendez_vous=rdv,
+                date_consultation=rdv.date_heure,
+                motif=motif,
+                diagnostic=diagnostic,
+                traitement=traitement,
+                prix_consultation=_choix(rng, TARIFS),
+            )))
+        Consultation.objects.bulk_create([consultation for _, consultation in consultations])
+
+        factures, ordonnances, certificats = [], [], []
+        certificats_patient = {}
+        for rng, consultation in consultations:
+            jour = consultation.date_consultation.date()
+
+            if rng.random() < TAUX_FACTURE:
+                statut = _choix(rng, STATUTS_FACTURE)
+                montant_tva = (consultation.prix_consultation * TAUX_TVA / 100).quantize(Decimal('0.01'))
+                factures.append(Facture(
+                    consultation=consultation,
+                    montant_ht=consultation.prix_consultation,
+                    taux_tva=TAUX_TVA,
+                    montant_tva=montant_tva,
+                    montant_total=consultation.prix_consultation + montant_tva,
+                    methode_paiement=_choix(rng, METHODES_PAIEMENT),
+                    date_facture=jour,
+                    date_paiement=jour + timedelta(days=rng.randint(0, 30)) if statut == 'payee' else None,
+                    statut=statut,
+                ))
+
+            if consultation.traitement and rng.random() < TAUX_ORDONNANCE:
+                ordonnances.append(Ordonnance(
+                    consultation=consultation,
+                    medicaments=consultation.traitement,
+                    duree_traitement=f"{rng.choice([5, 7, 10, 30])} jours",
+                    date_prescription=jour,
+                ))
+
+            if rng.random() < TAUX_CERTIFICAT:
+                duree = rng.randint(1, 15)
+                # Numéro unique pour une graine : rang du patient + rang du certificat chez ce patient
+                rang_certificat = certificats_patient.get(consultation.patient.cin, 0)
+                certificats_patient[consultation.patient.cin] = rang_certificat + 1
+                certificats.append(CertificatMedical(
+                    numero_certificat=f"DEMO-{graine}-{consultation.patient.cin[1:]}-{rang_certificat}",
+                    type_certificat=rng.choice(TYPES_CERTIFICAT),
+                    date_emission=jour,
+                    date_debut=jour,
+                    date_fin=jour + timedelta(days=duree),
+                    duree_jours=duree,
+                    diagnostic=consultation.diagnostic,
+                    patient=consultation.patient,
+                    consultation=consultation,
+                ))
+
+        Facture.objects.bulk_create(factures)
+        Ordonnance.objects.bulk_create(ordonnances)
+        CertificatMedical.objects.bulk_create(certificats)
+
+    return {
+        'patients': len(patients),
+        'rendez_vous': len(rdvs),
+        'consultations': len(consultations),
+        'factures': len(factures),
+        'ordonnances': len(ordonnances),
+        'certificats': len(certificats),
+    }
+
+
+def _modeles():
+    from core.models import Consultation, Facture, Ordonnance, Patient, RendezVous
+    from core.models_certificates import CertificatMedical
+
+    return {
+        'Patient': Patient,
+        'RendezVous': RendezVous,
+        'Consultation': Consultation,
+        'Facture': Facture,
+        'Ordonnance': Ordonnance,
+        'CertificatMedical': CertificatMedical,
+    }
+
+
+def _generer_tranche(debut, fin, graine, reference, taille_lot):
+    """Tâche d'un processus : les lots successifs d'une tranche de rangs"""
+    modeles = _modeles()
+    totaux = {}
+    for lot in range(debut, fin, taille_lot):
+        for cle, nombre in _generer_lot(lot, min(lot + taille_lot, fin), graine, reference, modeles).items():
+            totaux[cle] = totaux.get(cle, 0) + nombre
+    return totaux
+
+
+def verifier_graine(graine):
+    """Lève ValueError si des données de cette graine sont déjà en base"""
+    from core.models import Patient
+
+    # Chaque exécution crée des patients, au contraire des certificats (TAUX_CERTIFICAT)
+    if Patient.objects.filter(cin__startswith=_cin(graine, 0)[:-8]).exists():
+        raise ValueError(
+            f"Des données de démonstration de la graine {graine} existent déjà : "
+            f"choisissez une autre graine (--seed) ou supprimez-les d'abord"
+        )
+
+
+def _initialiser_worker():
+    import django
+    from django.db import connections
+
+    django.setup()
+    # Les connexions héritées du parent ne doivent pas être partagées
+    connections.close_all()
+
+
+def generer(nombre_patients, graine=42, taille_lot=TAILLE_LOT, workers=1, reference=None, progression=None):
+    """
+    Génère nombre_patients patients et leur historique.
+
+    reference est la date autour de laquelle les rendez-vous sont répartis
+    (aujourd'hui par défaut) ; la fixer rend aussi les dates reproductibles.
+    Avec workers > 1, les rangs sont découpés en tranches contiguës traitées
+    par des processus distincts. SQLite n'admettant qu'un écrivain à la
+    fois, la génération y reste dans le processus courant.
+
+    Retourne les compteurs par table, le nombre de processus, la durée et
+    le débit en lignes/s.
+    """
+    from django.db import connection, connections
+
+    if len(_cin(graine, max(nombre_patients - 1, 0))) > CIN_MAX:
+        raise ValueError(f"Graine {graine} trop longue pour le CIN de {nombre_patients} patients")
+    verifier_graine(graine)
+    if connection.vendor == 'sqlite':
+        workers = 1
+    reference = reference or date.today()
+    debut_chrono = time.perf_counter()
+    totaux = {}
+
+    def cumuler(resultat):
+        for cle, nombre in resultat.items():
+            totaux[cle] = totaux.get(cle, 0) + nombre
+        if progression:
+            progression(totaux)
+
+    if workers <= 1:
+        modeles = _modeles()
+        for lot in range(0, nombre_patients, taille_lot):
+            cumuler(_generer_lot(lot, min(lot + taille_lot, nombre_patients), graine, reference, modeles))
+    else:
+        connections.close_all()
+        # Plusieurs tranches par processus pour lisser la fin de génération
+        pas = max(taille_lot, -(-nombre_patients // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_worker) as executor:
+            futures = [
+                executor.submit(_generer_tranche, debut, min(debut + pas, nombre_patients), graine, reference, taille_lot)
+                for debut in range(0, nombre_patients, pas)
+            ]
+            for future in futures:
+                cumuler(future.result())
+
+    duree = time.perf_counter() - debut_chrono
+    lignes = sum(totaux.values())
+    return {
+        'tables': totaux,
+        'workers': workers,
+        'lignes': lignes,
+        'duree_s': round(duree, 2),
+        'lignes_par_s': round(lignes / duree) if duree else 0,
+    }
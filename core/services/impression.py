@@ -0,0 +1,83 @@
+"""
+Impression groupée : un seul PDF pour les ordonnances et certificats d'une période
+
+Les documents sont rendus par le pool de core.services.travaux_pdf (et donc
+servis par son cache s'ils l'ont déjà été), quelques-uns d'avance
+(FENETRE), puis ajoutés un à un au PDF fusionné, envoyé au fur et à mesure.
+La mémoire utilisée ne dépend pas du nombre de documents : les requêtes
+sont parcourues par paquets et seul le document en cours est en mémoire.
+
+Ordre : par jour, puis par patient (ses certificats, puis ses ordonnances).
+"""
+
+import heapq
+from collections import deque
+
+from core.models import Ordonnance
+from core.models_certificates import CertificatMedical
+from core.services import travaux_pdf
+from core.services.fusion_pdf import FusionPdf
+
+# Rendus soumis d'avance au pool pendant l'envoi du document courant
+FENETRE = 8
+PAQUET = 200
+# Attente maximale du rendu d'un document (secondes)
+DELAI_RENDU = 60
+
+
+def _certificats(debut, fin):
+    return (
+        CertificatMedical.objects.select_related('patient')
+        .filter(date_emission__range=(debut, fin))
+        .order_by('date_emission', 'patient_id', 'pk')
+    )
+
+
+def _ordonnances(debut, fin):
+    return (
+        Ordonnance.objects.select_related('consultation__patient')
+        .filter(date_prescription__range=(debut, fin))
+        .order_by('date_prescription', 'consultation__patient_id', 'pk')
+    )
+
+
+def compter(debut, fin):
+    """Nombre de documents de la période (certificats + ordonnances)"""
+    return _certificats(debut, fin).count() + _ordonnances(debut, fin).count()
+
+
+def documents(debut, fin):
+    """(type, objet) des documents de la période, dans l'ordre d'impression"""
+    certificats = (
+        ((certificat.date_emission, certificat.patient_id, 0, certificat.pk), 'certificat', certificat)
+        for certificat in _certificats(debut, fin).iterator(chunk_size=PAQUET)
+    )
+    ordonnances = (
+        ((ordonnance.date_prescription, ordonnance.consultation.patient_id, 1, ordonnance.pk), 'ordonnance', ordonnance)
+        for ordonnance in _ordonnances(debut, fin).iterator(chunk_size=PAQUET)
+    )
+    for _, type_document, objet in heapq.merge(certificats, ordonnances, key=lambda element: element[0]):
+        yield type_document, objet
+
+
+def _lire(cle):
+    with open(travaux_pdf.attendre(cle, DELAI_RENDU), 'rb') as f:
+        return f.read()
+
+
+def flux_pdf(debut, fin, fusion=None):
+    """Générateur des octets du PDF fusionné de la période"""
+    fusion = fusion or FusionPdf()
+    cabinet = travaux_pdf.donnees_cabinet()
+    yield fusion.debut()
+
+    en_attente = deque()
+    for type_document, objet in documents(debut, fin):
+        extraire = travaux_pdf.SOURCES[type_document][1]
+        en_attente.append(travaux_pdf.soumettre_donnees(type_document, extraire(objet, cabinet)))
+        if len(en_attente) >= FENETRE:
+            yield fusion.ajouter(_lire(en_attente.popleft()))
+    while en_attente:
+        yield fusion.ajouter(_lire(en_attente.popleft()))
+
+    yield from fusion.fin()
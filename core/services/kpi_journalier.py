@@ -0,0 +1,226 @@
+"""
+Maintenance de la table de cumul journalier des KPI (core_kpi_daily)
+
+reconstruire() recalcule un intervalle de jours à partir des tables brutes,
+en une requête agrégée par source. Les signaux ne recalculent que le ou
+les jours touchés par une sauvegarde ou une suppression, après le commit.
+Les KPI d'une période sont ensuite une simple somme des lignes du cumul.
+
+connecter_signaux() doit être appelé depuis CoreConfig.ready().
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.db import models, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from core.models import Consultation, Facture, Patient, RendezVous
+from core.models_certificates import CertificatMedical
+from core.models_kpi import KPIJournalier
+from core.services.periodes import filtre_periode
+
+
+# Colonne du cumul pour chaque statut de rendez-vous
+COLONNES_STATUT_RDV = {
+    'prevu': 'rdv_prevus',
+    'confirme': 'rdv_confirmes',
+    'termine': 'rdv_termines',
+    'annule': 'rdv_annules',
+    'absent': 'rdv_absents',
+}
+
+# Champ date qui rattache chaque source à un jour du cumul
+SOURCES = {
+    Consultation: 'date_consultation',
+    Facture: 'date_facture',
+    RendezVous: 'date_heure',
+    CertificatMedical: 'date_emission',
+    Patient: 'date_creation',
+}
+
+# Fonctions notifiées des jours modifiés, voir abonner()
+_ABONNES = []
+
+COLONNES_SOMMEES = [
+    'consultations', 'revenus_ht', 'revenus_tva', 'revenus_ttc', 'nouveaux_patients',
+    *COLONNES_STATUT_RDV.values(), 'certificats',
+]
+
+
+def _par_jour(queryset, champ, debut, fin, *regroupement, **agregats):
+    """Agrégats de la source regroupés par jour local sur [début, fin)"""
+    modele = queryset.model
+    if debut is not None:
+        queryset = queryset.filter(filtre_periode(modele, champ, debut, fin))
+
+    if isinstance(modele._meta.get_field(champ), models.DateTimeField):
+        queryset = queryset.annotate(jour=TruncDate(champ))
+    else:
+        queryset = queryset.annotate(jour=models.F(champ))
+
+    return queryset.order_by().values('jour', *regroupement).annotate(**agregats)
+
+
+def _verrouiller(debut, fin):
+    """
+    Verrouille les lignes du cumul sur [début, fin) jusqu'à la fin de la
+    transaction, en créant d'abord celles qui manquent.
+
+    Deux recalculs du même jour s'exécutent ainsi l'un après l'autre, et le
+    second agrège des tables où les écritures du premier sont visibles : un
+    calcul ancien ne peut pas écraser un plus récent. Sur SQLite, l'INSERT
+    initial prend le verrou d'écriture de la base avant toute lecture.
+    """
+    if debut is not None:
+        jours = [debut + timedelta(days=rang) for rang in range((fin - debut).days)]
+        KPIJournalier.objects.bulk_create([KPIJournalier(jour=jour) for jour in jours], ignore_conflicts=True)
+    lignes = KPIJournalier.objects.select_for_update()
+    if debut is not None:
+        lignes = lignes.filter(jour__gte=debut, jour__lt=fin)
+    list(lignes.values_list('pk', flat=True))
+
+
+def reconstruire(debut=None, fin=None):
+    """
+    Recalcule les lignes du cumul sur [début, fin), ou toute la table si
+    aucune borne n'est donnée. Retourne le nombre de jours écrits.
+
+    Les agrégats sont lus sous le verrou des lignes concernées et écrits
+    par un upsert sur jour : deux recalculs concurrents du même jour ne se
+    heurtent pas sur l'unicité, et le dernier écrit les totaux les plus récents.
+    """
+    with transaction.atomic():
+        _verrouiller(debut, fin)
+        lignes = _agreger(debut, fin)
+
+        obsoletes = KPIJournalier.objects.exclude(jour__in=list(lignes))
+        if debut is not None:
+            obsoletes = obsoletes.filter(jour__gte=debut, jour__lt=fin)
+        obsoletes.delete()
+        KPIJournalier.objects.bulk_create(
+            [KPIJournalier(jour=jour, **valeurs) for jour, valeurs in sorted(lignes.items())],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['jour'],
+            update_fields=[*COLONNES_SOMMEES, 'date_maj'],
+        )
+
+    return len(lignes)
+
+
+def _agreger(debut, fin):
+    """Indicateurs par jour sur [début, fin), lus dans les tables brutes"""
+    lignes = defaultdict(dict)
+
+    for ligne in _par_jour(Consultation.objects.all(), 'date_consultation', debut, fin, nombre=Count('pk')):
+        lignes[ligne['jour']]['consultations'] = ligne['nombre']
+
+    factures = _par_jour(
+        Facture.objects.filter(statut='payee'), 'date_facture', debut, fin,
+        ht=Sum('montant_ht'), tva=Sum('montant_tva'), ttc=Sum('montant_total'),
+    )
+    for ligne in factures:
+        lignes[ligne['jour']].update(
+            revenus_ht=ligne['ht'] or Decimal('0'),
+            revenus_tva=ligne['tva'] or Decimal('0'),
+            revenus_ttc=ligne['ttc'] or Decimal('0'),
+        )
+
+    for ligne in _par_jour(Patient.objects.all(), 'date_creation', debut, fin, nombre=Count('pk')):
+        lignes[ligne['jour']]['nouveaux_patients'] = ligne['nombre']
+
+    for ligne in _par_jour(RendezVous.objects.all(), 'date_heure', debut, fin, 'statut', nombre=Count('pk')):
+        colonne = COLONNES_STATUT_RDV.get(ligne['statut'])
+        if colonne:
+            lignes[ligne['jour']][colonne] = ligne['nombre']
+
+    for ligne in _par_jour(CertificatMedical.objects.all(), 'date_emission', debut, fin, nombre=Count('pk')):
+        lignes[ligne['jour']]['certificats'] = ligne['nombre']
+
+    return lignes
+
+
+def recalculer_jour(jour):
+    """Recalcule la ligne du cumul d'un seul jour"""
+    return reconstruire(jour, jour + timedelta(days=1))
+
+
+def kpis_periode(debut, fin):
+    """Somme des indicateurs du cumul sur [début, fin)"""
+    totaux = KPIJournalier.objects.filter(jour__gte=debut, jour__lt=fin).aggregate(
+        **{colonne: Sum(colonne) for colonne in COLONNES_SOMMEES}
+    )
+    return {colonne: valeur or 0 for colonne, valeur in totaux.items()}
+
+
+def _jour_instance(instance):
+    """Jour local de rattachement d'une instance (None si le champ n'est pas chargé)"""
+    valeur = instance.__dict__.get(SOURCES[type(instance)])
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).date() if timezone.is_aware(valeur) else valeur.date()
+    return valeur
+
+
+def _memoriser_jour(sender, instance, **kwargs):
+    # Le jour initial permet de corriger aussi l'ancien jour quand la date change
+    instance._kpi_jour_initial = _jour_instance(instance)
+
+
+def abonner(callback):
+    """
+    Enregistre une fonction appelée après commit avec l'ensemble des jours
+    modifiés, une fois le cumul recalculé (ex: invalidation du cache KPI).
+    """
+    if callback not in _ABONNES:
+        _ABONNES.append(callback)
+
+
+def desabonner(callback):
+    if callback in _ABONNES:
+        _ABONNES.remove(callback)
+
+
+def _appliquer(jours):
+    for jour in jours:
+        recalculer_jour(jour)
+    for callback in _ABONNES:
+        callback(jours)
+
+
+def _planifier(jours):
+    jours = {jour for jour in jours if jour is not None}
+    if jours:
+        transaction.on_commit(partial(_appliquer, jours))
+
+
+def _apres_sauvegarde(sender, instance, **kwargs):
+    _planifier({getattr(instance, '_kpi_jour_initial', None), _jour_instance(instance)})
+    instance._kpi_jour_initial = _jour_instance(instance)
+
+
+def _apres_suppression(sender, instance, **kwargs):
+    _planifier({_jour_instance(instance)})
+
+
+def connecter_signaux():
+    """Branche la mise à jour incrémentale du cumul sur les modèles sources"""
+    for modele in SOURCES:
+        nom = modele.__name__
+        post_init.connect(_memoriser_jour, sender=modele, dispatch_uid=f'kpi_init_{nom}')
+        post_save.connect(_apres_sauvegarde, sender=modele, dispatch_uid=f'kpi_save_{nom}')
+        post_delete.connect(_apres_suppression, sender=modele, dispatch_uid=f'kpi_delete_{nom}')
+
+
+def deconnecter_signaux():
+    """Inverse de connecter_signaux() (tests)"""
+    for modele in SOURCES:
+        nom = modele.__name__
+        post_init.disconnect(sender=modele, dispatch_uid=f'kpi_init_{nom}')
+        post_save.disconnect(sender=modele, dispatch_uid=f'kpi_save_{nom}')
+        post_delete.disconnect(sender=modele, dispatch_uid=f'kpi_delete_{nom}')
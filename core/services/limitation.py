@@ -0,0 +1,234 @@
+"""
+Limitation du nombre de requêtes par clé (adresse IP), à fenêtre glissante
+
+Compteur à fenêtre glissante approchée : pour chaque clé, le numéro de la
+fenêtre courante, le nombre de requêtes de cette fenêtre et celui de la
+fenêtre précédente. L'estimation sur les `fenetre` dernières secondes est
+
+    precedent * (1 - écoulé / fenetre) + courant
+
+Trois entiers par clé, quel que soit le débit : la mémoire est fixe, au
+contraire d'un journal des horodatages. Les requêtes refusées comptent
+aussi : un client qui insiste reste bloqué tant qu'il insiste.
+
+Trois stockages :
+- 'memoire' : dictionnaire du processus, borné à LIMITE_CAPACITE clés ;
+              les clés expirées (deux fenêtres sans requête) sont évincées
+              au fil des appels, les moins récentes si la capacité est atteinte.
+              Chaque worker gunicorn a ses propres compteurs.
+- 'sqlite'  : table d'un fichier SQLite en mode WAL, partagée par les
+              workers d'une même machine ; un seul UPSERT ... RETURNING par
+              requête, purge des clés expirées une fois par fenêtre.
+- 'cache'   : cache Django LIMITE_CACHE_ALIAS (Redis en production), partagé
+              par toutes les machines ; deux clés par fenêtre avec expiration,
+              incr atomique.
+
+Réglages (settings):
+    LIMITE_REQUETES     requêtes autorisées par fenêtre (défaut: 120)
+    LIMITE_FENETRE_S    durée de la fenêtre (défaut: 60)
+    LIMITE_BACKEND      'memoire', 'sqlite' ou 'cache' (défaut: 'memoire')
+    LIMITE_CAPACITE     clés gardées en mémoire au plus (défaut: 100000)
+    LIMITE_SQLITE       fichier SQLite (défaut: <tmp>/erp_limitation.sqlite3)
+    LIMITE_CACHE_ALIAS  alias du cache (défaut: 'default')
+
+mesurer() donne le coût d'un appel en microsecondes (`manage_erp.py limiteur`).
+"""
+
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+LIMITE = 120
+FENETRE_S = 60
+CAPACITE = 100000
+PREFIXE = 'limite'
+# Coût maximal d'un appel, en microsecondes
+BUDGET_US = 50
+
+Decision = namedtuple('Decision', ['autorise', 'restant', 'reessayer_dans'])
+
+
+class Limiteur:
+    """Calcul de la fenêtre glissante ; le stockage des compteurs est dans les sous-classes"""
+
+    def __init__(self, limite=None, fenetre=None):
+        self.limite = limite or getattr(settings, 'LIMITE_REQUETES', LIMITE)
+        self.fenetre = fenetre or getattr(settings, 'LIMITE_FENETRE_S', FENETRE_S)
+
+    def _compter(self, cle, numero):
+        """Compte une requête dans la fenêtre `numero` ; retourne (courant, precedent)"""
+        raise NotImplementedError
+
+    def verifier(self, cle, maintenant=None):
+        """Compte une requête de `cle` et indique si elle est autorisée"""
+        # Horloge murale, pas monotonic : elle doit être la même pour tous les processus
+        maintenant = time.time() if maintenant is None else maintenant
+        numero = int(maintenant // self.fenetre)
+        ecoule = maintenant - numero * self.fenetre
+        courant, precedent = self._compter(cle, numero)
+
+        estimation = precedent * (1 - ecoule / self.fenetre) + courant
+        if estimation <= self.limite:
+            return Decision(True, int(self.limite - estimation), 0)
+        return Decision(False, 0, self._attente(courant, precedent, ecoule))
+
+    def _attente(self, courant, precedent, ecoule):
+        """Secondes avant qu'une nouvelle requête soit autorisée"""
+        if courant <= self.limite:
+            # Dans cette fenêtre, quand la part de la précédente aura assez décru pour une requête de plus
+            return max(0.0, self.fenetre * (1 - (self.limite - courant - 1) / precedent) - ecoule)
+        # Fenêtre suivante : le compte courant devient le précédent
+        reste = self.fenetre - ecoule
+        return reste + self.fenetre * max(0.0, 1 - (self.limite - 1) / courant)
+
+    def fermer(self):
+        pass
+
+
+class LimiteurMemoire(Limiteur):
+    """Compteurs du processus, au plus `capacite` clés"""
+
+    def __init__(self, limite=None, fenetre=None, capacite=None):
+        super().__init__(limite, fenetre)
+        self.capacite = capacite or getattr(settings, 'LIMITE_CAPACITE', CAPACITE)
+        # cle -> [numero, courant, precedent], de la moins récemment vue à la plus récente
+        self._etats = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def _evincer(self, numero):
+        # Les clés les moins récentes sont en tête : deux évictions au plus par appel suffisent à suivre
+        for _ in range(2):
+            if not self._etats:
+                return
+            cle, etat = next(iter(self._etats.items()))
+            if etat[0] >= numero - 1 and len(self._etats) < self.capacite:
+                return
+            del self._etats[cle]
+
+    def _compter(self, cle, numero):
+        with self._verrou:
+            etat = self._etats.get(cle)
+            if etat is None:
+                self._evincer(numero)
+                etat = self._etats[cle] = [numero, 0, 0]
+            else:
+                self._etats.move_to_end(cle)
+                if etat[0] != numero:
+                    etat[2] = etat[1] if etat[0] == numero - 1 else 0
+                    etat[0], etat[1] = numero, 0
+            etat[1] += 1
+            return etat[1], etat[2]
+
+    def __len__(self):
+        return len(self._etats)
+
+
+class LimiteurSqlite(Limiteur):
+    """Compteurs dans un fichier SQLite (WAL), partagés par les processus de la machine"""
+
+    TABLE = 'limitation'
+
+    SQL_COMPTER = f"""
+        INSERT INTO {TABLE} (cle, numero, courant, precedent) VALUES (?, ?, 1, 0)
+        ON CONFLICT (cle) DO UPDATE SET
+            precedent = CASE
+                WHEN excluded.numero = numero THEN precedent
+                WHEN excluded.numero = numero + 1 THEN courant
+                ELSE 0
+            END,
+            courant = CASE WHEN excluded.numero = numero THEN courant + 1 ELSE 1 END,
+            numero = excluded.numero
+        RETURNING courant, precedent
+    """
+
+    def __init__(self, limite=None, fenetre=None, chemin=None):
+        super().__init__(limite, fenetre)
+        self.chemin = chemin or getattr(settings, 'LIMITE_SQLITE', None) or os.path.join(
+            tempfile.gettempdir(), 'erp_limitation.sqlite3'
+        )
+        self._local = threading.local()
+
+    def _connexion(self, numero):
+        local = self._local
+        # Une connexion par thread, recréée après un fork
+        if getattr(local, 'pid', None) != os.getpid():
+            dossier = os.path.dirname(self.chemin)
+            if dossier:
+                os.makedirs(dossier, exist_ok=True)
+            connexion = sqlite3.connect(self.chemin, timeout=5, isolation_level=None, check_same_thread=False)
+            connexion.execute('PRAGMA journal_mode=WAL')
+            # Compteurs éphémères : perdre les dernières écritures sur une panne de courant est sans gravité
+            connexion.execute('PRAGMA synchronous=OFF')
+            connexion.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.TABLE} ('
+                'cle TEXT PRIMARY KEY, numero INTEGER NOT NULL, '
+                'courant INTEGER NOT NULL, precedent INTEGER NOT NULL) WITHOUT ROWID'
+            )
+            local.connexion, local.pid, local.purge = connexion, os.getpid(), numero
+        elif local.purge != numero:
+            local.purge = numero
+            local.connexion.execute(f'DELETE FROM {self.TABLE} WHERE numero < ?', (numero - 1,))
+        return local.connexion
+
+    def _compter(self, cle, numero):
+        return self._connexion(numero).execute(self.SQL_COMPTER, (cle, numero)).fetchone()
+
+    def fermer(self):
+        if getattr(self._local, 'pid', None) == os.getpid():
+            self._local.connexion.close()
+            self._local.pid = None
+
+
+class LimiteurCache(Limiteur):
+    """Compteurs dans le cache Django (Redis), partagés par toutes les machines"""
+
+    def __init__(self, limite=None, fenetre=None, alias=None, prefixe=PREFIXE):
+        super().__init__(limite, fenetre)
+        self.cache = caches[alias or getattr(settings, 'LIMITE_CACHE_ALIAS', 'default')]
+        self.prefixe = prefixe
+
+    def _compter(self, cle, numero):
+        courante = f'{self.prefixe}:{cle}:{numero}'
+        try:
+            courant = self.cache.incr(courante)
+        except ValueError:
+            # Première requête de la fenêtre ; add() tranche entre deux processus simultanés
+            if self.cache.add(courante, 1, timeout=2 * self.fenetre + 1):
+                courant = 1
+            else:
+                courant = self.cache.incr(courante)
+        return courant, self.cache.get(f'{self.prefixe}:{cle}:{numero - 1}', 0)
+
+
+BACKENDS = {
+    'memoire': LimiteurMemoire,
+    'sqlite': LimiteurSqlite,
+    'cache': LimiteurCache,
+}
+
+
+def limiteur_configure(limite=None, fenetre=None):
+    return BACKENDS[getattr(settings, 'LIMITE_BACKEND', 'memoire')](limite, fenetre)
+
+
+def en_secondes(attente):
+    """Valeur de l'en-tête Retry-After"""
+    return max(1, math.ceil(attente))
+
+
+def mesurer(limiteur, appels=20000, cles=1000):
+    """Coût moyen de verifier(), en microsecondes, sur `cles` adresses différentes"""
+    adresses = [f'10.{rang // 65536}.{rang // 256 % 256}.{rang % 256}' for rang in range(cles)]
+    for adresse in adresses:
+        limiteur.verifier(adresse)
+    debut = time.perf_counter()
+    for rang in range(appels):
+        limiteur.verifier(adresses[rang % cles])
+    return (time.perf_counter() - debut) / appels * 1e6
@@ -0,0 +1,60 @@
+"""
+Querysets des pages de liste (/rdv/, /consultations/, /factures/...)
+
+Chaque liste charge ses relations affichées par jointure (select_related)
+et se limite aux colonnes affichées (only()) : une page coûte une requête,
+quel que soit le nombre de lignes. Un gabarit qui lit une colonne non
+chargée déclenche une requête par ligne, que DetecteurRequetesRepeteesMiddleware
+signale en développement ; ajouter alors la colonne à la liste ci-dessous.
+"""
+
+from core.models import Consultation, Facture, Ordonnance, Patient, RendezVous
+from core.models_certificates import CertificatMedical
+
+
+# Colonnes du patient affichées dans toutes les listes
+COLONNES_PATIENT = ('nom', 'prenom', 'telephone')
+
+
+def _patient(chemin):
+    return [f'{chemin}__{colonne}' for colonne in COLONNES_PATIENT]
+
+
+def patients():
+    return Patient.objects.only(
+        *COLONNES_PATIENT, 'date_naissance', 'sexe', 'cin', 'date_creation'
+    ).order_by('nom', 'prenom', 'pk')
+
+
+def rendez_vous():
+    return RendezVous.objects.select_related('patient').only(
+        'date_heure', 'statut', 'duree_prevue', 'remarque', *_patient('patient'),
+    ).order_by('-date_heure', '-pk')
+
+
+def consultations():
+    return Consultation.objects.select_related('patient').only(
+        'date_consultation', 'motif', 'diagnostic', 'prix_consultation', 'rendez_vous', *_patient('patient'),
+    ).order_by('-date_consultation', '-pk')
+
+
+def factures():
+    # Facture -> Consultation -> Patient en une seule jointure
+    return Facture.objects.select_related('consultation__patient').only(
+        'date_facture', 'statut', 'montant_ht', 'montant_tva', 'montant_total', 'methode_paiement', 'date_paiement',
+        'consultation__date_consultation', 'consultation__motif', *_patient('consultation__patient'),
+    ).order_by('-date_facture', '-pk')
+
+
+def ordonnances():
+    return Ordonnance.objects.select_related('consultation__patient').only(
+        'date_prescription', 'medicaments', 'duree_traitement',
+        'consultation__date_consultation', *_patient('consultation__patient'),
+    ).order_by('-date_prescription', '-pk')
+
+
+def certificats():
+    return CertificatMedical.objects.select_related('patient').only(
+        'numero_certificat', 'type_certificat', 'date_emission', 'date_debut', 'date_fin', 'duree_jours',
+        'est_active', 'consultation', *_patient('patient'),
+    ).order_by('-date_emission', '-pk')
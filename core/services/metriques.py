@@ -0,0 +1,341 @@
+"""
+Métriques de performance par vue et requêtes SQL lentes
+
+Chaque vue a trois histogrammes : durée totale, temps SQL et nombre de
+requêtes SQL. Les histogrammes ont des bornes fixes (BORNES_MS,
+BORNES_REQUETES) : ils s'additionnent d'un processus à l'autre, et
+p50/p95/p99 s'en déduisent par interpolation dans la tranche, comme
+histogram_quantile de Prometheus.
+
+Les requêtes SQL lentes sont regroupées par empreinte : la forme de la
+requête (core.middleware_requetes.forme_sql) dont les littéraux restants
+(nombres, chaînes) sont remplacés par ?. Pour chacune : nombre, temps
+total et maximal, vue et ligne du code applicatif de la dernière
+occurrence. Les REQUETES_LENTES_MAX empreintes au temps total le plus
+élevé sont gardées.
+
+Chaque processus écrit régulièrement un instantané JSON de son registre
+dans PERF_DOSSIER, nommé par son pid et son instant de démarrage ;
+/metrics et `manage_erp.py perf` lisent la somme des instantanés de tous
+les processus (workers gunicorn compris). Les instantanés des processus
+terminés (worker recyclé par max_requests) sont ajoutés au cumul
+cumul.json puis supprimés : les totaux ne décroissent jamais, comme
+l'attend Prometheus. Le cumul et la lecture se font sous un verrou du
+dossier (fcntl) ; sans fcntl (Windows), les instantanés des processus
+terminés restent lus tels quels.
+
+Réglages (settings):
+    PERF_DOSSIER          dossier des instantanés (défaut: <tmp>/erp_perf)
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : ni verrou du dossier ni cumul des processus terminés
+    fcntl = None
+
+from django.conf import settings
+
+from core.middleware_requetes import forme_sql
+
+# Bornes supérieures des tranches ; une dernière tranche reçoit le reste (+Inf)
+BORNES_MS = (
+    1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 70, 100, 150, 200, 300, 500, 700,
+    1000, 1500, 2000, 3000, 5000, 10000, 30000,
+)
+BORNES_REQUETES = (0, 1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 100, 200, 500, 1000)
+
+HISTOGRAMMES = {
+    # nom : (bornes, nom Prometheus, échelle des bornes exposées)
+    'duree': (BORNES_MS, 'erp_vue_duree_secondes', 1000),
+    'sql': (BORNES_MS, 'erp_vue_sql_secondes', 1000),
+    'requetes': (BORNES_REQUETES, 'erp_vue_requetes_sql', 1),
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+REQUETES_LENTES_MAX = 200
+CUMUL = 'cumul.json'
+VERROU = '.verrou'
+
+_CHAINES = re.compile(r"'(?:[^']|'')*'")
+_NOMBRES = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+
+
+def empreinte_sql(sql):
+    """Forme normalisée d'une requête : paramètres, listes IN et littéraux confondus"""
+    return _NOMBRES.sub('?', _CHAINES.sub('?', forme_sql(sql)))
+
+
+class Histogramme:
+    """Comptes par tranche de bornes fixes, somme et maximum des observations"""
+
+    def __init__(self, bornes, comptes=None, somme=0.0, maximum=0.0):
+        self.bornes = bornes
+        self.comptes = comptes or [0] * (len(bornes) + 1)
+        self.somme = somme
+        self.maximum = maximum
+
+    @property
+    def nombre(self):
+        return sum(self.comptes)
+
+    def observer(self, valeur):
+        self.comptes[bisect_left(self.bornes, valeur)] += 1
+        self.somme += valeur
+        self.maximum = max(self.maximum, valeur)
+
+    def ajouter(self, autre):
+        self.comptes = [a + b for a, b in zip(self.comptes, autre.comptes)]
+        self.somme += autre.somme
+        self.maximum = max(self.maximum, autre.maximum)
+
+    def quantile(self, q):
+        """Estimation du quantile q, interpolée dans sa tranche (None sans observation)"""
+        total = self.nombre
+        if not total:
+            return None
+        rang = q * total
+        cumul = 0
+        for indice, compte in enumerate(self.comptes):
+            if compte and cumul + compte >= rang:
+                bas = self.bornes[indice - 1] if indice else 0
+                haut = self.bornes[indice] if indice < len(self.bornes) else self.maximum
+                return min(bas + (haut - bas) * (rang - cumul) / compte, self.maximum)
+            cumul += compte
+        return self.maximum
+
+    def en_dict(self):
+        return {'comptes': self.comptes, 'somme': self.somme, 'maximum': self.maximum}
+
+
+class Registre:
+    """Métriques d'un processus (ou somme de plusieurs) ; toutes les méthodes sont thread-safe"""
+
+    def __init__(self):
+        self.vues = {}
+        self.lentes = {}
+        self._verrou = threading.Lock()
+
+    def _histogrammes(self, vue):
+        if vue not in self.vues:
+            self.vues[vue] = {nom: Histogramme(bornes) for nom, (bornes, _, _) in HISTOGRAMMES.items()}
+        return self.vues[vue]
+
+    def observer_vue(self, vue, duree_ms, sql_ms=None, requetes=None):
+        """Une requête HTTP ; sql_ms et requetes à None si non mesurés (vues asynchrones)"""
+        with self._verrou:
+            histogrammes = self._histogrammes(vue)
+            histogrammes['duree'].observer(duree_ms)
+            if requetes is not None:
+                histogrammes['sql'].observer(sql_ms)
+                histogrammes['requetes'].observer(requetes)
+
+    def observer_requete_lente(self, sql, duree_ms, vue, origine):
+        empreinte = empreinte_sql(sql)
+        cle = hashlib.sha1(empreinte.encode()).hexdigest()[:12]
+        with self._verrou:
+            lente = self.lentes.get(cle)
+            if lente is None:
+                if len(self.lentes) >= REQUETES_LENTES_MAX:
+                    moindre = min(self.lentes, key=lambda c: self.lentes[c]['total_ms'])
+                    if self.lentes[moindre]['total_ms'] >= duree_ms:
+                        return
+                    del self.lentes[moindre]
+                lente = self.lentes[cle] = {'sql': empreinte, 'nombre': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            lente['nombre'] += 1
+            lente['total_ms'] += duree_ms
+            lente['max_ms'] = max(lente['max_ms'], duree_ms)
+            lente['vue'] = vue
+            lente['origine'] = origine
+
+    def ajouter(self, autre):
+        """Ajoute les métriques d'un autre registre (instantané d'un autre processus)"""
+        for vue, histogrammes in autre.vues.items():
+            for nom, histogramme in histogrammes.items():
+                self._histogrammes(vue)[nom].ajouter(histogramme)
+        for cle, lente in autre.lentes.items():
+            if cle in self.lentes:
+                cumul = self.lentes[cle]
+                cumul['nombre'] += lente['nombre']
+                cumul['total_ms'] += lente['total_ms']
+                cumul['max_ms'] = max(cumul['max_ms'], lente['max_ms'])
+            else:
+                self.lentes[cle] = dict(lente)
+
+    def en_dict(self):
+        with self._verrou:
+            return {
+                'vues': {
+                    vue: {nom: histogramme.en_dict() for nom, histogramme in histogrammes.items()}
+                    for vue, histogrammes in self.vues.items()
+                },
+                'lentes': {cle: dict(lente) for cle, lente in self.lentes.items()},
+            }
+
+    @classmethod
+    def depuis_dict(cls, donnees):
+        registre = cls()
+        for vue, histogrammes in donnees.get('vues', {}).items():
+            registre.vues[vue] = {
+                nom: Histogramme(HISTOGRAMMES[nom][0], **histogrammes[nom]) for nom in HISTOGRAMMES
+            }
+        registre.lentes = donnees.get('lentes', {})
+        return registre
+
+    def resume(self):
+        """[(vue, nombre, {histogramme: (p50, p95, p99)})], vues triées par p95 de durée décroissant"""
+        lignes = []
+        for vue, histogrammes in self.vues.items():
+            quantiles = {
+                nom: tuple(histogramme.quantile(q) for q in QUANTILES)
+                for nom, histogramme in histogrammes.items()
+            }
+            lignes.append((vue, histogrammes['duree'].nombre, quantiles))
+        return sorted(lignes, key=lambda ligne: ligne[2]['duree'][1] or 0, reverse=True)
+
+    def requetes_lentes(self):
+        """Empreintes lentes, par temps total décroissant"""
+        return sorted(self.lentes.values(), key=lambda lente: lente['total_ms'], reverse=True)
+
+
+registre = Registre()
+_instance = None
+
+
+def dossier():
+    return getattr(settings, 'PERF_DOSSIER', None) or os.path.join(tempfile.gettempdir(), 'erp_perf')
+
+
+def _nom_instantane():
+    """Nom de l'instantané du processus ; l'instant de démarrage évite d'écraser celui d'un pid réutilisé"""
+    global _instance
+    if _instance is None or _instance[0] != os.getpid():
+        _instance = (os.getpid(), time.time_ns())
+    return f'{_instance[0]}-{_instance[1]}.json'
+
+
+def _ecrire(chemin, registre_courant):
+    temporaire = f'{chemin}.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as f:
+        json.dump(registre_courant.en_dict(), f)
+    os.replace(temporaire, chemin)
+
+
+def _lire(chemin):
+    """Registre d'un fichier, None s'il a disparu ou est illisible"""
+    try:
+        with open(chemin, encoding='utf-8') as f:
+            return Registre.depuis_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def enregistrer(registre_courant=None):
+    """Écrit l'instantané du processus courant (remplacement atomique)"""
+    chemin_dossier = dossier()
+    os.makedirs(chemin_dossier, exist_ok=True)
+    _ecrire(os.path.join(chemin_dossier, _nom_instantane()), registre_courant or registre)
+
+
+@contextmanager
+def _verrou_dossier(chemin_dossier):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(chemin_dossier, VERROU), 'a') as f:
+        # Libéré à la fermeture, y compris si le processus meurt
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _termine(nom):
+    try:
+        os.kill(int(nom.split('-')[0].split('.')[0]), 0)
+    except ProcessLookupError:
+        return True
+    except (ValueError, OSError):
+        return False
+    return False
+
+
+def _cumuler(chemin_dossier):
+    """Ajoute au cumul les instantanés des processus terminés, puis les supprime (sous le verrou)"""
+    if fcntl is None:
+        return
+    termines = [
+        nom for nom in os.listdir(chemin_dossier)
+        if nom.endswith('.json') and nom != CUMUL and _termine(nom)
+    ]
+    if not termines:
+        return
+    chemin_cumul = os.path.join(chemin_dossier, CUMUL)
+    cumul = _lire(chemin_cumul) or Registre()
+    for nom in termines:
+        instantane = _lire(os.path.join(chemin_dossier, nom))
+        if instantane is not None:
+            cumul.ajouter(instantane)
+    _ecrire(chemin_cumul, cumul)
+    for nom in termines:
+        os.remove(os.path.join(chemin_dossier, nom))
+
+
+def charger(inclure_courant=True):
+    """Somme du cumul, des instantanés de tous les processus et du registre courant à jour"""
+    total = Registre()
+    chemin_dossier = dossier()
+    if os.path.isdir(chemin_dossier):
+        courant = _nom_instantane()
+        with _verrou_dossier(chemin_dossier):
+            _cumuler(chemin_dossier)
+            for nom in os.listdir(chemin_dossier):
+                if not nom.endswith('.json') or (inclure_courant and nom == courant):
+                    continue
+                instantane = _lire(os.path.join(chemin_dossier, nom))
+                if instantane is not None:
+                    total.ajouter(instantane)
+    if inclure_courant:
+        total.ajouter(Registre.depuis_dict(registre.en_dict()))
+    return total
+
+
+def _etiquette(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def exposition(registre_total):
+    """Texte au format d'exposition Prometheus (version 0.0.4)"""
+    lignes = []
+    for nom, (bornes, metrique, echelle) in HISTOGRAMMES.items():
+        lignes.append(f'# TYPE {metrique} histogram')
+        for vue, histogrammes in sorted(registre_total.vues.items()):
+            histogramme = histogrammes[nom]
+            if not histogramme.nombre:
+                continue
+            etiquette = f'vue="{_etiquette(vue)}"'
+            cumul = 0
+            for borne, compte in zip(bornes, histogramme.comptes):
+                cumul += compte
+                lignes.append(f'{metrique}_bucket{{{etiquette},le="{borne / echelle:g}"}} {cumul}')
+            lignes.append(f'{metrique}_bucket{{{etiquette},le="+Inf"}} {histogramme.nombre}')
+            lignes.append(f'{metrique}_sum{{{etiquette}}} {histogramme.somme / echelle:g}')
+            lignes.append(f'{metrique}_count{{{etiquette}}} {histogramme.nombre}')
+
+    # Étiquette stable : l'empreinte seule ; SQL, vue et origine sont dans ?format=json
+    lentes = sorted(registre_total.lentes.items())
+    lignes.append('# TYPE erp_requete_lente_total counter')
+    for cle, lente in lentes:
+        lignes.append(f'erp_requete_lente_total{{empreinte="{cle}"}} {lente["nombre"]}')
+    lignes.append('# TYPE erp_requete_lente_secondes_total counter')
+    for cle, lente in lentes:
+        lignes.append(f'erp_requete_lente_secondes_total{{empreinte="{cle}"}} {lente["total_ms"] / 1000:g}')
+    return '\n'.join(lignes) + '\n'
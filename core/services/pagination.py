@@ -0,0 +1,165 @@
+"""
+Pagination par clé (keyset) pour les listes et l'API
+
+Au lieu d'un OFFSET, qui fait parcourir toutes les lignes des pages
+précédentes, chaque page reprend après la dernière clé vue :
+WHERE (date, id) < (date_vue, id_vu) ORDER BY date DESC, id DESC LIMIT n.
+Avec un index sur la colonne de tête, la page 5 000 coûte comme la page 1.
+
+Les curseurs sont opaques et signés (django.core.signing) : ils
+transportent les valeurs de la clé et le sens de lecture. Un curseur
+altéré ou d'un autre modèle lève CurseurInvalide.
+
+Usage dans une vue:
+    page = paginer(listes.rendez_vous(), request.GET.get('curseur'))
+    page.elements, page.curseur_suivant, page.curseur_precedent
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from django.core import signing
+from django.db.models import Q
+
+from core.models import Alerte, Consultation, Facture, Patient, RendezVous
+
+TAILLE_PAGE = 25
+TAILLE_MAX = 200
+
+# Clé de tri de chaque liste ; '-' pour un ordre décroissant. L'id final rend la clé unique.
+CLES = {
+    RendezVous: ('-date_heure', '-id'),
+    Consultation: ('-date_consultation', '-id'),
+    Facture: ('-date_facture', '-id'),
+    Patient: ('nom', 'prenom', 'id'),
+    Alerte: ('-date_creation', '-id'),
+}
+
+_SEL = 'core.pagination'
+
+
+class CurseurInvalide(ValueError):
+    """Curseur altéré ou émis pour une autre liste"""
+
+
+@dataclass
+class Page:
+    elements: list
+    curseur_suivant: Optional[str] = None
+    curseur_precedent: Optional[str] = None
+    taille: int = TAILLE_PAGE
+
+    @property
+    def a_suivant(self):
+        return self.curseur_suivant is not None
+
+    @property
+    def a_precedent(self):
+        return self.curseur_precedent is not None
+
+    def lien(self, request, curseur):
+        """URL de la page courante avec ?curseur=..., les autres paramètres conservés"""
+        if curseur is None:
+            return None
+        parametres = request.GET.copy()
+        parametres['curseur'] = curseur
+        return f'{request.path}?{parametres.urlencode()}'
+
+    def liens(self, request):
+        """Liens suivant / précédent pour les gabarits"""
+        return {
+            'suivant': self.lien(request, self.curseur_suivant),
+            'precedent': self.lien(request, self.curseur_precedent),
+        }
+
+    def pour_api(self, serialiser):
+        """Réponse JSON : résultats sérialisés et curseurs opaques"""
+        return {
+            'results': [serialiser(element) for element in self.elements],
+            'next': self.curseur_suivant,
+            'previous': self.curseur_precedent,
+        }
+
+
+def _champs(cles):
+    return [(cle.lstrip('-'), cle.startswith('-')) for cle in cles]
+
+
+def encoder_curseur(modele, cles, instance, sens):
+    valeurs = []
+    for nom, _ in _champs(cles):
+        valeur = getattr(instance, modele._meta.get_field(nom).attname)
+        valeurs.append(valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur)
+    return signing.dumps([modele._meta.label_lower, sens, valeurs], salt=_SEL, compress=True)
+
+
+def decoder_curseur(modele, cles, curseur):
+    """Retourne (sens, valeurs typées) d'un curseur émis pour ce modèle"""
+    try:
+        label, sens, valeurs = signing.loads(curseur, salt=_SEL)
+    except (signing.BadSignature, ValueError, TypeError) as e:
+        raise CurseurInvalide(str(e)) from e
+
+    champs = _champs(cles)
+    if label != modele._meta.label_lower or sens not in ('suivant', 'precedent') or len(valeurs) != len(champs):
+        raise CurseurInvalide(f"Curseur non valable pour {modele._meta.label}")
+    return sens, [modele._meta.get_field(nom).to_python(valeur) for (nom, _), valeur in zip(champs, valeurs)]
+
+
+def _apres(cles, valeurs, vers_l_avant):
+    """
+    Condition « strictement après la clé » dans l'ordre de lecture :
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., le sens de chaque comparaison
+    suivant l'ordre de sa colonne. La borne redondante sur k1 (>= ou <=) borne le parcours d'index.
+    """
+    champs = _champs(cles)
+    condition = Q()
+    egalites = Q()
+    for (nom, decroissant), valeur in zip(champs, valeurs):
+        operateur = 'lt' if decroissant == vers_l_avant else 'gt'
+        condition |= egalites & Q(**{f'{nom}__{operateur}': valeur})
+        egalites &= Q(**{nom: valeur})
+
+    tete, decroissant = champs[0]
+    borne = 'lte' if decroissant == vers_l_avant else 'gte'
+    return Q(**{f'{tete}__{borne}': valeurs[0]}) & condition
+
+
+def paginer(queryset, curseur=None, taille=TAILLE_PAGE, cles=None):
+    """
+    Page de queryset suivant la clé de son modèle (CLES) ou celle fournie.
+    L'ordre du queryset est remplacé par celui de la clé.
+    """
+    modele = queryset.model
+    cles = cles or CLES[modele]
+    taille = max(1, min(int(taille), TAILLE_MAX))
+    inverse = [cle[1:] if cle.startswith('-') else f'-{cle}' for cle in cles]
+
+    sens, valeurs = ('suivant', None)
+    if curseur:
+        sens, valeurs = decoder_curseur(modele, cles, curseur)
+
+    vers_l_avant = sens == 'suivant'
+    if valeurs is not None:
+        queryset = queryset.filter(_apres(cles, valeurs, vers_l_avant))
+    queryset = queryset.order_by(*(cles if vers_l_avant else inverse))
+
+    # Une ligne de plus que la page indique s'il reste des éléments dans ce sens
+    elements = list(queryset[:taille + 1])
+    reste = len(elements) > taille
+    elements = elements[:taille]
+    if not vers_l_avant:
+        elements.reverse()
+
+    # Venir d'un curseur implique des éléments de l'autre côté
+    if vers_l_avant:
+        a_suivant, a_precedent = reste, valeurs is not None
+    else:
+        a_suivant, a_precedent = valeurs is not None, reste
+
+    page = Page(elements=elements, taille=taille)
+    if elements and a_suivant:
+        page.curseur_suivant = encoder_curseur(modele, cles, elements[-1], 'suivant')
+    if elements and a_precedent:
+        page.curseur_precedent = encoder_curseur(modele, cles, elements[0], 'precedent')
+    return page
@@ -0,0 +1,75 @@
+"""
+Bornes de périodes pour les filtres de statistiques
+
+Toutes les périodes sont des intervalles semi-ouverts [début, fin) appliqués
+directement sur la colonne, sans fonction SQL (__month, __date...) : les
+requêtes restent des parcours d'intervalle sur les index date/statut.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+PERIODES = ['jour', 'semaine', 'mois', 'trimestre', 'annee']
+
+
+def bornes_jour(jour):
+    """Retourne [jour, lendemain)"""
+    return jour, jour + timedelta(days=1)
+
+
+def bornes_mois(annee, mois):
+    """Retourne [1er du mois, 1er du mois suivant)"""
+    debut = date(annee, mois, 1)
+    if mois == 12:
+        return debut, date(annee + 1, 1, 1)
+    return debut, date(annee, mois + 1, 1)
+
+
+def bornes_periode(type_periode, reference=None):
+    """
+    Retourne les bornes [début, fin) de la période courante contenant la
+    date de référence (aujourd'hui par défaut).
+    """
+    reference = reference or timezone.localdate()
+
+    if type_periode == 'jour':
+        return bornes_jour(reference)
+    if type_periode == 'semaine':
+        debut = reference - timedelta(days=reference.weekday())
+        return debut, debut + timedelta(days=7)
+    if type_periode == 'mois':
+        return bornes_mois(reference.year, reference.month)
+    if type_periode == 'trimestre':
+        mois_debut = 3 * ((reference.month - 1) // 3) + 1
+        debut = date(reference.year, mois_debut, 1)
+        fin = bornes_mois(reference.year, mois_debut + 2)[1]
+        return debut, fin
+    if type_periode == 'annee':
+        return date(reference.year, 1, 1), date(reference.year + 1, 1, 1)
+
+    raise ValueError(f"Période inconnue: {type_periode} (attendu: {', '.join(PERIODES)})")
+
+
+def debut_de_jour(jour):
+    """Minuit local du jour donné, en datetime aware"""
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def filtre_periode(modele, champ, debut, fin):
+    """
+    Construit le filtre champ >= début AND champ < fin.
+
+    Pour un DateTimeField, les dates sont converties en minuit local afin
+    que le filtre porte sur la colonne brute.
+    """
+    if isinstance(modele._meta.get_field(champ), models.DateTimeField):
+        if not isinstance(debut, datetime):
+            debut = debut_de_jour(debut)
+        if not isinstance(fin, datetime):
+            fin = debut_de_jour(fin)
+
+    return Q(**{f'{champ}__gte': debut, f'{champ}__lt': fin})
@@ -0,0 +1,188 @@
+"""
+Recherche de patients par préfixes (nom, prénom, téléphone, CIN)
+
+Chaque mot saisi est un préfixe, sans accents ni casse : « hel ben »
+trouve « Hélène Bennani ». La recherche interroge l'index plein texte créé
+par la migration 0013 (FTS5 sur SQLite, tsvector + GIN sur PostgreSQL).
+
+L'index fournit les CANDIDATS patients les mieux classés en SQL : bm25
+pondéré par colonne sur SQLite (poids de POIDS), ts_rank sur PostgreSQL,
+puis par nom. Le LIMIT s'applique après ce tri : pour un préfixe court
+(« be »), les candidats sont les plus pertinents et non 200 lignes
+quelconques. Ils sont ensuite départagés en Python : mot exact avant
+préfixe, nom avant prénom avant téléphone/CIN.
+
+Les autres moteurs utilisent des icontains.
+"""
+
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Q
+
+from core.models import Patient
+
+LIMITE = 20
+LIMITE_MAX = 100
+CANDIDATS = 200
+
+# Colonnes renvoyées à l'autocomplétion
+CHAMPS = ('id', 'nom', 'prenom', 'telephone', 'cin', 'date_naissance')
+
+# Poids de pertinence d'un mot trouvé dans chaque colonne (doublé pour un mot exact)
+POIDS = {'nom': 8, 'prenom': 4, 'telephone': 1, 'cin': 1}
+
+_MOTS = re.compile(r'\w+')
+
+_COLONNES = ', '.join(f'p."{champ}"' for champ in CHAMPS)
+
+# Poids bm25 dans l'ordre des colonnes de core_patient_fts (migration 0013)
+_POIDS_BM25 = ', '.join(f'{POIDS[champ]:.1f}' for champ in ('nom', 'prenom', 'telephone', 'cin'))
+
+_SQL_SQLITE = f"""
+    SELECT {_COLONNES} FROM core_patient_fts JOIN core_patient p ON p.id = core_patient_fts.rowid
+    WHERE core_patient_fts MATCH %s
+    ORDER BY bm25(core_patient_fts, {_POIDS_BM25}), p.nom, p.prenom, p.id
+    LIMIT %s
+"""
+
+_SQL_POSTGRESQL = f"""
+    SELECT {_COLONNES} FROM core_patient p, to_tsquery('simple', %s) requete
+    WHERE p.recherche @@ requete
+    ORDER BY ts_rank(p.recherche, requete) DESC, p.nom, p.prenom, p.id
+    LIMIT %s
+"""
+
+
+@lru_cache(maxsize=4096)
+def sans_accents(texte):
+    """« Hélène » -> « helene »"""
+    if texte.isascii():
+        return texte.lower()
+    decompose = unicodedata.normalize('NFKD', texte)
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).lower()
+
+
+def mots(q):
+    """Mots de la saisie, sans accents ; la ponctuation est ignorée"""
+    return _MOTS.findall(sans_accents(q or ''))
+
+
+def requete_fts5(termes):
+    # Chaque terme entre guillemets : aucun mot saisi n'est lu comme opérateur FTS5
+    return ' AND '.join(f'"{terme}"*' for terme in termes)
+
+
+def requete_tsquery(termes):
+    return ' & '.join(f'{terme}:*' for terme in termes)
+
+
+def pertinence(patient, termes):
+    """Score d'un patient (dict) pour les mots saisis"""
+    colonnes = [(poids, mots(patient[champ])) for champ, poids in POIDS.items()]
+    score = 0
+    for terme in termes:
+        meilleur = 0
+        for poids, mots_colonne in colonnes:
+            for mot in mots_colonne:
+                if mot == terme:
+                    meilleur = max(meilleur, poids * 2)
+                elif mot.startswith(terme):
+                    meilleur = max(meilleur, poids)
+        score += meilleur
+    return score
+
+
+def classer(patients, termes, limite):
+    """Les plus pertinents d'abord, puis par ordre alphabétique"""
+    return sorted(
+        patients,
+        key=lambda p: (-pertinence(p, termes), sans_accents(p['nom']), sans_accents(p['prenom']), p['id']),
+    )[:limite]
+
+
+def _lire(sql, parametres):
+    # to_python() rend les mêmes types que values() (dates SQLite lues comme texte)
+    conversions = [Patient._meta.get_field(champ).to_python for champ in CHAMPS]
+    with connection.cursor() as curseur:
+        curseur.execute(sql, parametres)
+        return [
+            {champ: convertir(valeur) for champ, convertir, valeur in zip(CHAMPS, conversions, ligne)}
+            for ligne in curseur.fetchall()
+        ]
+
+
+def candidats(termes):
+    """Les CANDIDATS patients les plus pertinents parmi ceux qui correspondent à tous les termes"""
+    if connection.vendor == 'sqlite':
+        return _lire(_SQL_SQLITE, [requete_fts5(termes), CANDIDATS])
+    if connection.vendor == 'postgresql':
+        return _lire(_SQL_POSTGRESQL, [requete_tsquery(termes), CANDIDATS])
+
+    filtre = Q()
+    for terme in termes:
+        filtre &= (
+            Q(nom__icontains=terme) | Q(prenom__icontains=terme)
+            | Q(telephone__startswith=terme) | Q(cin__istartswith=terme)
+        )
+    return list(Patient.objects.filter(filtre).order_by('nom', 'prenom', 'id').values(*CHAMPS)[:CANDIDATS])
+
+
+def correspond(patient, termes):
+    """Même règle que l'index : chaque terme est le préfixe d'un mot d'une colonne"""
+    mots_patient = [mot for champ in POIDS for mot in mots(patient[champ])]
+    return all(any(mot.startswith(terme) for mot in mots_patient) for terme in termes)
+
+
+def rechercher(q, limite=LIMITE):
+    """Patients correspondant à tous les mots de q, les plus pertinents d'abord (liste de dicts)"""
+    termes = mots(q)
+    if not termes:
+        return []
+    limite = max(1, min(int(limite), LIMITE_MAX))
+    return classer(candidats(termes), termes, limite)
+
+
+class CachePrefixes:
+    """
+    Derniers candidats de chaque utilisateur, pour l'autocomplétion.
+
+    Une saisie qui prolonge une saisie en cache (« mar » -> « mart »,
+    « ben » -> « ben sa ») ne correspond qu'à un sous-ensemble de ses
+    candidats : si ceux-ci étaient complets (moins de CANDIDATS), il suffit
+    de les filtrer, sans requête. Les entrées expirent après `duree`
+    secondes pour refléter les patients créés ou modifiés entre-temps.
+    """
+
+    def __init__(self, utilisateurs=256, entrees=8, duree=30):
+        self.utilisateurs = utilisateurs
+        self.entrees = entrees
+        self.duree = duree
+        self._cache = OrderedDict()
+
+    def chercher(self, utilisateur, termes):
+        """Candidats pour termes déduits du cache, ou None"""
+        maintenant = time.monotonic()
+        for termes_cache, liste, horodatage in reversed(self._cache.get(utilisateur, [])):
+            if maintenant - horodatage > self.duree or len(termes) < len(termes_cache):
+                continue
+            if all(terme.startswith(prefixe) for terme, prefixe in zip(termes, termes_cache)):
+                return [patient for patient in liste if correspond(patient, termes)]
+        return None
+
+    def ajouter(self, utilisateur, termes, liste):
+        # Une liste tronquée à CANDIDATS ne permet pas de déduire les saisies suivantes
+        if len(liste) >= CANDIDATS:
+            return
+        entrees = self._cache.pop(utilisateur, [])
+        entrees.append((list(termes), liste, time.monotonic()))
+        self._cache[utilisateur] = entrees[-self.entrees:]
+        while len(self._cache) > self.utilisateurs:
+            self._cache.popitem(last=False)
+
+    def vider(self):
+        self._cache.clear()
@@ -0,0 +1,208 @@
+"""
+Occurrences des rendez-vous récurrents (RendezVousRecurrent)
+
+Une série est une règle : fréquence, jour de la semaine (1 = lundi,
+séries hebdomadaires), heure, date_debut, date_fin et nombre_occurrences.
+Ses occurrences sont calculées à la demande pour une fenêtre, jamais pour
+toute la série : l'occurrence de rang k se calcule directement
+(date_debut + k semaines ou k mois), si bien qu'une fenêtre lointaine ne
+coûte pas plus qu'une fenêtre proche.
+
+Les dates d'une série sont gardées par mois dans un cache du processus,
+indexé par la règle elle-même : une série modifiée a une autre règle, et
+n'utilise donc jamais les dates de sa version précédente.
+
+materialiser() crée les RendezVous d'une fenêtre par bulk_create. Un
+créneau déjà présent pour le patient (créé avant, même annulé depuis) est
+sauté : relancer la matérialisation ne crée pas de doublon. Avec
+sans_conflit, les occurrences qui chevauchent un autre rendez-vous de
+l'agenda (core.services.conflits) sont aussi sautées.
+"""
+
+import heapq
+import logging
+from calendar import monthrange
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import RendezVous
+from core.models_certificates import RendezVousRecurrent
+from core.services.conflits import DUREE_DEFAUT, Agenda
+
+logger = logging.getLogger(__name__)
+
+# Pas de chaque fréquence : en jours ou en mois
+PAS = {
+    'hebdomadaire': ('jours', 7),
+    'mensuel': ('mois', 1),
+    'mensuelle': ('mois', 1),
+    'trimestriel': ('mois', 3),
+}
+
+TAILLE_LOT = 500
+# Mois de séries gardés en cache (quelques centaines de séries sur un an)
+CACHE_MOIS = 8192
+
+Regle = namedtuple('Regle', 'frequence jour_semaine date_debut date_fin nombre_occurrences')
+
+
+def regle(serie):
+    return Regle(serie.frequence, serie.jour_semaine, serie.date_debut, serie.date_fin, serie.nombre_occurrences)
+
+
+def _ajouter_mois(jour, mois):
+    """Même jour du mois, ramené au dernier jour des mois plus courts (31 janvier -> 29 février)"""
+    annee, rang = divmod(jour.month - 1 + mois, 12)
+    annee += jour.year
+    return date(annee, rang + 1, min(jour.day, monthrange(annee, rang + 1)[1]))
+
+
+def _dates(regle, debut, fin):
+    """Dates de la règle entre debut et fin inclus, à partir de la première de la fenêtre"""
+    if regle.frequence not in PAS:
+        logger.warning("Fréquence de rendez-vous récurrent inconnue: %s", regle.frequence)
+        return
+    unite, pas = PAS[regle.frequence]
+    if regle.date_fin:
+        fin = min(fin, regle.date_fin)
+
+    premiere = regle.date_debut
+    if unite == 'jours':
+        if regle.jour_semaine:
+            premiere += timedelta(days=(regle.jour_semaine - premiere.isoweekday()) % 7)
+        rang = max(0, -(-(debut - premiere).days // pas))
+
+        def occurrence(k):
+            return premiere + timedelta(days=k * pas)
+    else:
+        rang = max(0, ((debut.year - premiere.year) * 12 + debut.month - premiere.month) // pas)
+
+        def occurrence(k):
+            return _ajouter_mois(premiere, k * pas)
+
+    while regle.nombre_occurrences is None or rang < regle.nombre_occurrences:
+        jour = occurrence(rang)
+        if jour > fin:
+            return
+        if jour >= debut:
+            yield jour
+        rang += 1
+
+
+@lru_cache(maxsize=CACHE_MOIS)
+def _dates_mois(regle, annee, mois):
+    premier = date(annee, mois, 1)
+    return tuple(_dates(regle, premier, premier.replace(day=monthrange(annee, mois)[1])))
+
+
+def dates(regle, debut, fin):
+    """Générateur des dates d'une règle entre debut et fin inclus, mois par mois"""
+    debut = max(debut, regle.date_debut)
+    if regle.date_fin:
+        fin = min(fin, regle.date_fin)
+    annee, mois = debut.year, debut.month
+    while (annee, mois) <= (fin.year, fin.month):
+        for jour in _dates_mois(regle, annee, mois):
+            if debut <= jour <= fin:
+                yield jour
+        annee, mois = (annee + 1, 1) if mois == 12 else (annee, mois + 1)
+
+
+def _heure(serie):
+    # Créneaux à la minute (des heures ont été saisies avec secondes et microsecondes)
+    return serie.heure.replace(second=0, microsecond=0)
+
+
+def occurrences(serie, debut, fin):
+    """Générateur des date_heure (aware) d'une série entre debut et fin (dates) inclus"""
+    # Fuseau lu une fois : make_aware() le relit à chaque appel (les deux tiers du calendrier)
+    heure = _heure(serie).replace(tzinfo=timezone.get_current_timezone())
+    for jour in dates(regle(serie), debut, fin):
+        yield datetime.combine(jour, heure)
+
+
+def series_actives(debut, fin):
+    """Séries actives ayant au moins un jour dans la fenêtre"""
+    return RendezVousRecurrent.objects.filter(
+        Q(date_fin__isnull=True) | Q(date_fin__gte=debut),
+        est_active=True, date_debut__lte=fin,
+    )
+
+
+def _occurrences_serie(serie, debut, fin):
+    for date_heure in occurrences(serie, debut, fin):
+        yield date_heure, serie.pk, serie
+
+
+def occurrences_periode(debut, fin, series=None):
+    """Générateur des (date_heure, série) de toutes les séries, dans l'ordre chronologique"""
+    if series is None:
+        series = series_actives(debut, fin).select_related('patient')
+    flux = [_occurrences_serie(serie, debut, fin) for serie in series]
+    for date_heure, _, serie in heapq.merge(*flux, key=lambda element: element[:2]):
+        yield date_heure, serie
+
+
+def _bornes(debut, fin):
+    return (
+        timezone.make_aware(datetime.combine(debut, time.min)),
+        timezone.make_aware(datetime.combine(fin, time.max)),
+    )
+
+
+def _existants(series, debut, fin):
+    """(patient_id, date_heure) des rendez-vous déjà présents pour les patients des séries"""
+    patients = {serie.patient_id for serie in series}
+    return set(
+        RendezVous.objects.filter(patient_id__in=patients, date_heure__range=_bornes(debut, fin))
+        .values_list('patient_id', 'date_heure')
+    )
+
+
+def calendrier(debut, fin, series=None):
+    """
+    Occurrences pas encore matérialisées, par jour : {date: [(date_heure, série), ...]}
+
+    Deux requêtes quel que soit le nombre de séries (séries, rendez-vous existants).
+    """
+    series = list(series_actives(debut, fin).select_related('patient') if series is None else series)
+    existants = _existants(series, debut, fin)
+    jours = defaultdict(list)
+    for date_heure, serie in occurrences_periode(debut, fin, series):
+        if (serie.patient_id, date_heure) not in existants:
+            jours[timezone.localtime(date_heure).date()].append((date_heure, serie))
+    return dict(jours)
+
+
+def _nouveaux(series, debut, fin, existants, agenda=None):
+    for date_heure, serie in occurrences_periode(debut, fin, series):
+        # Deux séries du même patient au même créneau : un seul rendez-vous
+        if (serie.patient_id, date_heure) not in existants:
+            existants.add((serie.patient_id, date_heure))
+            if agenda is not None:
+                if agenda.conflits(date_heure, DUREE_DEFAUT):
+                    continue
+                agenda.reserver(date_heure, DUREE_DEFAUT)
+            yield RendezVous(
+                patient_id=serie.patient_id, date_heure=date_heure, remarque=serie.motif, statut='prevu'
+            )
+
+
+def materialiser(debut, fin, series=None, taille_lot=TAILLE_LOT, sans_conflit=False):
+    """Crée les RendezVous des séries entre debut et fin inclus ; retourne le nombre créé"""
+    with transaction.atomic():
+        # Verrou des séries (PostgreSQL) : deux matérialisations simultanées ne se croisent pas
+        series = list(series_actives(debut, fin).select_for_update() if series is None else series)
+        agenda = Agenda(debut, fin) if sans_conflit else None
+        nouveaux = _nouveaux(series, debut, fin, _existants(series, debut, fin), agenda)
+        crees = 0
+        while lot := list(islice(nouveaux, taille_lot)):
+            RendezVous.objects.bulk_create(lot)
+            crees += len(lot)
+    return crees
@@ -0,0 +1,277 @@
+"""
+Rendu reportlab des certificats médicaux et des ordonnances
+
+Le rendu ne lit pas la base : il reçoit un dictionnaire de valeurs simples
+(voir core.services.travaux_pdf.donnees_certificat) et peut donc tourner
+dans un processus séparé, sans Django.
+"""
+
+import os
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from PIL import Image as PILImage
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Paragraph, Spacer, Table, TableStyle
+
+# Version de la mise en page : la changer invalide les PDF en cache
+VERSION = 2
+
+MARGE = 2 * cm
+LARGEUR_LOGO = 2.5 * cm
+# Lignes de l'en-tête (« CABINET MÉDICAL », médecin, adresse, téléphone) puis titre
+INTERLIGNE_ENTETE = 14
+INTERLIGNE_TITRE = 22
+# Gabarits gardés par processus : un par (type de document, en-tête du cabinet)
+GABARITS_MAX = 16
+
+# Flux binaires (images, polices) : l'encodage ASCII85, sans intérêt pour un
+# téléchargement HTTP, représentait près de la moitié du rendu sans rl_accel
+rl_config.useA85 = 0
+
+
+def _date(valeur):
+    return valeur.strftime('%d/%m/%Y') if valeur else ''
+
+
+@lru_cache(maxsize=None)
+def _police(chemin):
+    """Police TrueType du cabinet, lue et enregistrée une fois par processus"""
+    if not chemin:
+        return 'Helvetica', 'Helvetica-Bold'
+    nom = 'Cabinet-' + os.path.splitext(os.path.basename(chemin))[0]
+    pdfmetrics.registerFont(TTFont(nom, chemin))
+    return nom, nom
+
+
+@lru_cache(maxsize=4)
+def _logo(chemin, version):
+    """
+    Logo décodé une fois par processus ; `version` (date de modification)
+    renouvelle l'entrée. Il est gardé en JPEG, que reportlab intègre tel quel
+    dans chaque PDF, alors qu'un PNG serait recompressé à chaque document
+    (la transparence est aplatie sur fond blanc).
+    """
+    image = PILImage.open(chemin)
+    if image.format != 'JPEG':
+        fond = PILImage.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        fond.paste(image, mask=image.getchannel('A'))
+        image = fond
+    tampon = BytesIO()
+    image.convert('RGB').save(tampon, format='JPEG', quality=90)
+    tampon.seek(0)
+    return ImageReader(tampon)
+
+
+def _styles(normale, grasse):
+    base = getSampleStyleSheet()
+    return {
+        'numero': ParagraphStyle('Numero', parent=base['Normal'], fontName=normale, fontSize=12, alignment=TA_CENTER, textColor=colors.grey),
+        'texte': ParagraphStyle('Texte', parent=base['Normal'], fontName=normale, fontSize=11, leading=12),
+        'gras': ParagraphStyle('Gras', parent=base['Normal'], fontName=grasse, fontSize=11, leading=12),
+    }
+
+
+class Gabarit:
+    """
+    Parties fixes d'un document pour un en-tête de cabinet : styles, police,
+    logo, styles de tableaux, en-tête et titre. Construit une fois par
+    processus (voir gabarit()) ; seuls les paragraphes propres au patient
+    passent ensuite par la mise en page platypus. L'en-tête et le titre
+    sont dessinés directement sur la page.
+    """
+
+    def __init__(self, titre, cabinet):
+        self.titre = titre
+        self.cabinet = cabinet
+        self.normale, self.grasse = _police(cabinet.get('police') or '')
+        self.styles = _styles(self.normale, self.grasse)
+        self.logo = _logo(cabinet['logo'], cabinet.get('logo_version')) if cabinet.get('logo') else None
+        self.lignes_entete = [
+            ligne for ligne in
+            ('CABINET MÉDICAL', cabinet['nom_medecin'], cabinet['adresse'], cabinet['telephone'])
+            if ligne
+        ]
+        # Espace réservé à l'en-tête et au titre en haut de la première page
+        self.hauteur_entete = len(self.lignes_entete) * INTERLIGNE_ENTETE + 20 + INTERLIGNE_TITRE + 10
+        self.style_infos = TableStyle([
+            ('FONTNAME', (0, 0), (0, -1), self.grasse),
+            ('FONTNAME', (1, 0), (1, -1), self.normale),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ])
+        self.style_signature = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), self.normale),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+        ])
+
+    def dessiner_entete(self, canvas, document):
+        largeur, hauteur = A4
+        haut = hauteur - MARGE
+        canvas.saveState()
+        if self.logo is not None:
+            largeur_image, hauteur_image = self.logo.getSize()
+            hauteur_logo = LARGEUR_LOGO * hauteur_image / largeur_image
+            canvas.drawImage(self.logo, MARGE, haut - hauteur_logo, LARGEUR_LOGO, hauteur_logo)
+        canvas.setFont(self.normale, 12)
+        canvas.setFillColor(colors.grey)
+        y = haut - 12
+        for ligne in self.lignes_entete:
+            canvas.drawCentredString(largeur / 2, y, ligne)
+            y -= INTERLIGNE_ENTETE
+        canvas.setFont(self.grasse, 18)
+        canvas.setFillColor(colors.darkblue)
+        canvas.drawCentredString(largeur / 2, y - 20 - 18 + INTERLIGNE_ENTETE, self.titre)
+        canvas.restoreState()
+
+    def document(self, tampon):
+        document = BaseDocTemplate(tampon, pagesize=A4, leftMargin=MARGE, rightMargin=MARGE, topMargin=MARGE, bottomMargin=MARGE)
+        premiere = Frame(
+            document.leftMargin, document.bottomMargin, document.width, document.height - self.hauteur_entete,
+            id='premiere',
+        )
+        suivante = Frame(document.leftMargin, document.bottomMargin, document.width, document.height, id='suivante')
+        document.addPageTemplates([
+            PageTemplate(id='premiere', frames=[premiere], onPage=self.dessiner_entete, autoNextPageTemplate='suivante'),
+            PageTemplate(id='suivante', frames=[suivante]),
+        ])
+        return document
+
+    def tableau_infos(self, lignes):
+        tableau = Table(lignes, colWidths=[4 * cm, 10 * cm])
+        tableau.setStyle(self.style_infos)
+        return tableau
+
+    def signature(self, jour):
+        tableau = Table(
+            [[f"Fait à {self.cabinet['ville']}, le {_date(jour)}", ''],
+             ['', self.cabinet['nom_medecin']],
+             ['', 'Signature et cachet']],
+            colWidths=[8 * cm, 6 * cm],
+        )
+        tableau.setStyle(self.style_signature)
+        return [Spacer(1, 30), tableau]
+
+    def paragraphes(self, texte, style='texte'):
+        return [Paragraph(escape(ligne), self.styles[style]) for ligne in (texte or '').splitlines() if ligne.strip()]
+
+
+@lru_cache(maxsize=GABARITS_MAX)
+def _gabarit(type_document, cabinet):
+    return Gabarit(TITRES[type_document], dict(cabinet))
+
+
+def gabarit(type_document, cabinet):
+    """Gabarit en cache pour ce type de document et cet en-tête de cabinet"""
+    # Un en-tête modifié (CabinetConfig) donne une autre clé, donc un nouveau gabarit
+    return _gabarit(type_document, tuple(sorted(cabinet.items())))
+
+
+def vider_caches():
+    _gabarit.cache_clear()
+    _logo.cache_clear()
+
+
+def _certificat(donnees, gabarit):
+    patient = donnees['patient']
+    nom_complet = f"{patient['prenom']} {patient['nom']}"
+    styles = gabarit.styles
+    histoire = [
+        Paragraph(f"N° {escape(donnees['numero_certificat'])}", styles['numero']),
+        Spacer(1, 20),
+        gabarit.tableau_infos([
+            ['Patient:', nom_complet],
+            ['Date de naissance:', _date(patient['date_naissance'])],
+            ['Date du certificat:', _date(donnees['date_emission'])],
+            ['Type:', donnees['type_libelle']],
+        ]),
+        Spacer(1, 20),
+        Paragraph(
+            f"Je soussigné(e), {escape(donnees['cabinet']['nom_medecin'])}, certifie avoir examiné ce jour :",
+            styles['texte'],
+        ),
+        Spacer(1, 12),
+        Paragraph(escape(nom_complet), styles['gras']),
+        Spacer(1, 12),
+        *gabarit.paragraphes(donnees['diagnostic']),
+        *gabarit.paragraphes(donnees['description']),
+    ]
+    if donnees['duree_jours']:
+        histoire += [
+            Spacer(1, 12),
+            Paragraph(
+                f"Durée: {donnees['duree_jours']} jour(s), du {_date(donnees['date_debut'])} au {_date(donnees['date_fin'])}",
+                styles['texte'],
+            ),
+        ]
+    if donnees['restrictions']:
+        histoire += [Spacer(1, 12), Paragraph('Restrictions:', styles['gras'])]
+        histoire += gabarit.paragraphes(donnees['restrictions'])
+    return histoire + gabarit.signature(donnees['date_emission'])
+
+
+def _ordonnance(donnees, gabarit):
+    patient = donnees['patient']
+    styles = gabarit.styles
+    histoire = [
+        gabarit.tableau_infos([
+            ['Patient:', f"{patient['prenom']} {patient['nom']}"],
+            ['Date de naissance:', _date(patient['date_naissance'])],
+            ['Date:', _date(donnees['date_prescription'])],
+        ]),
+        Spacer(1, 20),
+        *gabarit.paragraphes(donnees['medicaments']),
+    ]
+    if donnees['duree_traitement']:
+        histoire += [Spacer(1, 12), Paragraph(f"Durée du traitement: {escape(donnees['duree_traitement'])}", styles['texte'])]
+    if donnees['instructions']:
+        histoire += [Spacer(1, 12), Paragraph('Instructions:', styles['gras'])]
+        histoire += gabarit.paragraphes(donnees['instructions'])
+    return histoire + gabarit.signature(donnees['date_prescription'])
+
+
+DOCUMENTS = {
+    'certificat': _certificat,
+    'ordonnance': _ordonnance,
+}
+
+TITRES = {
+    'certificat': 'CERTIFICAT MÉDICAL',
+    'ordonnance': 'ORDONNANCE',
+}
+
+
+def rendre(type_document, donnees):
+    """Contenu PDF (bytes) d'un document"""
+    modele = gabarit(type_document, donnees['cabinet'])
+    tampon = BytesIO()
+    modele.document(tampon).build(DOCUMENTS[type_document](donnees, modele))
+    return tampon.getvalue()
+
+
+def rendre_fichier(type_document, donnees, chemin):
+    """Écrit le PDF de façon atomique (fichier temporaire puis renommage) ; retourne sa taille"""
+    contenu = rendre(type_document, donnees)
+    dossier = os.path.dirname(chemin)
+    os.makedirs(dossier, exist_ok=True)
+    descripteur, temporaire = tempfile.mkstemp(dir=dossier, suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as f:
+            f.write(contenu)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+    return len(contenu)
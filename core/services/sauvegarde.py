@@ -0,0 +1,169 @@
+"""
+Sauvegarde en ligne de la base de données
+
+SQLite : VACUUM INTO écrit la copie depuis une seule transaction de
+lecture, donc un instantané cohérent. Au contraire de l'API de sauvegarde
+par étapes, une écriture concurrente ne fait pas repartir la copie de zéro.
+En mode WAL les écritures du cabinet continuent pendant la copie ; en mode
+journal classique elles attendent la fin de la lecture. La copie est
+ensuite compressée en gzip par blocs. Pour restaurer, serveur arrêté,
+supprimer les fichiers -wal et -shm laissés à côté de la base remplacée :
+SQLite les rejouerait sur la copie restaurée.
+
+PostgreSQL : chaque table est transférée par COPY ... TO STDOUT dans un
+instantané REPEATABLE READ, directement dans le fichier gzip. Le fichier
+est un script psql de données seules, à rejouer après migrate :
+    gunzip -c backup.sql.gz | psql --single-transaction nom_base
+Il commence par vider toutes les tables sauvegardées (TRUNCATE ... RESTART
+IDENTITY CASCADE) : migrate a déjà rempli django_migrations,
+django_content_type et auth_permission, dont les lignes heurteraient
+celles de la sauvegarde.
+Les colonnes générées (core_patient.recherche) sont exclues : COPY les
+refuse, et PostgreSQL les recalcule à la restauration.
+Chaque table est suivie d'un setval() de ses séquences au plus grand
+identifiant restauré, pour que les insertions suivantes ne heurtent pas
+les lignes restaurées.
+
+Les sauvegardes les plus anciennes au-delà de la rétention sont supprimées.
+"""
+
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from django.db import connection, transaction
+
+
+DOSSIER_SAUVEGARDES = 'backups'
+RETENTION = 7
+
+TAILLE_BLOC = 1024 * 1024
+
+
+def _nom_fichier(dossier, extension):
+    horodatage = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(dossier, f'backup_{horodatage}{extension}')
+
+
+def _compresser(source, destination):
+    """Compression gzip en flux, bloc par bloc"""
+    with open(source, 'rb') as entree, gzip.open(destination, 'wb', compresslevel=6) as sortie:
+        shutil.copyfileobj(entree, sortie, TAILLE_BLOC)
+
+
+def _sauvegarder_sqlite(dossier, chemin_base=None):
+    chemin_base = chemin_base or str(connection.settings_dict['NAME'])
+    fichier = _nom_fichier(dossier, '.sqlite3.gz')
+    copie = fichier[:-len('.gz')] + '.tmp'
+    if os.path.exists(copie):
+        os.remove(copie)
+
+    # Connexion dédiée : VACUUM est refusé dans une transaction ouverte
+    source = sqlite3.connect(chemin_base, timeout=30, isolation_level=None)
+    try:
+        source.execute('VACUUM INTO ?', (copie,))
+    finally:
+        source.close()
+
+    try:
+        octets_source = os.path.getsize(copie)
+        _compresser(copie, fichier)
+    finally:
+        os.remove(copie)
+
+    return fichier, octets_source
+
+
+def _setval(table, sequence):
+    """Remet une séquence au plus grand identifiant de la table, au moment de la restauration"""
+    nom = connection.ops.quote_name(table)
+    colonne = connection.ops.quote_name(sequence['column'])
+    maximum = f'(SELECT MAX({colonne}) FROM {nom})'
+    return (
+        f"SELECT pg_catalog.setval(pg_get_serial_sequence('{nom}', '{sequence['column']}'), "
+        f"COALESCE({maximum}, 1), {maximum} IS NOT NULL);\n"
+    )
+
+
+def _colonnes_copiables(cursor, table):
+    """Colonnes de la table dans l'ordre, sans les colonnes générées que COPY refuse"""
+    cursor.execute(
+        "SELECT attname FROM pg_attribute "
+        "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = '' "
+        "ORDER BY attnum",
+        [connection.ops.quote_name(table)],
+    )
+    return [nom for nom, in cursor.fetchall()]
+
+
+def _sauvegarder_postgresql(dossier):
+    fichier = _nom_fichier(dossier, '.sql.gz')
+    octets_source = 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Instantané cohérent de toutes les tables, sans bloquer les écritures
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        tables = sorted(connection.introspection.django_table_names(only_existing=True, include_views=False))
+
+        with gzip.open(fichier, 'wb', compresslevel=6) as sortie:
+            # Un seul TRUNCATE : table par table, CASCADE viderait des tables déjà restaurées
+            noms = ', '.join(connection.ops.quote_name(table) for table in tables)
+            sortie.write(f'TRUNCATE {noms} RESTART IDENTITY CASCADE;\n\n'.encode())
+            for table in tables:
+                colonnes = _colonnes_copiables(cursor, table)
+                liste = ', '.join(connection.ops.quote_name(colonne) for colonne in colonnes)
+                nom = connection.ops.quote_name(table)
+                entete = f'COPY {nom} ({liste}) FROM stdin;\n'.encode()
+                sortie.write(entete)
+
+                avant = sortie.tell()
+                cursor.cursor.copy_expert(f'COPY {nom} ({liste}) TO STDOUT', sortie)
+                octets_source += len(entete) + sortie.tell() - avant
+                sortie.write(b'\\.\n')
+                for sequence in connection.introspection.get_sequences(cursor, table):
+                    sortie.write(_setval(table, sequence).encode())
+                sortie.write(b'\n')
+
+    return fichier, octets_source
+
+
+def _appliquer_retention(dossier, conserver):
+    """Supprime les sauvegardes au-delà des `conserver` plus récentes"""
+    fichiers = sorted(glob.glob(os.path.join(dossier, 'backup_*.gz')), reverse=True)
+    supprimees = []
+    for ancien in fichiers[conserver:]:
+        os.remove(ancien)
+        supprimees.append(ancien)
+    return supprimees
+
+
+def sauvegarder(dossier=DOSSIER_SAUVEGARDES, conserver=RETENTION):
+    """
+    Sauvegarde la base en ligne puis applique la rétention.
+
+    Retourne un rapport: fichier, octets source et compressés, durée,
+    débit (octets/s) et sauvegardes supprimées.
+    """
+    os.makedirs(dossier, exist_ok=True)
+    debut = time.perf_counter()
+
+    if connection.vendor == 'sqlite':
+        fichier, octets_source = _sauvegarder_sqlite(dossier)
+    elif connection.vendor == 'postgresql':
+        fichier, octets_source = _sauvegarder_postgresql(dossier)
+    else:
+        raise NotImplementedError(f"Sauvegarde en ligne non supportée pour {connection.vendor}")
+
+    duree = time.perf_counter() - debut
+    return {
+        'fichier': fichier,
+        'octets_source': octets_source,
+        'octets_compresses': os.path.getsize(fichier),
+        'duree_s': round(duree, 3),
+        'octets_par_s': round(octets_source / duree) if duree > 0 else None,
+        'supprimees': _appliquer_retention(dossier, conserver),
+    }
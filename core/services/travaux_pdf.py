@@ -0,0 +1,253 @@
+"""
+Rendu des PDF en tâche de fond, avec cache adressé par le contenu
+
+Les PDF sont rendus par un pool de processus (PDF_WORKERS, 2 par défaut) :
+un lot de certificats n'occupe plus un worker HTTP pendant tout le rendu.
+Le worker HTTP ne fait que lire les données (une requête) et soumettre
+le travail.
+
+Chaque document est identifié par l'empreinte SHA-256 de ses données
+(id, date_modification, patient, en-tête du cabinet, version de mise en
+page) : c'est la clé du travail et le nom du fichier en cache
+(PDF_CACHE_DIR). Un PDF déjà rendu est servi tel quel ; toute modification
+du certificat, du patient ou de la configuration du cabinet produit une
+nouvelle clé.
+
+API:
+    cle = soumettre('certificat', certificat_id)
+    etat(cle)            -> 'termine' | 'en_cours' | 'erreur' | 'inconnu'
+    attendre(cle, 10)    -> chemin du PDF (lève TimeoutError / l'erreur du rendu)
+
+Les travaux en cours ne sont connus que du processus qui les a soumis ;
+ailleurs, une clé sans fichier est 'inconnu' et peut être soumise à nouveau.
+
+Si un processus du pool meurt (OOM, signal), le pool est cassé : les
+travaux qu'il portait finissent en 'erreur' et la soumission suivante le
+remplace par un pool neuf.
+
+L'en-tête du cabinet (CabinetConfig, PDF_LOGO, PDF_POLICE) est gardé dans le
+cache Django. connecter_signaux(), à appeler depuis CoreConfig.ready(),
+l'invalide à chaque modification de CabinetConfig.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from core.models import Ordonnance
+from core.models_certificates import CertificatMedical
+from core.models_config import CabinetConfig
+from core.services import rendu_pdf
+
+WORKERS = 2
+# Travaux terminés gardés en mémoire pour répondre à etat() (les fichiers restent sur disque)
+TRAVAUX_MAX = 1000
+CLE_CABINET = 'pdf:cabinet'
+
+_pool = None
+_travaux = {}
+_verrou = threading.Lock()
+
+
+def dossier_cache():
+    return getattr(settings, 'PDF_CACHE_DIR', None) or os.path.join(
+        getattr(settings, 'MEDIA_ROOT', '') or 'media', 'pdf_cache'
+    )
+
+
+def chemin(cle):
+    # Deux caractères de sous-dossier : pas de répertoire à des centaines de milliers d'entrées
+    return os.path.join(dossier_cache(), cle[:2], f'{cle}.pdf')
+
+
+def _ville(adresse):
+    """« 123 Avenue Mohammed V, Casablanca, Maroc » -> « Casablanca »"""
+    parties = [partie.strip() for partie in (adresse or '').split(',') if partie.strip()]
+    if len(parties) >= 3:
+        return parties[-2]
+    return parties[-1] if parties else ''
+
+
+def _lire_cabinet():
+    config = CabinetConfig.get_config()
+    logo = getattr(settings, 'PDF_LOGO', '')
+    return {
+        'nom_medecin': config.nom_medecin,
+        'adresse': config.adresse,
+        'telephone': config.telephone,
+        'ville': _ville(config.adresse),
+        'police': getattr(settings, 'PDF_POLICE', ''),
+        'logo': logo,
+        # Un logo remplacé sous le même nom change la clé des PDF et le gabarit
+        'logo_version': os.path.getmtime(logo) if logo else None,
+    }
+
+
+def donnees_cabinet():
+    """En-tête des documents ; une requête au plus après chaque modification de CabinetConfig"""
+    cabinet = cache.get(CLE_CABINET)
+    if cabinet is None:
+        cabinet = _lire_cabinet()
+        cache.set(CLE_CABINET, cabinet, None)
+    return cabinet
+
+
+def invalider_cabinet(**kwargs):
+    cache.delete(CLE_CABINET)
+
+
+def connecter_signaux():
+    """Branche l'invalidation de l'en-tête sur CabinetConfig"""
+    post_save.connect(invalider_cabinet, sender=CabinetConfig, dispatch_uid='pdf_cabinet_save')
+    post_delete.connect(invalider_cabinet, sender=CabinetConfig, dispatch_uid='pdf_cabinet_delete')
+
+
+def _patient(patient):
+    return {'nom': patient.nom, 'prenom': patient.prenom, 'date_naissance': patient.date_naissance}
+
+
+def donnees_certificat(certificat, cabinet=None):
+    return {
+        'id': certificat.pk,
+        'date_modification': certificat.date_modification,
+        'numero_certificat': certificat.numero_certificat,
+        'type_libelle': certificat.get_type_certificat_display(),
+        'date_emission': certificat.date_emission,
+        'date_debut': certificat.date_debut,
+        'date_fin': certificat.date_fin,
+        'duree_jours': certificat.duree_jours,
+        'diagnostic': certificat.diagnostic,
+        'description': certificat.description,
+        'restrictions': certificat.restrictions,
+        'patient': _patient(certificat.patient),
+        'cabinet': cabinet or donnees_cabinet(),
+    }
+
+
+def donnees_ordonnance(ordonnance, cabinet=None):
+    return {
+        'id': ordonnance.pk,
+        'date_prescription': ordonnance.date_prescription,
+        'medicaments': ordonnance.medicaments,
+        'duree_traitement': ordonnance.duree_traitement,
+        'instructions': ordonnance.instructions,
+        'patient': _patient(ordonnance.consultation.patient),
+        'cabinet': cabinet or donnees_cabinet(),
+    }
+
+
+SOURCES = {
+    'certificat': (CertificatMedical.objects.select_related('patient'), donnees_certificat),
+    'ordonnance': (Ordonnance.objects.select_related('consultation__patient'), donnees_ordonnance),
+}
+
+
+def donnees(type_document, pk, cabinet=None):
+    """Données de rendu d'un document ; lève DoesNotExist s'il n'existe pas"""
+    queryset, extraire = SOURCES[type_document]
+    return extraire(queryset.get(pk=pk), cabinet)
+
+
+def cle_contenu(type_document, valeurs):
+    """Empreinte des données et de la version de mise en page"""
+    empreinte = json.dumps(
+        [type_document, rendu_pdf.VERSION, valeurs], sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(empreinte.encode()).hexdigest()
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'PDF_WORKERS', WORKERS))
+    return _pool
+
+
+def _soumettre_au_pool(*args):
+    """Soumet au pool ; un pool cassé est abandonné et la soumission refaite une fois sur un pool neuf"""
+    global _pool
+    try:
+        return _executor().submit(*args)
+    except BrokenProcessPool:
+        ancien, _pool = _pool, None
+        ancien.shutdown(wait=False, cancel_futures=True)
+        return _executor().submit(*args)
+
+
+def soumettre_donnees(type_document, valeurs):
+    """Soumet un rendu à partir de données déjà lues ; retourne la clé"""
+    cle = cle_contenu(type_document, valeurs)
+    if os.path.exists(chemin(cle)):
+        return cle
+
+    with _verrou:
+        travail = _travaux.get(cle)
+        # Un travail en cours ou réussi n'est pas relancé ; un échec peut l'être
+        if travail is None or (travail.done() and travail.exception() is not None):
+            _travaux[cle] = _soumettre_au_pool(rendu_pdf.rendre_fichier, type_document, valeurs, chemin(cle))
+            _oublier_termines()
+    return cle
+
+
+def soumettre(type_document, pk):
+    """Soumet le rendu d'un certificat ou d'une ordonnance ; retourne la clé"""
+    return soumettre_donnees(type_document, donnees(type_document, pk))
+
+
+def _oublier_termines():
+    if len(_travaux) > TRAVAUX_MAX:
+        for cle in [cle for cle, travail in _travaux.items() if travail.done()]:
+            del _travaux[cle]
+
+
+def etat(cle):
+    if os.path.exists(chemin(cle)):
+        return 'termine'
+    travail = _travaux.get(cle)
+    if travail is None:
+        return 'inconnu'
+    if not travail.done():
+        return 'en_cours'
+    return 'erreur' if travail.exception() is not None else 'termine'
+
+
+def erreur(cle):
+    travail = _travaux.get(cle)
+    if travail is not None and travail.done() and travail.exception() is not None:
+        return str(travail.exception())
+    return None
+
+
+def attendre(cle, delai=None):
+    """Chemin du PDF une fois rendu ; TimeoutError au-delà du délai"""
+    if os.path.exists(chemin(cle)):
+        return chemin(cle)
+    travail = _travaux.get(cle)
+    if travail is None:
+        raise KeyError(cle)
+    try:
+        travail.result(timeout=delai)
+    except FutureTimeoutError:
+        raise TimeoutError(f"Rendu PDF {cle} non terminé après {delai}s") from None
+    return chemin(cle)
+
+
+def purger(jours=30):
+    """Supprime les PDF en cache non modifiés depuis `jours` ; retourne le nombre supprimé"""
+    limite = time.time() - jours * 86400
+    supprimes = 0
+    for racine, _, fichiers in os.walk(dossier_cache()):
+        for nom in fichiers:
+            fichier = os.path.join(racine, nom)
+            if os.path.getmtime(fichier) < limite:
+                os.remove(fichier)
+                supprimes += 1
+    return supprimes
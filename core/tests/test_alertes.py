@@ -0,0 +1,126 @@
+"""
+Tests de la génération des alertes
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Alerte, Consultation, Facture, Patient, RendezVous
+from core.models_certificates import CertificatMedical
+from core.services import alertes
+
+
+class TestAlertes(TestCase):
+    """Tests des conditions, de la déduplication et de l'expiration"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.maintenant = timezone.make_aware(datetime(2024, 3, 4, 8))
+        cls.aujourd_hui = cls.maintenant.date()
+        cls.patient = Patient.objects.create(
+            nom='Bennani', prenom='Salma', date_naissance=date(1985, 6, 12), sexe='F',
+            telephone='0600000000', adresse='Rabat'
+        )
+        consultation = Consultation.objects.create(patient=cls.patient, date_consultation=cls.maintenant)
+
+        def facture(jours, statut):
+            return Facture.objects.create(
+                consultation=consultation, date_facture=cls.aujourd_hui - timedelta(days=jours),
+                montant_total=Decimal('500'), statut=statut,
+            )
+
+        cls.impayee = facture(45, 'envoyee')
+        cls.ancienne = facture(90, 'en_attente')
+        facture(10, 'envoyee')
+        facture(90, 'payee')
+        facture(90, 'brouillon')
+
+        def rdv(heures, statut='prevu'):
+            return RendezVous.objects.create(
+                patient=cls.patient, date_heure=cls.maintenant + timedelta(hours=heures), statut=statut
+            )
+
+        cls.demain = rdv(20)
+        rdv(30)
+        rdv(2, statut='annule')
+        rdv(-2)
+
+        def certificat(numero, jours, est_active=True):
+            return CertificatMedical.objects.create(
+                numero_certificat=numero, type_certificat='maladie', patient=cls.patient,
+                date_emission=date(2024, 1, 1), date_debut=date(2024, 1, 1),
+                date_fin=cls.aujourd_hui - timedelta(days=jours), diagnostic='Angine', est_active=est_active,
+            )
+
+        cls.expire = certificat('C-1', 3)
+        certificat('C-2', 0)
+        certificat('C-3', 60)
+        certificat('C-4', 3, est_active=False)
+
+        # Alerte saisie à la main, sans facture liée : ni dédupliquée ni expirée
+        Alerte.objects.create(titre='Facture', message='Saisie', type_alerte='facture_impayee', patient=cls.patient)
+
+    def generees(self):
+        return Alerte.objects.exclude(message='Saisie')
+
+    def test_conditions(self):
+        self.assertEqual(alertes.generer(self.maintenant), {'candidates': 4, 'expirees': 0, 'escaladees': 0})
+        self.assertEqual(
+            dict(self.generees().filter(type_alerte='facture_impayee').values_list('facture_id', 'priorite')),
+            {self.impayee.pk: 'haute', self.ancienne.pk: 'critique'},
+        )
+        rappel = self.generees().get(type_alerte='rdv_rappel')
+        self.assertEqual(rappel.rendez_vous_id, self.demain.pk)
+        self.assertEqual(rappel.date_expiration, self.demain.date_heure)
+        certificat = self.generees().get(type_alerte='certificat_expire')
+        self.assertEqual(certificat.donnees_supplementaires, {'certificat': self.expire.pk})
+
+    def test_requetes_et_idempotence(self):
+        # Transaction (2), expiration, escalade, trois conditions, certificats signalés, insertion
+        with self.assertNumQueries(2 + 2 + 4 + 1):
+            alertes.generer(self.maintenant)
+        with self.assertNumQueries(2 + 2 + 4):
+            self.assertEqual(alertes.generer(self.maintenant)['candidates'], 0)
+        self.assertEqual(self.generees().count(), 4)
+
+    def test_index_unique(self):
+        """Une génération concurrente n'insère pas de doublon"""
+        alertes.generer(self.maintenant)
+        doublons = [
+            Alerte(titre='Doublon', message='', type_alerte='facture_impayee', facture=self.impayee),
+            Alerte(titre='Doublon', message='', type_alerte='certificat_expire',
+                   donnees_supplementaires={'certificat': self.expire.pk}),
+            Alerte(titre='Saisie', message='Saisie', type_alerte='facture_impayee', patient=self.patient),
+        ]
+        Alerte.objects.bulk_create(doublons, ignore_conflicts=True)
+        self.assertFalse(Alerte.objects.filter(titre='Doublon').exists())
+        self.assertEqual(Alerte.objects.filter(message='Saisie').count(), 2)
+
+    def test_expiration_et_escalade(self):
+        alertes.generer(self.maintenant)
+        Facture.objects.filter(pk=self.ancienne.pk).update(statut='payee')
+
+        plus_tard = self.maintenant + timedelta(days=20)
+        resultat = alertes.generer(plus_tard)
+        # Facture payée et RDV passé ; la facture de 45 jours en a maintenant 65
+        self.assertEqual((resultat['expirees'], resultat['escaladees']), (2, 1))
+        self.assertEqual(
+            set(self.generees().filter(statut='expiree').values_list('type_alerte', flat=True)),
+            {'facture_impayee', 'rdv_rappel'},
+        )
+        self.assertEqual(Alerte.objects.get(facture=self.impayee).priorite, 'critique')
+        self.assertEqual(Alerte.objects.get(message='Saisie').statut, 'active')
+
+        # Une alerte traitée n'est pas recréée
+        Alerte.objects.filter(facture=self.impayee).update(statut='traitee')
+        self.assertEqual(alertes.generer(plus_tard)['candidates'], 0)
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('generer_alertes', stdout=sortie)
+        self.assertIn('alerte(s) candidate(s)', sortie.getvalue())
@@ -0,0 +1,59 @@
+"""
+Tests de l'aperçu consolidé des statistiques
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Consultation, Facture, Patient, RendezVous
+from core.services.apercu import apercu_systeme
+
+
+class TestApercuSysteme(TestCase):
+    """Tests de apercu_systeme()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jour = date(2024, 3, 15)
+        maintenant = timezone.make_aware(datetime(2024, 3, 15, 10, 0))
+        patients = [
+            Patient.objects.create(
+                nom=f'Patient{i}', prenom='Test', date_naissance=date(1980, 1, 1),
+                sexe='F', telephone='0600000000', adresse='Rabat'
+            )
+            for i in range(3)
+        ]
+        RendezVous.objects.create(patient=patients[0], date_heure=maintenant, statut='prevu')
+        RendezVous.objects.create(patient=patients[1], date_heure=maintenant, statut='annule')
+        for patient in patients[:2]:
+            consultation = Consultation.objects.create(
+                patient=patient, date_consultation=maintenant
+            )
+            Facture.objects.create(
+                consultation=consultation, date_facture=cls.jour,
+                montant_total=Decimal('300.00'), statut='payee'
+            )
+
+    def test_une_seule_requete(self):
+        with self.assertNumQueries(1):
+            apercu_systeme(self.jour)
+
+    def test_valeurs(self):
+        apercu = apercu_systeme(self.jour)
+        self.assertEqual(apercu['patients'], 3)
+        self.assertEqual(apercu['rendez_vous'], 2)
+        self.assertEqual(apercu['rdv_programmes'], 1)
+        self.assertEqual(apercu['consultations_jour'], 2)
+        self.assertEqual(apercu['revenus_jour'], Decimal('600'))
+        self.assertEqual(apercu['patients_uniques'], 2)
+        self.assertEqual(apercu['revenu_moyen'], Decimal('300'))
+        self.assertEqual(apercu['consultations_orphelines'], 0)
+
+    def test_tables_vides(self):
+        Facture.objects.all().delete()
+        apercu = apercu_systeme(date(2030, 1, 1))
+        self.assertEqual(apercu['revenus_mois'], Decimal('0'))
+        self.assertEqual(apercu['revenu_moyen'], Decimal('0'))
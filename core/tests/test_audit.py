@@ -0,0 +1,181 @@
+"""
+Tests du journal d'audit par lots
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.middleware_audit import AuditMiddleware
+from core.models_audit import JournalAudit
+from core.services import audit
+from core.services.audit import DestinationBdd, DestinationFichier, FileAudit
+
+
+class DestinationListe:
+    """Destination de test : garde les lots, peut être bloquée"""
+
+    def __init__(self):
+        self.lots = []
+        self.ouverte = threading.Event()
+        self.ouverte.set()
+        self.fermee = False
+
+    def ecrire(self, lot):
+        self.ouverte.wait(5)
+        self.lots.append(list(lot))
+
+    def fermer(self):
+        self.fermee = True
+
+
+def entree(rang):
+    return {'chemin': f'/patients/{rang}/', 'statut': 200}
+
+
+class TestFileAudit(SimpleTestCase):
+    """Tests de la file et du thread de vidage"""
+
+    def test_lots(self):
+        destination = DestinationListe()
+        file = FileAudit(destination, taille_max=100, taille_lot=4, intervalle_ms=5000)
+        self.addCleanup(file.arreter)
+        for rang in range(10):
+            self.assertTrue(file.enregistrer(entree(rang)))
+        self.assertTrue(file.vider())
+        # Deux lots complets, puis le reste écrit par le vidage
+        self.assertEqual([len(lot) for lot in destination.lots], [4, 4, 2])
+        self.assertEqual(file.statistiques()['ecrites'], 10)
+
+    def test_intervalle(self):
+        destination = DestinationListe()
+        file = FileAudit(destination, taille_max=100, taille_lot=1000, intervalle_ms=20)
+        self.addCleanup(file.arreter)
+        file.enregistrer(entree(1))
+        for _ in range(100):
+            if destination.lots:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(destination.lots, [[entree(1)]])
+
+    def test_contre_pression(self):
+        """File pleine : les entrées sont rejetées et comptées, la requête n'attend pas"""
+        destination = DestinationListe()
+        destination.ouverte.clear()
+        file = FileAudit(destination, taille_max=5, taille_lot=1, intervalle_ms=1)
+        self.addCleanup(file.arreter)
+
+        resultats = [file.enregistrer(entree(rang)) for rang in range(20)]
+        statistiques = file.statistiques()
+        self.assertEqual(statistiques['recues'], 20)
+        self.assertGreater(statistiques['rejetees'], 0)
+        self.assertEqual(statistiques['rejetees'], resultats.count(False))
+        self.assertEqual(statistiques['taille_max_atteinte'], 5)
+
+        destination.ouverte.set()
+        self.assertTrue(file.vider())
+        self.assertEqual(sum(map(len, destination.lots)), resultats.count(True))
+
+    def test_file_pleine_au_vidage(self):
+        destination = DestinationListe()
+        destination.ouverte.clear()
+        file = FileAudit(destination, taille_max=1, taille_lot=1, intervalle_ms=1)
+        self.addCleanup(file.arreter, 5)
+        self.addCleanup(destination.ouverte.set)
+        while file.enregistrer(entree(0)):
+            pass
+        self.assertFalse(file.vider(0.05))
+        with self.assertLogs('core.services.audit', 'WARNING'):
+            file.arreter(0.05)
+        self.assertTrue(file.thread.is_alive())
+
+    def test_vidage_a_l_arret(self):
+        destination = DestinationListe()
+        file = FileAudit(destination, taille_max=100, taille_lot=1000, intervalle_ms=60000)
+        for rang in range(7):
+            file.enregistrer(entree(rang))
+        file.arreter()
+        self.assertEqual(destination.lots, [[entree(rang) for rang in range(7)]])
+        self.assertTrue(destination.fermee)
+        self.assertFalse(file.thread.is_alive())
+
+    def test_destination_en_erreur(self):
+        class Panne:
+            def ecrire(self, lot):
+                raise OSError("disque plein")
+
+            def fermer(self):
+                pass
+
+        file = FileAudit(Panne(), taille_max=10, taille_lot=2, intervalle_ms=1)
+        self.addCleanup(file.arreter)
+        with self.assertLogs('core.services.audit', 'ERROR'):
+            file.enregistrer(entree(1))
+            file.vider()
+        # Le thread survit à l'erreur
+        self.assertTrue(file.thread.is_alive())
+        self.assertEqual(file.statistiques()['erreurs'], 1)
+
+    def test_fichier_gzip(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        destination = DestinationFichier(dossier, max_octets=1)
+        destination.ecrire([{'date': timezone.now(), 'chemin': '/é/'}])
+        destination.ecrire([entree(1), entree(2)])
+        destination.fermer()
+
+        fichiers = sorted(os.listdir(dossier))
+        # max_octets=1 : un fichier par lot
+        self.assertEqual(len(fichiers), 2)
+        lignes = []
+        for nom in fichiers:
+            with gzip.open(os.path.join(dossier, nom), 'rt', encoding='utf-8') as f:
+                lignes += [json.loads(ligne) for ligne in f]
+        self.assertEqual([ligne['chemin'] for ligne in lignes], ['/é/', '/patients/1/', '/patients/2/'])
+
+
+class TestAuditBdd(TestCase):
+    """Tests de l'écriture en base et du middleware"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = get_user_model().objects.create_user('medecin', password='medecin')
+
+    def test_bulk_create(self):
+        lot = [
+            {'date': timezone.now(), 'utilisateur_id': self.utilisateur.pk, 'methode': 'GET', 'chemin': f'/{rang}/',
+             'vue': 'patients', 'statut': 200, 'duree_ms': rang, 'adresse_ip': '127.0.0.1'}
+            for rang in range(50)
+        ]
+        with self.assertNumQueries(1):
+            DestinationBdd().ecrire(lot)
+        self.assertEqual(JournalAudit.objects.filter(utilisateur=self.utilisateur).count(), 50)
+
+    def test_middleware_sans_requete(self):
+        destination = DestinationListe()
+        audit._file = FileAudit(destination, taille_max=10, taille_lot=10, intervalle_ms=60000)
+        self.addCleanup(setattr, audit, '_file', None)
+        self.addCleanup(audit._file.arreter)
+
+        middleware = AuditMiddleware(lambda request: HttpResponse(status=201))
+        requete = RequestFactory().post('/patients/', REMOTE_ADDR='10.0.0.7')
+        requete._cached_user = self.utilisateur
+        with self.assertNumQueries(0):
+            middleware(requete)
+            middleware(RequestFactory().get('/static/app.css'))
+        audit._file.vider()
+
+        [[entree_ecrite]] = destination.lots
+        self.assertEqual(
+            {cle: entree_ecrite[cle] for cle in ('utilisateur_id', 'methode', 'chemin', 'statut', 'adresse_ip')},
+            {'utilisateur_id': self.utilisateur.pk, 'methode': 'POST', 'chemin': '/patients/', 'statut': 201,
+             'adresse_ip': '10.0.0.7'},
+        )
@@ -0,0 +1,74 @@
+"""
+Tests du budget de requêtes des pages
+"""
+
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+
+from core.models import Patient
+from core.services.bench_pages import comparer, mesurer, mesurer_page
+
+
+def _mesure(**valeurs):
+    return {'url': '/', 'statut': 200, 'requetes': 5, 'sql_ms': 1.0, 'temps_ms': 20.0, 'memoire_mo': 1.0, **valeurs}
+
+
+class TestComparer(TestCase):
+    """Tests des budgets et de la comparaison à la référence"""
+
+    def test_dans_le_budget(self):
+        self.assertEqual(comparer({'patients': _mesure()}, {'patients': _mesure()}), [])
+
+    def test_depassement_de_budget(self):
+        echecs = comparer({'patients': _mesure(requetes=31)})
+        self.assertEqual([nom for nom, _ in echecs], ['patients'])
+        self.assertIn('requetes', echecs[0][1])
+
+    @override_settings(BENCH_BUDGETS={'patients': {'requetes': 3}})
+    def test_budget_des_settings(self):
+        self.assertEqual(len(comparer({'patients': _mesure()})), 1)
+
+    def test_regression_par_rapport_a_la_reference(self):
+        reference = {'patients': _mesure()}
+        self.assertEqual(len(comparer({'patients': _mesure(requetes=6)}, reference)), 1)
+        self.assertEqual(len(comparer({'patients': _mesure(temps_ms=40.0)}, reference)), 1)
+        self.assertEqual(comparer({'patients': _mesure(temps_ms=25.0)}, reference), [])
+
+    def test_statut_http(self):
+        self.assertIn('404', comparer({'kpi': _mesure(statut=404)})[0][1])
+
+
+@override_settings(ROOT_URLCONF='core.urls_export')
+class TestMesurer(TestCase):
+    """Mesure d'une page réelle par le client de test"""
+
+    def test_mesure_export(self):
+        Patient.objects.create(
+            nom='Tazi', prenom='Omar', date_naissance=date(1990, 1, 1),
+            sexe='M', telephone='0600000000', adresse='Rabat'
+        )
+        self.client.force_login(get_user_model().objects.create_user('bench', password='bench'))
+
+        mesures = mesurer(self.client, pages=[('patients', '/patients.csv')], repetitions=2)
+
+        self.assertEqual(mesures['patients']['statut'], 200)
+        # Session, utilisateur, puis l'export lui-même
+        self.assertEqual(mesures['patients']['requetes'], 3)
+        self.assertGreater(mesures['patients']['temps_ms'], 0)
+
+    def test_requetes_du_premier_appel(self):
+        """Le premier appel, caches froids, fait plus de requêtes : c'est lui qui compte"""
+        class ClientCacheFroid:
+            appels = 0
+
+            def get(self, url):
+                self.appels += 1
+                for _ in range(4 if self.appels == 1 else 1):
+                    Patient.objects.count()
+                return HttpResponse()
+
+        mesure = mesurer_page(ClientCacheFroid(), '/', repetitions=2)
+        self.assertEqual(mesure['requetes'], 4)
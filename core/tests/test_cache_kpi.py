@@ -0,0 +1,83 @@
+"""
+Tests du cache des KPI et de son invalidation par période
+"""
+
+from datetime import date, datetime
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Consultation, Patient
+from core.services import cache_kpi
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-kpi'}
+})
+class TestCacheKPI(TestCase):
+    """Tests de cache_kpi.obtenir() et de l'invalidation"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.appels = 0
+
+    def calcul(self):
+        self.appels += 1
+        return {'consultations': self.appels}
+
+    def test_hit_apres_premier_calcul(self):
+        avant = cache_kpi.statistiques()
+        for _ in range(3):
+            cache_kpi.obtenir('periode', date(2024, 1, 1), date(2025, 1, 1), self.calcul)
+        apres = cache_kpi.statistiques()
+        self.assertEqual(self.appels, 1)
+        self.assertEqual(apres['hits'] - avant['hits'], 2)
+        self.assertEqual(apres['misses'] - avant['misses'], 1)
+
+    def test_invalidation_limitee_a_la_periode(self):
+        mars = (date(2024, 3, 1), date(2024, 4, 1))
+        avril = (date(2024, 4, 1), date(2024, 5, 1))
+        cache_kpi.obtenir('periode', *mars, self.calcul)
+        cache_kpi.obtenir('periode', *avril, self.calcul)
+
+        cache_kpi.invalider_jours({date(2024, 3, 15)})
+
+        cache_kpi.obtenir('periode', *avril, self.calcul)
+        self.assertEqual(self.appels, 2)
+        cache_kpi.obtenir('periode', *mars, self.calcul)
+        self.assertEqual(self.appels, 3)
+
+    def test_invalidation_jour_dans_annee(self):
+        annee = (date(2024, 1, 1), date(2025, 1, 1))
+        cache_kpi.obtenir('periode', *annee, self.calcul)
+        cache_kpi.invalider_jours({date(2024, 7, 14)})
+        cache_kpi.obtenir('periode', *annee, self.calcul)
+        self.assertEqual(self.appels, 2)
+
+    def test_type_kpi_distinct(self):
+        periode = (date(2024, 3, 1), date(2024, 3, 8))
+        cache_kpi.obtenir('periode', *periode, self.calcul, kpi_type='financier')
+        cache_kpi.obtenir('periode', *periode, self.calcul, kpi_type='medical')
+        self.assertEqual(self.appels, 2)
+
+    def test_invalidation_par_signal(self):
+        # Cache local au processus : signalé, l'invalidation ne toucherait pas les autres workers
+        with self.assertLogs('core.services.cache_kpi', 'WARNING'):
+            cache_kpi.connecter()
+        self.addCleanup(cache_kpi.deconnecter)
+        jour = date(2024, 3, 15)
+        patient = Patient.objects.create(
+            nom='Tazi', prenom='Omar', date_naissance=date(1970, 2, 2),
+            sexe='M', telephone='0600000000', adresse='Tanger'
+        )
+        cache_kpi.obtenir('jour', jour, date(2024, 3, 16), self.calcul)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Consultation.objects.create(
+                patient=patient,
+                date_consultation=timezone.make_aware(datetime(2024, 3, 15, 9, 0))
+            )
+
+        cache_kpi.obtenir('jour', jour, date(2024, 3, 16), self.calcul)
+        self.assertEqual(self.appels, 2)
@@ -0,0 +1,120 @@
+"""
+Tests de la détection des conflits de rendez-vous
+"""
+
+from datetime import date, datetime, time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Patient, RendezVous
+from core.models_certificates import RendezVousRecurrent
+from core.services import recurrences
+from core.services.conflits import Agenda, _ArbreMax, _Journee
+
+
+class TestJournee(SimpleTestCase):
+    """Tests de la structure d'une journée, sans base de données"""
+
+    def setUp(self):
+        # Ouverture 8h-18h ; rendez-vous 9h-10h, 9h30-9h45, 11h-11h30, 11h30-12h
+        self.journee = _Journee(480, 1080)
+        for debut, fin, pk in ((660, 690, 3), (540, 600, 1), (690, 720, 4), (570, 585, 2)):
+            self.journee.ajouter(debut, fin, pk)
+
+    def test_conflits(self):
+        self.assertEqual(sorted(self.journee.conflits(580, 590)), [1, 2])
+        # Un rendez-vous long commencé plus tôt est trouvé derrière un plus court
+        self.assertEqual(self.journee.conflits(590, 605), [1])
+        self.assertEqual(self.journee.conflits(600, 660), [])
+        self.assertEqual(self.journee.conflits(719, 800), [4])
+        self.assertTrue(self.journee.libre(720, 780))
+        self.assertFalse(self.journee.libre(500, 541))
+
+    def test_premier_libre(self):
+        self.assertEqual(self.journee.premier_libre(30, 480), 480)
+        self.assertEqual(self.journee.premier_libre(61, 480), 720)
+        self.assertEqual(self.journee.premier_libre(60, 550), 600)
+        # Intervalle libre entamé : 10h20-11h ne laisse que 40 minutes
+        self.assertEqual(self.journee.premier_libre(45, 620), 720)
+        self.assertEqual(self.journee.premier_libre(360, 480), 720)
+        self.assertIsNone(self.journee.premier_libre(361, 480))
+        self.assertIsNone(self.journee.premier_libre(15, 1080))
+
+    def test_reservation_met_a_jour_les_libres(self):
+        self.assertEqual(self.journee.premier_libre(30, 600), 600)
+        self.journee.ajouter(600, 660)
+        self.assertEqual(self.journee.premier_libre(30, 600), 720)
+        self.assertEqual(self.journee.conflits(650, 655), [None])
+
+    def test_arbre(self):
+        arbre = _ArbreMax([5, 40, 10, 60, 20])
+        self.assertEqual(arbre.premier(0, 30), 1)
+        self.assertEqual(arbre.premier(2, 30), 3)
+        self.assertEqual(arbre.premier(2, 15), 3)
+        self.assertIsNone(arbre.premier(4, 30))
+        self.assertIsNone(_ArbreMax([]).premier(0, 1))
+
+
+@override_settings(AGENDA_OUVERTURE=time(8), AGENDA_FERMETURE=time(18))
+class TestAgenda(TestCase):
+    """Tests de l'agenda chargé depuis la base"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            nom='Bennani', prenom='Salma', date_naissance=date(1985, 6, 12), sexe='F',
+            telephone='0600000000', adresse='Rabat'
+        )
+        cls.jour = date(2024, 3, 4)
+        cls.neuf_heures = cls.rdv(cls.jour, 9, 60)
+        cls.onze_heures = cls.rdv(cls.jour, 11, 30)
+        cls.annule = cls.rdv(cls.jour, 14, 30, statut='annule')
+        cls.lendemain = cls.rdv(date(2024, 3, 5), 8, 600)
+
+    @classmethod
+    def rdv(cls, jour, heure, duree, statut='prevu'):
+        return RendezVous.objects.create(
+            patient=cls.patient, date_heure=cls.a(jour, heure), duree_prevue=duree, statut=statut
+        )
+
+    @staticmethod
+    def a(jour, heure, minute=0):
+        return timezone.make_aware(datetime.combine(jour, time(heure, minute)))
+
+    def test_une_requete(self):
+        with self.assertNumQueries(1):
+            agenda = Agenda(self.jour, date(2024, 3, 31))
+        self.assertEqual(agenda.conflits(self.a(self.jour, 9, 30)), [self.neuf_heures.pk])
+        # Les rendez-vous annulés libèrent leur créneau
+        self.assertTrue(agenda.est_libre(self.a(self.jour, 14)))
+        with self.assertRaises(ValueError):
+            agenda.conflits(self.a(date(2024, 4, 1), 9))
+
+    def test_verification_en_lot(self):
+        agenda = Agenda(self.jour, self.jour)
+        resultat = agenda.verifier([
+            (self.a(self.jour, 10), 30),
+            (self.a(self.jour, 10, 15), 30),
+            (self.a(self.jour, 10, 59), 5),
+        ])
+        self.assertEqual([conflits for _, _, conflits in resultat], [[], [None], [self.onze_heures.pk]])
+
+    def test_deplacement(self):
+        """Le rendez-vous déplacé ne bloque pas son propre créneau"""
+        agenda = Agenda(self.jour, date(2024, 3, 6), exclure=[self.neuf_heures.pk])
+        self.assertEqual(agenda.premier_creneau_libre(120, self.a(self.jour, 8, 30)), self.a(self.jour, 8, 30))
+        # Journée du 5 pleine : le premier créneau de l'après-midi du 4 puis le 6
+        self.assertEqual(agenda.premier_creneau_libre(240, self.a(self.jour, 12)), self.a(self.jour, 12))
+        self.assertEqual(agenda.premier_creneau_libre(480, self.a(self.jour, 12)), self.a(date(2024, 3, 6), 8))
+        self.assertIsNone(agenda.premier_creneau_libre(601, self.a(self.jour, 8)))
+
+    def test_materialisation_sans_conflit(self):
+        # Lundis 10h45 ; le 4 mars chevauche le rendez-vous de 11h
+        RendezVousRecurrent.objects.create(
+            patient=self.patient, motif='Kinésithérapie', frequence='hebdomadaire', jour_semaine=1,
+            heure=time(10, 45), date_debut=date(2024, 3, 1), est_active=True,
+        )
+        self.assertEqual(recurrences.materialiser(date(2024, 3, 1), date(2024, 3, 31), sans_conflit=True), 3)
+        self.assertFalse(RendezVous.objects.filter(remarque='Kinésithérapie', date_heure__date=self.jour).exists())
+        self.assertEqual(recurrences.materialiser(date(2024, 3, 1), date(2024, 3, 31)), 1)
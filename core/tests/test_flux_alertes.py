@@ -0,0 +1,147 @@
+"""
+Tests du fil d'alertes et des compteurs de non lues
+"""
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.context_processors import alertes as badge
+from core.models import Alerte
+from core.services import flux_alertes
+
+
+def creer(priorite='haute', statut='active', titre='Alerte'):
+    return Alerte.objects.create(titre=titre, message='', type_alerte='system', priorite=priorite, statut=statut)
+
+
+class TestCompteurs(TestCase):
+    """Tests des compteurs incrémentaux"""
+
+    def setUp(self):
+        flux_alertes.connecter_signaux()
+        self.addCleanup(flux_alertes.deconnecter_signaux)
+        cache.clear()
+        for priorite in ('critique', 'haute', 'haute', 'normale'):
+            creer(priorite)
+        creer('haute', statut='traitee')
+
+    def test_zero_requete_en_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                flux_alertes.compteurs(), {'critique': 1, 'haute': 2, 'normale': 1, 'basse': 0, 'total': 4}
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(flux_alertes.compteurs()['total'], 4)
+
+    def test_mise_a_jour_incrementale(self):
+        flux_alertes.compteurs()
+        with self.captureOnCommitCallbacks(execute=True):
+            alerte = creer('basse')
+            creer('critique', statut='expiree')
+        with self.captureOnCommitCallbacks(execute=True):
+            alerte.priorite = 'critique'
+            alerte.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Alerte.objects.get(priorite='normale').delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            traitee = Alerte.objects.filter(priorite='haute', statut='active').first()
+            traitee.statut = 'traitee'
+            traitee.save()
+
+        with self.assertNumQueries(0):
+            compteurs = flux_alertes.compteurs()
+        self.assertEqual(compteurs, {'critique': 2, 'haute': 1, 'normale': 0, 'basse': 0, 'total': 3})
+        self.assertEqual(compteurs, {**flux_alertes.compter(), 'total': 3})
+
+    def test_increment_pendant_un_recalcul(self):
+        """Une alerte validée pendant un recalcul n'est pas écrasée par le compte périmé"""
+        compter = flux_alertes.compter
+
+        def compter_puis_creer():
+            comptes = compter()
+            with self.captureOnCommitCallbacks(execute=True):
+                creer('critique')
+            return comptes
+
+        with mock.patch.object(flux_alertes, 'compter', side_effect=compter_puis_creer):
+            self.assertEqual(flux_alertes.compteurs()['total'], 4)
+        self.assertEqual(flux_alertes.compteurs(), {**compter(), 'total': 5})
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_local_signale(self):
+        with self.assertLogs('core.services.flux_alertes', 'WARNING'):
+            flux_alertes.connecter_signaux()
+
+    def test_invalidation(self):
+        flux_alertes.compteurs()
+        Alerte.objects.update(statut='expiree')
+        flux_alertes.invalider()
+        with self.assertNumQueries(1):
+            self.assertEqual(flux_alertes.compteurs()['total'], 0)
+
+    def test_badge_paresseux(self):
+        flux_alertes.compteurs()
+        contexte = badge(RequestFactory().get('/'))
+        with self.assertNumQueries(0):
+            rendu = Engine().from_string('{{ alertes_non_lues.total }}/{{ alertes_non_lues.critique }}').render(Context(contexte))
+        self.assertEqual(rendu, '4/1')
+
+        # Gabarit sans badge : le cache n'est pas même lu
+        cache.clear()
+        contexte = badge(RequestFactory().get('/'))
+        with self.assertNumQueries(0):
+            Engine().from_string('Accueil').render(Context(contexte))
+
+
+@override_settings(ROOT_URLCONF='core.urls_alertes')
+class TestApiAlertes(TestCase):
+    """Tests de l'API du fil"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = get_user_model().objects.create_user('medecin', password='medecin')
+        cls.alertes = [creer('haute' if rang % 2 else 'normale', titre=f'A{rang}') for rang in range(7)]
+        creer('haute', statut='traitee', titre='Traitée')
+
+    def setUp(self):
+        flux_alertes.connecter_signaux()
+        self.addCleanup(flux_alertes.deconnecter_signaux)
+        cache.clear()
+        self.client.force_login(self.utilisateur)
+
+    def test_pagination_par_curseur(self):
+        titres = []
+        parametres = {'taille': 3}
+        while True:
+            reponse = self.client.get('/alertes/', parametres).json()
+            titres += [alerte['titre'] for alerte in reponse['results']]
+            if not reponse['next']:
+                break
+            parametres['curseur'] = reponse['next']
+        self.assertEqual(titres, [f'A{rang}' for rang in reversed(range(7))])
+        self.assertEqual(reponse['non_lues']['total'], 7)
+
+        haute = self.client.get('/alertes/', {'priorite': 'haute'}).json()
+        self.assertEqual([alerte['titre'] for alerte in haute['results']], ['A5', 'A3', 'A1'])
+
+    def test_parametres_invalides(self):
+        self.assertEqual(self.client.get('/alertes/', {'priorite': 'urgente'}).status_code, 400)
+        self.assertEqual(self.client.get('/alertes/', {'statut': 'lue'}).status_code, 400)
+        self.assertEqual(self.client.get('/alertes/', {'curseur': 'altere'}).status_code, 400)
+        self.assertEqual(self.client.get('/alertes/', {'taille': 'dix'}).status_code, 400)
+
+    def test_traiter(self):
+        self.assertEqual(self.client.get('/alertes/compteurs/').json()['haute'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(f'/alertes/{self.alertes[1].pk}/traiter/')
+        self.assertEqual(reponse.json()['statut'], 'traitee')
+        with self.assertNumQueries(0):
+            self.assertEqual(flux_alertes.compteurs()['haute'], 2)
+
+    def test_authentification(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/alertes/').status_code, 401)
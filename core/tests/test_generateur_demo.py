@@ -0,0 +1,86 @@
+"""
+Tests du générateur de données de démonstration
+"""
+
+from datetime import date
+
+from django.db.models import F
+from django.test import TestCase
+
+from core.models import Consultation, Facture, Patient, RendezVous
+from core.models_certificates import CertificatMedical
+from core.services.generateur_demo import generer
+
+
+REFERENCE = date(2024, 6, 15)
+
+
+def _empreinte():
+    """Contenu généré, indépendant des clés primaires"""
+    return sorted(
+        RendezVous.objects.values_list(
+            'patient__cin', 'date_heure', 'statut', 'duree_prevue',
+            'consultation__motif', 'consultation__facture__montant_total', 'consultation__facture__statut',
+        )
+    )
+
+
+class TestGenerateurDemo(TestCase):
+    """Tests du volume, de la cohérence et du déterminisme"""
+
+    def test_compteurs_et_requetes_par_lot(self):
+        # Contrôle de la graine, puis par lot : un INSERT par table, plus le point de sauvegarde de la transaction
+        with self.assertNumQueries(1 + 2 * (6 + 2)):
+            rapport = generer(40, graine=1, taille_lot=20, reference=REFERENCE)
+
+        self.assertEqual(rapport['tables']['patients'], 40)
+        self.assertEqual(Patient.objects.count(), 40)
+        self.assertEqual(RendezVous.objects.count(), rapport['tables']['rendez_vous'])
+        self.assertEqual(Facture.objects.count(), rapport['tables']['factures'])
+        self.assertEqual(CertificatMedical.objects.count(), rapport['tables']['certificats'])
+
+    def test_coherence(self):
+        generer(60, graine=2, reference=REFERENCE)
+
+        self.assertFalse(Consultation.objects.exclude(rendez_vous__statut='termine').exists())
+        self.assertFalse(RendezVous.objects.filter(date_heure__date__gte=REFERENCE, statut__in=['termine', 'annule', 'absent']).exists())
+        self.assertFalse(Facture.objects.exclude(montant_total=F('montant_ht') + F('montant_tva')).exists())
+        self.assertFalse(Facture.objects.filter(statut='payee', date_paiement__isnull=True).exists())
+
+    def test_meme_graine_memes_donnees(self):
+        generer(30, graine=3, taille_lot=7, reference=REFERENCE)
+        premiere = _empreinte()
+        Patient.objects.all().delete()
+
+        generer(30, graine=3, taille_lot=30, reference=REFERENCE)
+        self.assertEqual(_empreinte(), premiere)
+
+        Patient.objects.all().delete()
+        generer(30, graine=4, reference=REFERENCE)
+        self.assertNotEqual(_empreinte(), premiere)
+
+    def test_graine_deja_generee(self):
+        generer(200, graine=5, reference=REFERENCE)
+        self.assertTrue(CertificatMedical.objects.exists())
+        patients = Patient.objects.count()
+
+        with self.assertRaisesMessage(ValueError, 'graine 5 existent déjà'):
+            generer(200, graine=5, reference=REFERENCE)
+        # Refus avant toute écriture
+        self.assertEqual(Patient.objects.count(), patients)
+
+        generer(10, graine=6, reference=REFERENCE)
+        self.assertEqual(Patient.objects.count(), patients + 10)
+        # Deux graines, deux jeux de CIN
+        self.assertEqual(Patient.objects.filter(cin__endswith='-00000000').count(), 2)
+
+    def test_graine_sans_certificat(self):
+        generer(1, graine=7, reference=REFERENCE)
+        self.assertFalse(CertificatMedical.objects.exists())
+        with self.assertRaisesMessage(ValueError, 'graine 7 existent déjà'):
+            generer(1, graine=7, reference=REFERENCE)
+        self.assertEqual(Patient.objects.count(), 1)
+
+    def test_graine_trop_longue(self):
+        with self.assertRaisesMessage(ValueError, 'trop longue'):
+            generer(1, graine=10 ** 12, reference=REFERENCE)
@@ -0,0 +1,138 @@
+"""
+Tests de l'impression groupée et de la fusion de PDF en flux
+"""
+
+import re
+import shutil
+import tempfile
+from datetime import date, datetime
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Consultation, Ordonnance, Patient
+from core.models_certificates import CertificatMedical
+from core.services import impression, rendu_pdf, travaux_pdf
+from core.services.fusion_pdf import FusionPdf, PdfInvalide, _Source, fusionner
+
+
+def verifier_pdf(test, contenu, pages):
+    """Table xref cohérente et nombre de pages attendu"""
+    source = _Source(contenu)
+    for numero, position in source.positions.items():
+        test.assertTrue(contenu.startswith(b'%d 0 obj' % numero, position), numero)
+    test.assertEqual(len(source.pages()), pages)
+
+
+class TestFusionPdf(SimpleTestCase):
+    """Tests de la fusion, sans base de données"""
+
+    def _certificat(self, numero, description=''):
+        return rendu_pdf.rendre('certificat', {
+            'patient': {'nom': 'Bennani', 'prenom': 'Salma', 'date_naissance': date(1985, 6, 12)},
+            'numero_certificat': numero, 'type_libelle': 'Arrêt de travail',
+            'date_emission': date(2024, 3, 4), 'date_debut': None, 'date_fin': None, 'duree_jours': None,
+            # Texte ressemblant à une référence PDF : il est dans un flux compressé, jamais renuméroté
+            'diagnostic': 'Grippe 12 0 R', 'description': description, 'restrictions': '',
+            'cabinet': {'nom_medecin': 'Dr. Alaoui', 'adresse': 'Rabat', 'telephone': '', 'ville': 'Rabat'},
+        })
+
+    def test_fusion(self):
+        longue = '\n'.join(f'Ligne {rang}' for rang in range(120))
+        contenus = [self._certificat('C-1'), self._certificat('C-2', longue), self._certificat('C-3')]
+        attendues = sum(len(_Source(contenu).pages()) for contenu in contenus)
+        self.assertGreater(attendues, 3)
+
+        fusion = b''.join(fusionner(contenus))
+        self.assertTrue(fusion.startswith(b'%PDF-'))
+        self.assertTrue(fusion.endswith(b'%%EOF\n'))
+        verifier_pdf(self, fusion, attendues)
+        # Toutes les pages pointent vers l'arbre des pages du document fusionné
+        self.assertEqual(set(re.findall(rb'/Parent (\d+) 0 R', fusion)), {b'1'})
+
+    def test_fusion_vide(self):
+        verifier_pdf(self, b''.join(fusionner([])), 0)
+
+    def test_pdf_invalide(self):
+        with self.assertRaises(PdfInvalide):
+            FusionPdf().ajouter(b'pas un PDF')
+
+
+class TestImpression(TestCase):
+    """Tests de l'impression d'une période"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = get_user_model().objects.create_user('medecin', password='medecin')
+        cls.jour = date(2024, 3, 4)
+        cls.lendemain = date(2024, 3, 5)
+        patients = [
+            Patient.objects.create(
+                nom=nom, prenom='Salma', date_naissance=date(1985, 6, 12), sexe='F',
+                telephone='0600000000', adresse='Rabat'
+            )
+            for nom in ('Bennani', 'Alaoui')
+        ]
+        cls.attendus = []
+        for jour in (cls.lendemain, cls.jour):
+            for patient in reversed(patients):
+                consultation = Consultation.objects.create(
+                    patient=patient, date_consultation=timezone.make_aware(datetime(jour.year, jour.month, jour.day, 10))
+                )
+                ordonnance = Ordonnance.objects.create(
+                    consultation=consultation, medicaments='Paracétamol 1g', date_prescription=jour
+                )
+                certificat = CertificatMedical.objects.create(
+                    numero_certificat=f'C-{jour}-{patient.pk}', type_certificat='maladie', patient=patient,
+                    date_emission=jour, date_debut=jour, diagnostic='Angine',
+                )
+                cls.attendus.append((jour, patient.pk, ('certificat', certificat.pk), ('ordonnance', ordonnance.pk)))
+        # Hors période
+        CertificatMedical.objects.create(
+            numero_certificat='C-AUTRE', type_certificat='maladie', patient=patients[0],
+            date_emission=date(2024, 4, 1), date_debut=date(2024, 4, 1), diagnostic='Angine',
+        )
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        reglages = override_settings(PDF_CACHE_DIR=self.dossier, PDF_WORKERS=1)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        travaux_pdf._travaux.clear()
+        travaux_pdf.invalider_cabinet()
+
+    def test_ordre_par_jour_puis_patient(self):
+        ordre = [(type_document, objet.pk) for type_document, objet in impression.documents(self.jour, self.lendemain)]
+        attendu = []
+        for _, _, certificat, ordonnance in sorted(self.attendus):
+            attendu += [certificat, ordonnance]
+        self.assertEqual(ordre, attendu)
+        self.assertEqual(impression.compter(self.jour, self.lendemain), 8)
+        self.assertEqual(impression.compter(self.jour, self.jour), 4)
+
+    def test_flux(self):
+        """Un morceau par document, et les documents rendus restent en cache"""
+        fusion = FusionPdf()
+        morceaux = list(impression.flux_pdf(self.jour, self.jour, fusion))
+        self.assertEqual(fusion.documents, 4)
+        verifier_pdf(self, b''.join(morceaux), 4)
+
+        cle = travaux_pdf.soumettre('certificat', self.attendus[-1][2][1])
+        self.assertEqual(travaux_pdf.etat(cle), 'termine')
+
+    @override_settings(ROOT_URLCONF='core.urls_pdf')
+    def test_vue(self):
+        self.client.force_login(self.utilisateur)
+
+        reponse = self.client.get('/impression/', {'debut': self.jour, 'fin': self.lendemain})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse['Content-Type'], 'application/pdf')
+        verifier_pdf(self, b''.join(reponse.streaming_content), 8)
+
+        self.assertEqual(self.client.get('/impression/', {'debut': '2024-13-01'}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/impression/', {'debut': self.lendemain, 'fin': self.jour}).status_code, 400
+        )
+        self.assertEqual(self.client.get('/impression/', {'debut': '2020-01-01'}).status_code, 404)
@@ -0,0 +1,99 @@
+"""
+Tests du cumul journalier des KPI
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Consultation, Facture, Patient, RendezVous
+from core.models_kpi import KPIJournalier
+from core.services.kpi_journalier import (
+    connecter_signaux, deconnecter_signaux, kpis_periode, recalculer_jour, reconstruire
+)
+
+
+class TestKPIJournalier(TestCase):
+    """Tests de la reconstruction et de la mise à jour incrémentale"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jour = date(2024, 3, 15)
+        cls.patient = Patient.objects.create(
+            nom='Bennani', prenom='Salma', date_naissance=date(1985, 6, 1),
+            sexe='F', telephone='0600000000', adresse='Fès'
+        )
+
+    def setUp(self):
+        connecter_signaux()
+        self.addCleanup(deconnecter_signaux)
+
+    def _a(self, jour, heure=10):
+        return timezone.make_aware(datetime.combine(jour, datetime.min.time()).replace(hour=heure))
+
+    def _consultation_facturee(self, jour, montant='120.00', statut='payee'):
+        consultation = Consultation.objects.create(
+            patient=self.patient, date_consultation=self._a(jour)
+        )
+        Facture.objects.create(
+            consultation=consultation, date_facture=jour, montant_ht=Decimal(montant),
+            montant_tva=Decimal('0'), montant_total=Decimal(montant), statut=statut
+        )
+        return consultation
+
+    def test_reconstruction_complete(self):
+        self._consultation_facturee(self.jour)
+        self._consultation_facturee(self.jour, statut='brouillon')
+        RendezVous.objects.create(patient=self.patient, date_heure=self._a(self.jour), statut='annule')
+        KPIJournalier.objects.all().delete()
+
+        reconstruire()
+
+        ligne = KPIJournalier.objects.get(jour=self.jour)
+        self.assertEqual(ligne.consultations, 2)
+        self.assertEqual(ligne.revenus_ttc, Decimal('120.00'))
+        self.assertEqual(ligne.rdv_annules, 1)
+
+    def test_mise_a_jour_incrementale(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            consultation = self._consultation_facturee(self.jour)
+        self.assertEqual(KPIJournalier.objects.get(jour=self.jour).consultations, 1)
+
+        # Un changement de date met à jour l'ancien et le nouveau jour
+        lendemain = self.jour + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            consultation.date_consultation = self._a(lendemain)
+            consultation.save()
+        self.assertFalse(KPIJournalier.objects.filter(jour=self.jour, consultations__gt=0).exists())
+        self.assertEqual(KPIJournalier.objects.get(jour=lendemain).consultations, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            consultation.delete()
+        self.assertFalse(KPIJournalier.objects.filter(consultations__gt=0).exists())
+
+    def test_recalcul_sur_ligne_existante(self):
+        """Une ligne écrite entre-temps par un autre recalcul est mise à jour, sans erreur d'unicité"""
+        self._consultation_facturee(self.jour)
+        KPIJournalier.objects.update_or_create(jour=self.jour, defaults={'consultations': 99, 'certificats': 3})
+        vide = self.jour + timedelta(days=1)
+        KPIJournalier.objects.update_or_create(jour=vide, defaults={'consultations': 5})
+
+        recalculer_jour(self.jour)
+        recalculer_jour(vide)
+
+        ligne = KPIJournalier.objects.get(jour=self.jour)
+        self.assertEqual((ligne.consultations, ligne.certificats), (1, 0))
+        # Un jour sans activité n'a pas de ligne
+        self.assertFalse(KPIJournalier.objects.filter(jour=vide).exists())
+
+    def test_kpis_periode(self):
+        self._consultation_facturee(self.jour, '100.00')
+        self._consultation_facturee(self.jour + timedelta(days=10), '50.00')
+        reconstruire()
+
+        kpis = kpis_periode(date(2024, 3, 1), date(2024, 4, 1))
+        self.assertEqual(kpis['consultations'], 2)
+        self.assertEqual(kpis['revenus_ttc'], Decimal('150.00'))
+        self.assertEqual(kpis['certificats'], 0)
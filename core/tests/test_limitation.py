@@ -0,0 +1,184 @@
+"""
+Tests de la limitation des requêtes par adresse IP
+"""
+
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.middleware_securite import SecurityMiddleware, adresse_client
+from core.services import limitation
+from core.services.limitation import Decision, LimiteurCache, LimiteurMemoire, LimiteurSqlite
+
+# Début d'une fenêtre de 60 s
+T0 = 1_800_000_000 // 60 * 60
+
+
+class TestFenetreGlissante(SimpleTestCase):
+    """Calcul de la fenêtre glissante, identique pour tous les stockages"""
+
+    def test_limite_dans_la_fenetre(self):
+        limiteur = LimiteurMemoire(limite=3, fenetre=60)
+        decisions = [limiteur.verifier('10.0.0.1', T0 + rang) for rang in range(4)]
+        self.assertEqual([decision.autorise for decision in decisions], [True, True, True, False])
+        self.assertEqual(decisions[0].restant, 2)
+        # Une autre adresse a son propre compte
+        self.assertTrue(limiteur.verifier('10.0.0.2', T0 + 4).autorise)
+
+    def test_part_de_la_fenetre_precedente(self):
+        limiteur = LimiteurMemoire(limite=10, fenetre=60)
+        for _ in range(10):
+            limiteur.verifier('ip', T0 + 50)
+        # Début de la fenêtre suivante : 10 * (1 - 0/60) + 1 > 10
+        self.assertFalse(limiteur.verifier('ip', T0 + 60).autorise)
+        # Aux trois quarts : 10 * 0.25 + 2 <= 10
+        decision = limiteur.verifier('ip', T0 + 105)
+        self.assertTrue(decision.autorise)
+        self.assertEqual(decision.restant, 5)
+        # Deux fenêtres plus tard, tout est oublié
+        self.assertEqual(limiteur.verifier('ip', T0 + 240).restant, 9)
+
+    def test_reessayer_dans(self):
+        limiteur = LimiteurMemoire(limite=10, fenetre=60)
+        for _ in range(10):
+            limiteur.verifier('ip', T0 + 50)
+        decision = limiteur.verifier('ip', T0 + 60)
+        self.assertFalse(decision.autorise)
+        # 10 * (1 - t/60) + 2 <= 10 dès t = 12 s
+        self.assertAlmostEqual(decision.reessayer_dans, 12)
+        self.assertTrue(limiteur.verifier('ip', T0 + 60 + limitation.en_secondes(decision.reessayer_dans)).autorise)
+
+    def test_reessayer_dans_au_dela_de_la_fenetre(self):
+        limiteur = LimiteurMemoire(limite=2, fenetre=60)
+        for _ in range(4):
+            decision = limiteur.verifier('ip', T0 + 30)
+        # 30 s pour finir la fenêtre, puis 4 * (1 - t/60) + 1 <= 2 dès t = 45 s
+        self.assertAlmostEqual(decision.reessayer_dans, 75)
+        self.assertTrue(limiteur.verifier('ip', T0 + 105).autorise)
+        self.assertEqual(limitation.en_secondes(0.2), 1)
+
+    def test_memoire_bornee(self):
+        limiteur = LimiteurMemoire(limite=5, fenetre=60, capacite=100)
+        for rang in range(1000):
+            limiteur.verifier(f'ip{rang}', T0)
+        self.assertEqual(len(limiteur), 100)
+        # Les clés les plus récentes sont gardées
+        self.assertEqual(limiteur.verifier('ip999', T0).restant, 3)
+
+    def test_eviction_des_cles_expirees(self):
+        limiteur = LimiteurMemoire(limite=5, fenetre=60, capacite=1000)
+        for rang in range(50):
+            limiteur.verifier(f'ip{rang}', T0)
+        # Deux fenêtres plus tard, chaque nouvelle clé évince des clés expirées
+        for rang in range(30):
+            limiteur.verifier(f'nouvelle{rang}', T0 + 120)
+        self.assertEqual(len(limiteur), 30)
+
+
+class TestStockagesPartages(SimpleTestCase):
+    """Les compteurs SQLite et cache sont vus par tous les processus"""
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        cache.clear()
+
+    def test_sqlite_partage(self):
+        chemin = os.path.join(self.dossier, 'limites.sqlite3')
+        # Deux instances : deux workers gunicorn
+        premier = LimiteurSqlite(limite=3, fenetre=60, chemin=chemin)
+        second = LimiteurSqlite(limite=3, fenetre=60, chemin=chemin)
+        self.addCleanup(premier.fermer)
+        self.addCleanup(second.fermer)
+
+        self.assertTrue(premier.verifier('ip', T0).autorise)
+        self.assertTrue(second.verifier('ip', T0 + 1).autorise)
+        self.assertTrue(premier.verifier('ip', T0 + 2).autorise)
+        self.assertFalse(second.verifier('ip', T0 + 3).autorise)
+
+        # Même calcul que la mémoire, fenêtre précédente comprise
+        memoire = LimiteurMemoire(limite=3, fenetre=60)
+        for instant in (T0, T0 + 1, T0 + 2, T0 + 3):
+            memoire.verifier('ip', instant)
+        for instant in (T0 + 80, T0 + 100, T0 + 300):
+            self.assertEqual(premier.verifier('ip', instant), memoire.verifier('ip', instant))
+
+    def test_sqlite_purge(self):
+        limiteur = LimiteurSqlite(limite=3, fenetre=60, chemin=os.path.join(self.dossier, 'limites.sqlite3'))
+        self.addCleanup(limiteur.fermer)
+        for rang in range(20):
+            limiteur.verifier(f'ip{rang}', T0)
+        limiteur.verifier('ip0', T0 + 60)
+        connexion = limiteur._connexion(T0 // 60 + 1)
+        self.assertEqual(connexion.execute('SELECT COUNT(*) FROM limitation').fetchone()[0], 20)
+        # Fenêtre suivante : les clés sans requête depuis deux fenêtres sont supprimées
+        limiteur.verifier('ip1', T0 + 120)
+        self.assertEqual(connexion.execute('SELECT cle FROM limitation ORDER BY cle').fetchall(), [('ip0',), ('ip1',)])
+
+    def test_cache(self):
+        premier = LimiteurCache(limite=3, fenetre=60)
+        second = LimiteurCache(limite=3, fenetre=60)
+        decisions = [limiteur.verifier('ip', T0 + rang) for rang, limiteur in enumerate([premier, second] * 2)]
+        self.assertEqual([decision.autorise for decision in decisions], [True, True, True, False])
+        # La fenêtre précédente compte pour sa part restante
+        self.assertEqual(premier.verifier('ip', T0 + 90), Decision(True, 0, 0))
+
+
+class TestSecurityMiddleware(SimpleTestCase):
+    """Réponse 429 et en-tête Retry-After"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    @override_settings(LIMITE_REQUETES=2, LIMITE_FENETRE_S=60, LIMITE_BACKEND='memoire')
+    def test_429(self):
+        middleware = SecurityMiddleware(lambda request: HttpResponse())
+        statuts = [middleware(self.factory.get('/patients/', REMOTE_ADDR='10.0.0.9')).status_code for _ in range(3)]
+        self.assertEqual(statuts, [200, 200, 429])
+
+        response = middleware(self.factory.get('/patients/', REMOTE_ADDR='10.0.0.9'))
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # Fichiers statiques non limités, autres adresses non touchées
+        self.assertEqual(middleware(self.factory.get('/static/app.css', REMOTE_ADDR='10.0.0.9')).status_code, 200)
+        self.assertEqual(middleware(self.factory.get('/patients/', REMOTE_ADDR='10.0.0.10')).status_code, 200)
+
+    @override_settings(LIMITE_REQUETES=1, LIMITE_BACKEND='memoire')
+    async def test_asynchrone(self):
+        async def vue(request):
+            return HttpResponse()
+
+        middleware = SecurityMiddleware(vue)
+        premiere = await middleware(self.factory.get('/api/patients/search/'))
+        seconde = await middleware(self.factory.get('/api/patients/search/'))
+        self.assertEqual((premiere.status_code, seconde.status_code), (200, 429))
+
+    async def test_asynchrone_sqlite(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+
+        async def vue(request):
+            return HttpResponse()
+
+        with self.settings(LIMITE_REQUETES=1, LIMITE_BACKEND='sqlite',
+                           LIMITE_SQLITE=os.path.join(dossier, 'limites.sqlite3')):
+            middleware = SecurityMiddleware(vue)
+        self.assertFalse(middleware.direct)
+        statuts = [(await middleware(self.factory.get('/patients/'))).status_code for _ in range(2)]
+        self.assertEqual(statuts, [200, 429])
+
+    def test_adresse_derriere_proxy(self):
+        requete = self.factory.get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 5.6.7.8')
+        self.assertEqual(adresse_client(requete, 'HTTP_X_FORWARDED_FOR'), '5.6.7.8')
+        self.assertEqual(adresse_client(requete), '10.0.0.1')
+        self.assertEqual(adresse_client(self.factory.get('/', REMOTE_ADDR='10.0.0.1'), 'HTTP_X_FORWARDED_FOR'),
+                         '10.0.0.1')
+
+    @override_settings(LIMITE_ACTIF=False)
+    def test_inactif(self):
+        middleware = SecurityMiddleware(lambda request: HttpResponse())
+        self.assertIsNone(middleware.limiteur)
+        self.assertEqual(middleware(self.factory.get('/')).status_code, 200)
@@ -0,0 +1,186 @@
+"""
+Tests des métriques de performance et de leur exposition
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.middleware_performance import NON_RESOLUE
+from core.services import metriques
+from core.services.metriques import BORNES_MS, Histogramme, Registre, empreinte_sql
+
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware_performance.PerformanceMiddleware',
+]
+
+
+class TestHistogrammes(SimpleTestCase):
+    """Tests des histogrammes et du registre, sans base de données"""
+
+    def test_quantiles(self):
+        histogramme = Histogramme(BORNES_MS)
+        for valeur in [4] * 90 + [40] * 9 + [2500]:
+            histogramme.observer(valeur)
+        p50, p95, p99 = (histogramme.quantile(q) for q in metriques.QUANTILES)
+        self.assertTrue(3 < p50 <= 5)
+        self.assertTrue(30 < p95 <= 50)
+        self.assertTrue(30 < p99 <= 50)
+        self.assertEqual(histogramme.quantile(1), 2500)
+        self.assertIsNone(Histogramme(BORNES_MS).quantile(0.5))
+
+    def test_empreinte(self):
+        self.assertEqual(
+            empreinte_sql('SELECT * FROM "core_patient" WHERE "id" IN (%s, %s, %s) AND nom = \'Ali\' LIMIT 21'),
+            'SELECT * FROM "core_patient" WHERE "id" IN (%s...) AND nom = ? LIMIT ?',
+        )
+        self.assertEqual(empreinte_sql('SELECT "t1"."id" FROM t1'), 'SELECT "t1"."id" FROM t1')
+
+    def test_somme_des_processus(self):
+        premier, second = Registre(), Registre()
+        premier.observer_vue('GET liste', 10, 2, 3)
+        second.observer_vue('GET liste', 200, 150, 40)
+        second.observer_vue('GET recherche', 5)
+        second.observer_requete_lente('SELECT 1 FROM t WHERE id = 4', 150, 'GET liste', 'vue.py:3')
+        premier.observer_requete_lente('SELECT 1 FROM t WHERE id = 9', 120, 'GET liste', 'vue.py:3')
+
+        total = Registre()
+        total.ajouter(Registre.depuis_dict(premier.en_dict()))
+        total.ajouter(Registre.depuis_dict(second.en_dict()))
+        self.assertEqual(total.vues['GET liste']['duree'].nombre, 2)
+        self.assertEqual(total.vues['GET liste']['requetes'].maximum, 40)
+        # Vue asynchrone : durée seule
+        self.assertEqual(total.vues['GET recherche']['sql'].nombre, 0)
+        self.assertEqual([vue for vue, _, _ in total.resume()], ['GET liste', 'GET recherche'])
+        [lente] = total.requetes_lentes()
+        self.assertEqual((lente['nombre'], lente['total_ms'], lente['sql']), (2, 270, 'SELECT ? FROM t WHERE id = ?'))
+
+    def test_requetes_lentes_bornees(self):
+        registre = Registre()
+        for rang in range(metriques.REQUETES_LENTES_MAX + 10):
+            registre.observer_requete_lente(f'SELECT * FROM t{rang}', 100 + rang, 'GET vue', '')
+        self.assertEqual(len(registre.lentes), metriques.REQUETES_LENTES_MAX)
+        self.assertNotIn('SELECT * FROM t0', [lente['sql'] for lente in registre.lentes.values()])
+
+    def test_exposition(self):
+        registre = Registre()
+        registre.observer_vue('GET "liste"', 12, 3, 2)
+        texte = metriques.exposition(registre)
+        self.assertIn('# TYPE erp_vue_duree_secondes histogram', texte)
+        self.assertIn('erp_vue_duree_secondes_bucket{vue="GET \\"liste\\"",le="0.015"} 1', texte)
+        self.assertIn('erp_vue_duree_secondes_bucket{vue="GET \\"liste\\"",le="0.01"} 0', texte)
+        self.assertIn('erp_vue_requetes_sql_sum{vue="GET \\"liste\\""} 2', texte)
+        self.assertIn('erp_vue_sql_secondes_count{vue="GET \\"liste\\""} 1', texte)
+
+    def test_exposition_requetes_lentes(self):
+        registre = Registre()
+        registre.observer_requete_lente('SELECT 1 FROM a', 100, 'GET liste', 'vue.py:3')
+        registre.observer_requete_lente('SELECT 1 FROM b', 200, 'GET autre', 'vue.py:9')
+        lignes = metriques.exposition(registre).splitlines()
+        debut = lignes.index('# TYPE erp_requete_lente_total counter')
+        # Une famille après l'autre, étiquetées par l'empreinte seule
+        self.assertEqual([ligne.split('{')[0] for ligne in lignes[debut:]], [
+            '# TYPE erp_requete_lente_total counter', 'erp_requete_lente_total', 'erp_requete_lente_total',
+            '# TYPE erp_requete_lente_secondes_total counter', 'erp_requete_lente_secondes_total',
+            'erp_requete_lente_secondes_total',
+        ])
+        self.assertTrue(all(ligne.endswith(('"} 1', '"} 0.1', '"} 0.2'))
+                            and '{empreinte="' in ligne for ligne in lignes[debut:] if not ligne.startswith('#')))
+
+
+@skipIf(metriques.fcntl is None, "cumul des processus terminés réservé à POSIX")
+class TestCumul(SimpleTestCase):
+    """Les mesures d'un worker recyclé restent dans les totaux"""
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        reglages = override_settings(PERF_DOSSIER=self.dossier)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def test_processus_termine(self):
+        processus = subprocess.Popen([sys.executable, '-c', ''])
+        processus.wait()
+        ancien = Registre()
+        ancien.observer_vue('GET liste', 10, 2, 3)
+        metriques._ecrire(os.path.join(self.dossier, f'{processus.pid}-1.json'), ancien)
+        vivant = Registre()
+        vivant.observer_vue('GET liste', 20, 2, 3)
+        metriques.enregistrer(vivant)
+
+        for _ in range(2):
+            total = metriques.charger(inclure_courant=False)
+            self.assertEqual(total.vues['GET liste']['duree'].nombre, 2)
+        self.assertEqual(
+            sorted(nom for nom in os.listdir(self.dossier) if nom.endswith('.json')),
+            sorted([metriques.CUMUL, metriques._nom_instantane()]),
+        )
+
+
+class TestMiddleware(TestCase):
+    """Tests du middleware et du point /metrics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = get_user_model().objects.create_user('medecin', password='medecin')
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        reglages = override_settings(
+            PERF_DOSSIER=self.dossier, PERF_SEUIL_SQL_MS=0, PERF_ECRITURE_S=0, MIDDLEWARE=MIDDLEWARE
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        metriques.registre = Registre()
+        self.client.force_login(self.utilisateur)
+
+    @override_settings(ROOT_URLCONF='core.urls_alertes')
+    def test_mesure_par_vue(self):
+        cache.clear()
+        for _ in range(3):
+            self.client.get('/alertes/compteurs/')
+        self.client.get('/inexistante/')
+
+        histogrammes = metriques.registre.vues['GET api_alertes_compteurs']
+        self.assertEqual(histogrammes['duree'].nombre, 3)
+        self.assertGreater(histogrammes['requetes'].somme, 0)
+        self.assertIn(f'GET {NON_RESOLUE}', metriques.registre.vues)
+
+        # Seuil à 0 : toutes les requêtes sont relevées, avec la ligne applicative d'origine
+        origines = [lente['origine'] for lente in metriques.registre.requetes_lentes()]
+        self.assertTrue(any('flux_alertes.py' in origine for origine in origines), origines)
+
+        # Instantané écrit à chaque requête (PERF_ECRITURE_S=0), lu par manage_erp.py perf
+        total = metriques.charger(inclure_courant=False)
+        self.assertEqual(total.vues['GET api_alertes_compteurs']['duree'].nombre, 3)
+
+    @override_settings(ROOT_URLCONF='core.urls_recherche')
+    async def test_vue_asynchrone(self):
+        await self.async_client.aforce_login(self.utilisateur)
+        reponse = await self.async_client.get('/patients/search/', {'q': 'ben'})
+        self.assertEqual(reponse.status_code, 200)
+        histogrammes = metriques.registre.vues['GET api_patients_search']
+        self.assertEqual((histogrammes['duree'].nombre, histogrammes['requetes'].nombre), (1, 0))
+
+    @override_settings(ROOT_URLCONF='core.urls_metriques')
+    def test_point_metrics(self):
+        self.client.get('/metrics')
+        reponse = self.client.get('/metrics')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('erp_vue_duree_secondes_count{vue="GET metrics"} 1', reponse.content.decode())
+
+        vues = self.client.get('/metrics', {'format': 'json'}).json()['vues']
+        self.assertEqual(sum(vues['GET metrics']['duree']['comptes']), 2)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 403)
@@ -0,0 +1,79 @@
+"""
+Tests de la détection des requêtes répétées et des querysets de liste
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from core.middleware_requetes import (
+    DetecteurRequetesRepeteesMiddleware, RequetesRepeteesError, forme_sql
+)
+from core.models import Consultation, Facture, Patient, RendezVous
+from core.services import listes
+
+
+def _vue_n_plus_1(request):
+    return HttpResponse(', '.join(str(rdv.patient) for rdv in RendezVous.objects.all()))
+
+
+def _vue_jointure(request):
+    return HttpResponse(', '.join(str(rdv.patient) for rdv in listes.rendez_vous()))
+
+
+class TestDetecteurRequetesRepetees(TestCase):
+    """Tests du middleware et des querysets de liste"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for numero in range(6):
+            patient = Patient.objects.create(
+                nom=f'Patient{numero}', prenom='Test', date_naissance=date(1980, 1, 1),
+                sexe='F', telephone='0600000000', adresse='Casablanca'
+            )
+            rdv = RendezVous.objects.create(
+                patient=patient, date_heure=timezone.make_aware(datetime(2024, 3, 1, 9 + numero)), statut='termine'
+            )
+            consultation = Consultation.objects.create(
+                patient=patient, rendez_vous=rdv, date_consultation=rdv.date_heure
+            )
+            Facture.objects.create(
+                consultation=consultation, date_facture=date(2024, 3, 1), montant_ht=Decimal('100.00'),
+                montant_tva=Decimal('20.00'), montant_total=Decimal('120.00'), statut='payee'
+            )
+
+    def _appeler(self, vue):
+        return DetecteurRequetesRepeteesMiddleware(vue)(RequestFactory().get('/rdv/'))
+
+    def test_forme_regroupe_les_listes_in(self):
+        self.assertEqual(
+            forme_sql('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            forme_sql('SELECT * FROM t WHERE id IN (%s, %s)'),
+        )
+
+    @override_settings(NPLUS1_DETECTION=True, NPLUS1_LEVER=True)
+    def test_n_plus_1_leve(self):
+        with self.assertRaises(RequetesRepeteesError) as erreur:
+            self._appeler(_vue_n_plus_1)
+        self.assertIn('6 x', str(erreur.exception))
+        self.assertIn('test_middleware_requetes.py', str(erreur.exception))
+
+    @override_settings(NPLUS1_DETECTION=True)
+    def test_n_plus_1_journalise(self):
+        with self.assertLogs('core.nplus1', 'WARNING'):
+            self._appeler(_vue_n_plus_1)
+
+    @override_settings(NPLUS1_DETECTION=True, NPLUS1_LEVER=True)
+    def test_jointure_acceptee(self):
+        self.assertEqual(self._appeler(_vue_jointure).status_code, 200)
+
+    def test_listes_en_une_requete(self):
+        with self.assertNumQueries(1):
+            [str(facture.consultation.patient) for facture in listes.factures()]
+        with self.assertNumQueries(1):
+            [(str(c.patient), c.prix_consultation) for c in listes.consultations()]
+        with self.assertNumQueries(1):
+            [(str(rdv.patient), rdv.statut) for rdv in listes.rendez_vous()]
@@ -0,0 +1,94 @@
+"""
+Tests de la pagination par clé
+"""
+
+from datetime import date, datetime, timedelta
+
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Patient, RendezVous
+from core.services.pagination import CurseurInvalide, paginer
+
+
+class TestPagination(TestCase):
+    """Tests du parcours avant / arrière et des curseurs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        noms = ['Alaoui', 'Bennani', 'Alaoui', 'Tazi', 'Bennani', 'Chraibi', 'Alaoui']
+        cls.patients = [
+            Patient.objects.create(
+                nom=nom, prenom=['Omar', 'Salma'][rang % 2], date_naissance=date(1980, 1, 1),
+                sexe='M', telephone='0600000000', adresse='Rabat'
+            )
+            for rang, nom in enumerate(noms)
+        ]
+        debut = timezone.make_aware(datetime(2024, 3, 1, 9))
+        # Deux RDV par créneau : l'id départage les dates égales
+        for rang in range(11):
+            RendezVous.objects.create(
+                patient=cls.patients[rang % 7], date_heure=debut + timedelta(minutes=30 * (rang // 2))
+            )
+
+    def _parcourir(self, queryset, taille):
+        pages, curseur = [], None
+        while True:
+            page = paginer(queryset, curseur, taille)
+            pages.append(page)
+            if not page.a_suivant:
+                return pages
+            curseur = page.curseur_suivant
+
+    def test_parcours_complet_rdv(self):
+        attendu = list(RendezVous.objects.order_by('-date_heure', '-id'))
+        pages = self._parcourir(RendezVous.objects.all(), 3)
+
+        self.assertEqual([rdv for page in pages for rdv in page.elements], attendu)
+        self.assertEqual(len(pages), 4)
+        self.assertFalse(pages[0].a_precedent)
+
+    def test_parcours_complet_patients(self):
+        attendu = list(Patient.objects.order_by('nom', 'prenom', 'id'))
+        pages = self._parcourir(Patient.objects.all(), 2)
+        self.assertEqual([patient for page in pages for patient in page.elements], attendu)
+
+    def test_retour_en_arriere(self):
+        pages = self._parcourir(RendezVous.objects.all(), 3)
+        retour = paginer(RendezVous.objects.all(), pages[2].curseur_precedent, 3)
+
+        self.assertEqual(retour.elements, pages[1].elements)
+        self.assertTrue(retour.a_precedent)
+        self.assertTrue(retour.a_suivant)
+
+        premiere = paginer(RendezVous.objects.all(), retour.curseur_precedent, 3)
+        self.assertEqual(premiere.elements, pages[0].elements)
+        self.assertFalse(premiere.a_precedent)
+
+    def test_sans_offset(self):
+        pages = self._parcourir(RendezVous.objects.all(), 3)
+        with CaptureQueriesContext(connection) as requetes:
+            paginer(RendezVous.objects.all(), pages[-2].curseur_suivant, 3)
+        self.assertEqual(len(requetes), 1)
+        self.assertNotIn('OFFSET', requetes[0]['sql'].upper())
+
+    def test_curseur_invalide(self):
+        page = paginer(Patient.objects.all(), taille=2)
+        with self.assertRaises(CurseurInvalide):
+            paginer(RendezVous.objects.all(), page.curseur_suivant)
+        with self.assertRaises(CurseurInvalide):
+            paginer(Patient.objects.all(), page.curseur_suivant[:-2] + 'xx')
+
+    def test_liens_et_api(self):
+        page = paginer(Patient.objects.all(), taille=2)
+        requete = RequestFactory().get('/patients/', {'q': 'ala'})
+
+        liens = page.liens(requete)
+        self.assertTrue(liens['suivant'].startswith('/patients/?q=ala&curseur='))
+        self.assertIsNone(liens['precedent'])
+
+        donnees = page.pour_api(lambda patient: patient.pk)
+        self.assertEqual(len(donnees['results']), 2)
+        self.assertEqual(donnees['next'], page.curseur_suivant)
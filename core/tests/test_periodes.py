@@ -0,0 +1,95 @@
+"""
+Tests des bornes de périodes et des filtres de statistiques
+"""
+
+from datetime import date, datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Consultation, Facture, Patient, RendezVous
+from core.services.periodes import (
+    bornes_mois, bornes_periode, filtre_periode
+)
+
+
+FONCTIONS_SQL_INTERDITES = ['strftime', 'django_date_extract', 'django_datetime_cast_date', 'EXTRACT']
+
+
+class TestBornesPeriodes(TestCase):
+    """Tests des intervalles semi-ouverts"""
+
+    def test_bornes_mois_decembre(self):
+        self.assertEqual(bornes_mois(2024, 12), (date(2024, 12, 1), date(2025, 1, 1)))
+
+    def test_bornes_trimestre(self):
+        self.assertEqual(
+            bornes_periode('trimestre', date(2024, 5, 17)),
+            (date(2024, 4, 1), date(2024, 7, 1))
+        )
+
+    def test_bornes_semaine_commence_lundi(self):
+        debut, fin = bornes_periode('semaine', date(2024, 5, 17))
+        self.assertEqual(debut, date(2024, 5, 13))
+        self.assertEqual(fin, date(2024, 5, 20))
+
+    def test_periode_inconnue(self):
+        with self.assertRaises(ValueError):
+            bornes_periode('decennie')
+
+    def test_datetime_converti_en_minuit_local(self):
+        filtre = filtre_periode(RendezVous, 'date_heure', date(2024, 5, 1), date(2024, 6, 1))
+        bornes = dict(filtre.children)
+        self.assertIsInstance(bornes['date_heure__gte'], datetime)
+        self.assertIsNotNone(bornes['date_heure__gte'].tzinfo)
+
+
+class TestRequetesSargables(TestCase):
+    """Le SQL généré doit porter sur la colonne brute, sans fonction de date"""
+
+    def assertSansFonctionDate(self, queryset):
+        sql = str(queryset.query)
+        for fonction in FONCTIONS_SQL_INTERDITES:
+            self.assertNotIn(fonction, sql)
+
+    def test_revenus_du_mois(self):
+        queryset = Facture.objects.filter(
+            filtre_periode(Facture, 'date_facture', *bornes_mois(2024, 3)),
+            statut='payee'
+        )
+        self.assertSansFonctionDate(queryset)
+
+    def test_rdv_du_mois(self):
+        queryset = RendezVous.objects.filter(
+            filtre_periode(RendezVous, 'date_heure', *bornes_periode('mois'))
+        )
+        self.assertSansFonctionDate(queryset)
+
+    def test_consultations_du_jour(self):
+        queryset = Consultation.objects.filter(
+            filtre_periode(Consultation, 'date_consultation', *bornes_periode('jour'))
+        )
+        self.assertSansFonctionDate(queryset)
+
+    def test_requetes_critiques_manage_erp(self):
+        from manage_erp import requetes_critiques
+        for label, queryset in requetes_critiques():
+            with self.subTest(requete=label):
+                self.assertSansFonctionDate(queryset)
+
+    def test_fin_exclue(self):
+        patient = Patient.objects.create(
+            nom='Test', prenom='Periode', date_naissance=date(1980, 1, 1),
+            sexe='M', telephone='0600000000', adresse='Casablanca'
+        )
+        consultation = Consultation.objects.create(
+            patient=patient,
+            date_consultation=timezone.make_aware(datetime(2024, 3, 31, 10, 0))
+        )
+        for jour in (date(2024, 3, 31), date(2024, 4, 1)):
+            Facture.objects.create(
+                consultation=consultation, date_facture=jour,
+                montant_total=100, statut='payee'
+            )
+        mars = Facture.objects.filter(filtre_periode(Facture, 'date_facture', *bornes_mois(2024, 3)))
+        self.assertEqual(list(mars.values_list('date_facture', flat=True)), [date(2024, 3, 31)])
@@ -0,0 +1,82 @@
+"""
+Tests de la recherche de patients par index plein texte
+"""
+
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase
+
+from core.models import Patient
+from core.services import recherche_patients
+from core.services.recherche_patients import rechercher
+
+
+class TestRecherchePatients(TestCase):
+    """Tests des préfixes, des accents, du classement et de la synchronisation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        def patient(nom, prenom, telephone='0600000000', cin=''):
+            return Patient.objects.create(
+                nom=nom, prenom=prenom, date_naissance=date(1980, 1, 1), sexe='F',
+                telephone=telephone, cin=cin, adresse='Casablanca'
+            )
+
+        cls.helene = patient('Bennani', 'Hélène', '0612345678', 'BE123456')
+        cls.benali = patient('Benali', 'Omar')
+        cls.prenom_ben = patient('Tazi', 'Benjamin')
+        cls.chraibi = patient('Chraïbi', 'Zineb')
+
+    def _noms(self, q):
+        return [(p['nom'], p['prenom']) for p in rechercher(q)]
+
+    def test_sans_accents_dans_les_deux_sens(self):
+        self.assertEqual(self._noms('helene'), [('Bennani', 'Hélène')])
+        self.assertEqual(self._noms('HÉL'), [('Bennani', 'Hélène')])
+        self.assertEqual(self._noms('chraib'), [('Chraïbi', 'Zineb')])
+
+    def test_prefixes_combines(self):
+        self.assertEqual(self._noms('ben hel'), [('Bennani', 'Hélène')])
+        self.assertEqual(self._noms('0612'), [('Bennani', 'Hélène')])
+        self.assertEqual(self._noms('be1234'), [('Bennani', 'Hélène')])
+
+    def test_nom_avant_prenom(self):
+        resultats = self._noms('ben')
+        self.assertEqual(len(resultats), 3)
+        self.assertEqual(resultats[-1], ('Tazi', 'Benjamin'))
+
+    def test_candidats_classes_avant_limite(self):
+        """Plus de correspondances que de candidats : les meilleures sont gardées, pas les premières lues"""
+        for rang in range(10):
+            Patient.objects.create(
+                nom=f'Alami {rang}', prenom='Benoît', date_naissance=date(1980, 1, 1), sexe='M',
+                telephone='0600000000', adresse='Casablanca'
+            )
+        # Le meilleur nom correspondant est lu en dernier
+        self.benali.delete()
+        Patient.objects.create(
+            nom='Benali', prenom='Omar', date_naissance=date(1980, 1, 1), sexe='M',
+            telephone='0600000000', adresse='Casablanca'
+        )
+        with mock.patch.object(recherche_patients, 'CANDIDATS', 3):
+            resultats = self._noms('ben')
+        self.assertEqual(resultats, [('Benali', 'Omar'), ('Bennani', 'Hélène')] + resultats[2:])
+
+    def test_synchronisation(self):
+        self.benali.nom = 'Kettani'
+        self.benali.save()
+        self.assertEqual(self._noms('kett'), [('Kettani', 'Omar')])
+        self.assertNotIn(('Benali', 'Omar'), self._noms('benal'))
+
+        self.chraibi.delete()
+        self.assertEqual(self._noms('zineb'), [])
+
+    def test_saisies_vides_ou_speciales(self):
+        self.assertEqual(rechercher(''), [])
+        self.assertEqual(rechercher('  -* '), [])
+        self.assertEqual(self._noms('"ben" OR NEAR(*'), [])
+        self.assertEqual(self._noms('hel*'), [('Bennani', 'Hélène')])
+
+    def test_types_des_colonnes(self):
+        self.assertEqual(rechercher('helene')[0]['date_naissance'], date(1980, 1, 1))
@@ -0,0 +1,122 @@
+"""
+Tests des occurrences de rendez-vous récurrents
+"""
+
+from datetime import date, time
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.models import Patient, RendezVous
+from core.models_certificates import RendezVousRecurrent
+from core.services import recurrences
+from core.services.recurrences import Regle, dates
+
+
+class TestDates(SimpleTestCase):
+    """Tests du calcul des dates, sans base de données"""
+
+    def test_hebdomadaire(self):
+        # 7 mars 2024 : un jeudi ; jour_semaine 1 : le lundi suivant
+        regle = Regle('hebdomadaire', 1, date(2024, 3, 7), None, None)
+        self.assertEqual(
+            list(dates(regle, date(2024, 3, 1), date(2024, 3, 31))),
+            [date(2024, 3, 11), date(2024, 3, 18), date(2024, 3, 25)],
+        )
+
+    def test_mensuel_fin_de_mois(self):
+        regle = Regle('mensuel', None, date(2024, 1, 31), None, None)
+        self.assertEqual(
+            list(dates(regle, date(2024, 1, 1), date(2024, 4, 30))),
+            [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)],
+        )
+
+    def test_trimestriel_et_date_fin(self):
+        regle = Regle('trimestriel', None, date(2024, 1, 15), date(2024, 12, 31), None)
+        self.assertEqual(
+            list(dates(regle, date(2023, 1, 1), date(2030, 1, 1))),
+            [date(2024, 1, 15), date(2024, 4, 15), date(2024, 7, 15), date(2024, 10, 15)],
+        )
+
+    def test_nombre_occurrences_compte_depuis_le_debut(self):
+        """Le rang des occurrences est compté depuis date_debut, pas depuis la fenêtre"""
+        regle = Regle('hebdomadaire', None, date(2024, 1, 1), None, 10)
+        self.assertEqual(list(dates(regle, date(2024, 3, 1), date(2024, 3, 31))), [date(2024, 3, 4)])
+        self.assertEqual(list(dates(regle, date(2024, 3, 5), date(2024, 3, 31))), [])
+
+    def test_fenetre_lointaine(self):
+        """Une fenêtre à dix ans du début ne parcourt pas les occurrences précédentes"""
+        regle = Regle('hebdomadaire', 3, date(2014, 1, 1), None, None)
+        recurrences._dates_mois.cache_clear()
+        self.assertEqual(len(list(dates(regle, date(2024, 5, 1), date(2024, 5, 31)))), 5)
+        self.assertEqual(recurrences._dates_mois.cache_info().currsize, 1)
+
+    def test_cache_par_regle(self):
+        regle = Regle('mensuel', None, date(2024, 1, 10), None, None)
+        recurrences._dates_mois.cache_clear()
+        list(dates(regle, date(2024, 1, 1), date(2024, 6, 30)))
+        list(dates(regle, date(2024, 1, 1), date(2024, 6, 30)))
+        self.assertEqual(recurrences._dates_mois.cache_info().hits, 6)
+
+        # Règle modifiée : nouvelles dates, sans invalidation explicite
+        modifiee = regle._replace(date_debut=date(2024, 1, 20))
+        self.assertEqual(next(dates(modifiee, date(2024, 1, 1), date(2024, 6, 30))), date(2024, 1, 20))
+
+    def test_frequence_inconnue(self):
+        regle = Regle('annuel', None, date(2024, 1, 1), None, None)
+        with self.assertLogs('core.services.recurrences', 'WARNING'):
+            self.assertEqual(list(dates(regle, date(2024, 1, 1), date(2024, 12, 31))), [])
+
+
+class TestMaterialisation(TestCase):
+    """Tests de la création des rendez-vous et du calendrier"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            nom='Bennani', prenom='Salma', date_naissance=date(1985, 6, 12), sexe='F',
+            telephone='0600000000', adresse='Rabat'
+        )
+        cls.hebdomadaire = RendezVousRecurrent.objects.create(
+            patient=cls.patient, motif='Suivi hypertension', frequence='hebdomadaire', jour_semaine=1,
+            heure=time(10, 30, 23, 579816), date_debut=date(2024, 3, 1), date_fin=date(2024, 12, 31),
+            est_active=True,
+        )
+        cls.mensuelle = RendezVousRecurrent.objects.create(
+            patient=cls.patient, motif='Contrôle diabète', frequence='mensuel',
+            heure=time(9), date_debut=date(2024, 1, 15), est_active=True,
+        )
+        RendezVousRecurrent.objects.create(
+            patient=cls.patient, motif='Arrêtée', frequence='hebdomadaire', jour_semaine=2,
+            heure=time(9), date_debut=date(2024, 1, 1), est_active=False,
+        )
+
+    def test_idempotent(self):
+        debut, fin = date(2024, 3, 1), date(2024, 3, 31)
+        # 4 lundis + le 15 mars
+        self.assertEqual(recurrences.materialiser(debut, fin, taille_lot=2), 5)
+        self.assertEqual(recurrences.materialiser(debut, fin), 0)
+
+        premier = RendezVous.objects.order_by('date_heure').first()
+        self.assertEqual(timezone.localtime(premier.date_heure).strftime('%Y-%m-%d %H:%M:%S'), '2024-03-04 10:30:00')
+        self.assertEqual(premier.remarque, 'Suivi hypertension')
+
+        # Un rendez-vous annulé n'est pas recréé
+        RendezVous.objects.filter(pk=premier.pk).update(statut='annule')
+        self.assertEqual(recurrences.materialiser(debut, fin), 0)
+
+    def test_requetes_constantes(self):
+        with self.assertNumQueries(2):
+            recurrences.calendrier(date(2024, 1, 1), date(2024, 12, 31))
+        # Transaction (2), séries, existants, puis un INSERT par lot
+        with self.assertNumQueries(2 + 2 + 1):
+            self.assertGreater(recurrences.materialiser(date(2024, 1, 1), date(2024, 12, 31), taille_lot=1000), 40)
+
+    def test_calendrier_sans_les_materialises(self):
+        recurrences.materialiser(date(2024, 3, 1), date(2024, 3, 10))
+        jours = recurrences.calendrier(date(2024, 3, 1), date(2024, 3, 31))
+        self.assertNotIn(date(2024, 3, 4), jours)
+        self.assertEqual(
+            sorted(jours), [date(2024, 3, 11), date(2024, 3, 15), date(2024, 3, 18), date(2024, 3, 25)]
+        )
+        self.assertEqual(jours[date(2024, 3, 15)][0][1].motif, 'Contrôle diabète')
@@ -0,0 +1,167 @@
+"""
+Tests de la sauvegarde en ligne
+"""
+
+import gzip
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import date
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.models import Patient
+from core.services import sauvegarde
+
+
+class TestSauvegardeSqlite(SimpleTestCase):
+    """Copie par VACUUM INTO d'une base SQLite"""
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        self.base = os.path.join(self.dossier, 'cabinet.sqlite3')
+        connexion = sqlite3.connect(self.base)
+        connexion.execute('PRAGMA journal_mode=WAL')
+        connexion.execute(
+            'CREATE TABLE patient (id INTEGER PRIMARY KEY, nom TEXT, '
+            "recherche TEXT GENERATED ALWAYS AS (lower(nom)) STORED)"
+        )
+        connexion.executemany('INSERT INTO patient (nom) VALUES (?)', [(f'Patient {rang}',) for rang in range(500)])
+        connexion.commit()
+        connexion.close()
+
+    def _restaurer(self, fichier):
+        restauree = os.path.join(self.dossier, 'restauree.sqlite3')
+        with gzip.open(fichier, 'rb') as entree, open(restauree, 'wb') as sortie:
+            shutil.copyfileobj(entree, sortie)
+        connexion = sqlite3.connect(restauree)
+        self.addCleanup(connexion.close)
+        return connexion
+
+    def test_copie_coherente_pendant_une_transaction(self):
+        # Un autre processus écrit sans avoir validé : la copie ne contient que l'état validé
+        ecrivain = sqlite3.connect(self.base)
+        self.addCleanup(ecrivain.close)
+        ecrivain.execute('BEGIN')
+        ecrivain.execute("INSERT INTO patient (nom) VALUES ('non validé')")
+
+        fichier, octets = sauvegarde._sauvegarder_sqlite(self.dossier, self.base)
+        ecrivain.rollback()
+
+        self.assertTrue(fichier.endswith('.sqlite3.gz'))
+        self.assertGreater(octets, 0)
+        self.assertFalse([nom for nom in os.listdir(self.dossier) if nom.endswith('.tmp')])
+        restauree = self._restaurer(fichier)
+        self.assertEqual(restauree.execute('SELECT COUNT(*), MAX(id) FROM patient').fetchone(), (500, 500))
+        self.assertEqual(restauree.execute('PRAGMA integrity_check').fetchone(), ('ok',))
+
+    def test_colonne_generee(self):
+        fichier, _ = sauvegarde._sauvegarder_sqlite(self.dossier, self.base)
+        restauree = self._restaurer(fichier)
+        self.assertEqual(restauree.execute('SELECT recherche FROM patient WHERE id = 7').fetchone(), ('patient 6',))
+        # Toujours générée après restauration
+        restauree.execute("UPDATE patient SET nom = 'ALAOUI' WHERE id = 7")
+        self.assertEqual(restauree.execute('SELECT recherche FROM patient WHERE id = 7').fetchone(), ('alaoui',))
+
+    def test_setval(self):
+        sql = sauvegarde._setval('core_patient', {'name': 'core_patient_id_seq', 'table': 'core_patient', 'column': 'id'})
+        self.assertEqual(
+            sql,
+            "SELECT pg_catalog.setval(pg_get_serial_sequence('\"core_patient\"', 'id'), "
+            'COALESCE((SELECT MAX("id") FROM "core_patient"), 1), (SELECT MAX("id") FROM "core_patient") IS NOT NULL);\n',
+        )
+
+
+def _rejouer(script):
+    """Rejoue le script comme psql : TRUNCATE, blocs COPY, setval"""
+    with connection.cursor() as cursor:
+        cursor.execute(script.split('\n', 1)[0])
+        for entete, donnees, setval in _blocs_copy(script).values():
+            cursor.cursor.copy_expert(entete, io.StringIO(donnees))
+            for sql in setval:
+                cursor.execute(sql)
+
+
+def _blocs_copy(script):
+    """Blocs COPY du script de sauvegarde : {table: (en-tête, données, lignes setval)}"""
+    blocs = {}
+    lignes = iter(script.splitlines(keepends=True))
+    for ligne in lignes:
+        if not ligne.startswith('COPY '):
+            continue
+        table = ligne.split()[1].strip('"')
+        donnees = []
+        for donnee in lignes:
+            if donnee == '\\.\n':
+                break
+            donnees.append(donnee)
+        setval = []
+        for suite in lignes:
+            if not suite.strip():
+                break
+            setval.append(suite)
+        blocs[table] = (ligne.strip().rstrip(';'), ''.join(donnees), setval)
+    return blocs
+
+
+@skipUnless(connection.vendor == 'postgresql', "Sauvegarde par COPY propre à PostgreSQL")
+class TestSauvegardePostgresql(TransactionTestCase):
+    """Aller-retour de core_patient, dont la colonne recherche est générée"""
+
+    def test_aller_retour_colonne_generee(self):
+        for rang in range(3):
+            Patient.objects.create(
+                nom=f'Alaoui {rang}', prenom='Karim', date_naissance=date(1980, 1, 1),
+                sexe='M', telephone=f'06000000{rang:02d}', adresse='Rabat',
+            )
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+
+        rapport = sauvegarde.sauvegarder(dossier)
+        with gzip.open(rapport['fichier'], 'rt', encoding='utf-8') as f:
+            entete, donnees, setval = _blocs_copy(f.read())['core_patient']
+        self.assertNotIn('recherche', entete)
+
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE core_patient RESTART IDENTITY CASCADE')
+            cursor.cursor.copy_expert(entete, io.StringIO(donnees))
+            for sql in setval:
+                cursor.execute(sql)
+            cursor.execute("SELECT COUNT(*) FROM core_patient WHERE recherche @@ to_tsquery('simple', 'alaoui')")
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+    def test_restauration_apres_migrate(self):
+        """La base de test est migrée : contenttypes, permissions et migrations sont déjà là"""
+        Patient.objects.create(
+            nom='Bennani', prenom='Salma', date_naissance=date(1985, 6, 12),
+            sexe='F', telephone='0600000000', adresse='Rabat',
+        )
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_content_type')
+            types = cursor.fetchone()[0]
+
+        rapport = sauvegarde.sauvegarder(dossier)
+        with gzip.open(rapport['fichier'], 'rt', encoding='utf-8') as f:
+            script = f.read()
+        self.assertTrue(script.startswith('TRUNCATE '))
+        with transaction.atomic():
+            _rejouer(script)
+
+        self.assertEqual(Patient.objects.get().nom, 'Bennani')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_content_type')
+            self.assertEqual(cursor.fetchone()[0], types)
+
+        # La séquence reprend après le plus grand identifiant restauré
+        nouveau = Patient.objects.create(
+            nom='Tazi', prenom='Omar', date_naissance=date(1970, 1, 1),
+            sexe='M', telephone='0600000099', adresse='Fès',
+        )
+        self.assertGreater(nouveau.pk, 3)
@@ -0,0 +1,173 @@
+"""
+Tests du rendu PDF en tâche de fond et de son cache
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from unittest import mock
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core.models import Patient
+from core.models_certificates import CertificatMedical
+from core.models_config import CabinetConfig
+from core.services import rendu_pdf, travaux_pdf
+
+
+class TestTravauxPdf(TestCase):
+    """Tests de la clé de contenu, du pool de rendu et des vues"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            nom='Bennani', prenom='Salma', date_naissance=date(1985, 6, 12), sexe='F',
+            telephone='0600000000', adresse='Rabat'
+        )
+        cls.certificat = CertificatMedical.objects.create(
+            numero_certificat='CERT-0001', type_certificat='arret_travail', patient=cls.patient,
+            date_emission=date(2024, 3, 4), date_debut=date(2024, 3, 4), date_fin=date(2024, 3, 8),
+            duree_jours=5, diagnostic='Grippe saisonnière', description='Repos strict <à domicile>',
+        )
+        cls.utilisateur = get_user_model().objects.create_user('medecin', password='medecin')
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        reglages = override_settings(PDF_CACHE_DIR=self.dossier, PDF_WORKERS=1)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        travaux_pdf._travaux.clear()
+        travaux_pdf.invalider_cabinet()
+
+    def test_cle_suit_le_contenu(self):
+        """La clé change avec le certificat, le patient et l'en-tête du cabinet"""
+        cle = travaux_pdf.cle_contenu('certificat', travaux_pdf.donnees('certificat', self.certificat.pk))
+        self.assertEqual(
+            cle, travaux_pdf.cle_contenu('certificat', travaux_pdf.donnees('certificat', self.certificat.pk))
+        )
+
+        self.certificat.diagnostic = 'Angine'
+        self.certificat.save()
+        cle_modifiee = travaux_pdf.cle_contenu('certificat', travaux_pdf.donnees('certificat', self.certificat.pk))
+        self.assertNotEqual(cle, cle_modifiee)
+
+        config = CabinetConfig.get_config()
+        config.nom_medecin = 'Dr. Alaoui'
+        config.save()
+        travaux_pdf.invalider_cabinet()
+        self.assertNotEqual(
+            cle_modifiee,
+            travaux_pdf.cle_contenu('certificat', travaux_pdf.donnees('certificat', self.certificat.pk)),
+        )
+
+    def test_ville_de_l_adresse(self):
+        self.assertEqual(travaux_pdf._ville('123 Avenue Mohammed V, Casablanca, Maroc'), 'Casablanca')
+        self.assertEqual(travaux_pdf._ville('Rabat'), 'Rabat')
+        self.assertEqual(travaux_pdf._ville(''), '')
+
+    def test_rendu_certificat(self):
+        contenu = rendu_pdf.rendre('certificat', travaux_pdf.donnees('certificat', self.certificat.pk))
+        self.assertTrue(contenu.startswith(b'%PDF'))
+
+    def test_rendu_plusieurs_pages(self):
+        valeurs = travaux_pdf.donnees('certificat', self.certificat.pk)
+        valeurs['description'] = '\n'.join(f'Ligne {rang}' for rang in range(200))
+        self.assertTrue(rendu_pdf.rendre('certificat', valeurs).startswith(b'%PDF'))
+
+    def test_gabarit_par_en_tete(self):
+        """Le gabarit est construit une fois par en-tête, et renouvelé quand l'en-tête change"""
+        cabinet = travaux_pdf.donnees_cabinet()
+        gabarit = rendu_pdf.gabarit('certificat', cabinet)
+        self.assertIs(rendu_pdf.gabarit('certificat', dict(cabinet)), gabarit)
+        self.assertIsNot(rendu_pdf.gabarit('ordonnance', cabinet), gabarit)
+        self.assertIsNot(rendu_pdf.gabarit('certificat', {**cabinet, 'nom_medecin': 'Dr. Alaoui'}), gabarit)
+
+    def test_logo(self):
+        chemin = f'{self.dossier}/logo.png'
+        Image.new('RGBA', (60, 30), (20, 60, 140, 128)).save(chemin)
+        with override_settings(PDF_LOGO=chemin):
+            travaux_pdf.invalider_cabinet()
+            valeurs = travaux_pdf.donnees('certificat', self.certificat.pk)
+        self.assertTrue(rendu_pdf.rendre('certificat', valeurs).startswith(b'%PDF'))
+
+    def test_en_tete_en_cache(self):
+        """CabinetConfig n'est relu qu'après une modification"""
+        travaux_pdf.connecter_signaux()
+        self.assertEqual(travaux_pdf.donnees_cabinet()['nom_medecin'], CabinetConfig.get_config().nom_medecin)
+        with self.assertNumQueries(0):
+            travaux_pdf.donnees_cabinet()
+
+        config = CabinetConfig.get_config()
+        config.nom_medecin = 'Dr. Alaoui'
+        config.save()
+        self.assertEqual(travaux_pdf.donnees_cabinet()['nom_medecin'], 'Dr. Alaoui')
+
+    def test_travail_puis_cache(self):
+        """Le rendu passe par le pool ; une seconde demande est servie par le cache"""
+        cle = travaux_pdf.soumettre('certificat', self.certificat.pk)
+        chemin = travaux_pdf.attendre(cle, 60)
+        self.assertEqual(travaux_pdf.etat(cle), 'termine')
+        with open(chemin, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
+        travaux_pdf._travaux.clear()
+        with mock.patch.object(travaux_pdf, '_executor') as executor:
+            self.assertEqual(travaux_pdf.soumettre('certificat', self.certificat.pk), cle)
+        executor.assert_not_called()
+
+    def test_pool_casse(self):
+        """Un processus du pool mort : le pool est remplacé et le rendu soumis au nouveau"""
+        casse = ProcessPoolExecutor(max_workers=1)
+        with self.assertRaises(BrokenProcessPool):
+            casse.submit(os._exit, 1).result(60)
+        travaux_pdf._pool = casse
+
+        cle = travaux_pdf.soumettre('certificat', self.certificat.pk)
+        travaux_pdf.attendre(cle, 60)
+        self.assertEqual(travaux_pdf.etat(cle), 'termine')
+        self.assertIsNot(travaux_pdf._pool, casse)
+
+    def test_travail_inconnu(self):
+        self.assertEqual(travaux_pdf.etat('0' * 64), 'inconnu')
+        with self.assertRaises(KeyError):
+            travaux_pdf.attendre('0' * 64)
+
+    @override_settings(ROOT_URLCONF='core.urls_pdf')
+    def test_vues(self):
+        self.client.force_login(self.utilisateur)
+
+        reponse = self.client.post(f'/certificat/{self.certificat.pk}/soumettre/')
+        self.assertEqual(reponse.status_code, 202)
+        cle = reponse.json()['cle']
+        travaux_pdf.attendre(cle, 60)
+
+        etat = self.client.get(f'/travaux/{cle}/').json()
+        self.assertEqual(etat['etat'], 'termine')
+        fichier = self.client.get(etat['fichier'])
+        self.assertEqual(fichier['Content-Type'], 'application/pdf')
+
+        reponse = self.client.get(f'/certificat/{self.certificat.pk}/')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(b''.join(reponse.streaming_content).startswith(b'%PDF'))
+
+        self.assertEqual(self.client.get('/certificat/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/facture/1/').status_code, 404)
+        self.assertEqual(self.client.get('/travaux/../').status_code, 404)
+
+    @override_settings(ROOT_URLCONF='core.urls_pdf', PDF_ATTENTE=2)
+    def test_attente_plafonnee(self):
+        self.client.force_login(self.utilisateur)
+        with mock.patch.object(travaux_pdf, 'soumettre', return_value='0' * 64), \
+                mock.patch.object(travaux_pdf, 'etat', return_value='en_cours'), \
+                mock.patch.object(travaux_pdf, 'attendre') as attendre:
+            for demande in ('3600', 'inf', '1'):
+                reponse = self.client.get(f'/certificat/{self.certificat.pk}/?attendre={demande}')
+                self.assertEqual(reponse.status_code, 202)
+            self.client.get(f'/certificat/{self.certificat.pk}/?attendre=nan')
+        self.assertEqual([appel.args[1] for appel in attendre.call_args_list], [2, 2, 1])
@@ -0,0 +1,101 @@
+"""
+Tests de l'API de recherche asynchrone
+"""
+
+import asyncio
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core import views_recherche
+from core.models import Patient
+from core.services.recherche_patients import CANDIDATS, CachePrefixes
+
+URL = '/patients/search/'
+
+
+@override_settings(ROOT_URLCONF='core.urls_recherche')
+class TestRechercheAsynchrone(TestCase):
+    """Tests du cache de préfixes et du plafond de résultats"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = get_user_model().objects.create_user('accueil', password='accueil')
+        for numero, (nom, prenom) in enumerate([
+            ('Bennani', 'Salma'), ('Benjelloun', 'Omar'), ('Berrada', 'Sara'), ('Martin', 'Hélène'),
+        ]):
+            Patient.objects.create(
+                nom=nom, prenom=prenom, date_naissance=date(1980, 1, 1), sexe='F',
+                telephone=f'06000000{numero:02d}', adresse='Rabat'
+            )
+
+    def setUp(self):
+        views_recherche.cache_prefixes.vider()
+        for cle in views_recherche._compteurs:
+            views_recherche._compteurs[cle] = 0
+
+    async def _chercher(self, q, **parametres):
+        reponse = await self.async_client.get(URL, {'q': q, **parametres})
+        return reponse.status_code, reponse.json()
+
+    async def test_authentification_requise(self):
+        statut, _ = await self._chercher('ben')
+        self.assertEqual(statut, 401)
+
+    async def test_frappe_servie_par_le_cache(self):
+        await self.async_client.aforce_login(self.utilisateur)
+
+        resultats = []
+        for saisie in ['b', 'be', 'ben', 'benn', 'benn sa']:
+            statut, donnees = await self._chercher(saisie)
+            self.assertEqual(statut, 200)
+            resultats.append([p['nom'] for p in donnees['results']])
+
+        self.assertEqual(resultats[0], ['Benjelloun', 'Bennani', 'Berrada'])
+        self.assertEqual(resultats[2], ['Benjelloun', 'Bennani'])
+        self.assertEqual(resultats[-1], ['Bennani'])
+        # Une seule requête SQL pour toute la frappe
+        self.assertEqual(views_recherche.statistiques()['requetes_sql'], 1)
+        self.assertEqual(views_recherche.statistiques()['cache'], 4)
+
+    async def test_retour_arriere_interroge_la_base(self):
+        await self.async_client.aforce_login(self.utilisateur)
+        await self._chercher('mart')
+        _, donnees = await self._chercher('m')
+        self.assertEqual([p['nom'] for p in donnees['results']], ['Martin'])
+        self.assertEqual(views_recherche.statistiques()['requetes_sql'], 2)
+
+    async def test_saisies_simultanees_servies(self):
+        """L'anti-rebond est côté navigateur : le serveur répond à chaque requête reçue"""
+        await self.async_client.aforce_login(self.utilisateur)
+        (_, ancienne), (_, recente) = await asyncio.gather(self._chercher('be'), self._chercher('ber'))
+        self.assertEqual([p['nom'] for p in ancienne['results']], ['Benjelloun', 'Bennani', 'Berrada'])
+        self.assertEqual([p['nom'] for p in recente['results']], ['Berrada'])
+
+    async def test_plafond_de_resultats(self):
+        await self.async_client.aforce_login(self.utilisateur)
+        _, donnees = await self._chercher('b', limit=2)
+        self.assertEqual(len(donnees['results']), 2)
+        _, donnees = await self._chercher('b', limit='tout')
+        self.assertEqual(len(donnees['results']), 3)
+
+
+class TestCachePrefixes(TestCase):
+    """Tests du cache de préfixes seul"""
+
+    def test_liste_tronquee_non_reutilisee(self):
+        cache = CachePrefixes()
+        cache.ajouter(1, ['b'], [{'id': n} for n in range(CANDIDATS)])
+        self.assertIsNone(cache.chercher(1, ['be']))
+
+    def test_expiration_et_isolation(self):
+        cache = CachePrefixes(duree=-1)
+        patient = {'id': 1, 'nom': 'Tazi', 'prenom': 'Omar', 'telephone': '', 'cin': ''}
+        cache.ajouter(1, ['ta'], [patient])
+        self.assertIsNone(cache.chercher(1, ['taz']))
+
+        cache = CachePrefixes()
+        cache.ajouter(1, ['ta'], [patient])
+        self.assertEqual(cache.chercher(1, ['taz', 'om']), [patient])
+        self.assertIsNone(cache.chercher(2, ['taz']))
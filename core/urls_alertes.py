@@ -0,0 +1,16 @@
+"""
+URLs de l'API du fil d'alertes, à inclure dans config/urls.py:
+
+    path('api/', include('core.urls_alertes')),
+"""
+
+from django.urls import path
+
+from core.views_alertes import alertes_api, compteurs_api, traiter_alerte_api
+
+
+urlpatterns = [
+    path('alertes/', alertes_api, name='api_alertes'),
+    path('alertes/compteurs/', compteurs_api, name='api_alertes_compteurs'),
+    path('alertes/<int:pk>/traiter/', traiter_alerte_api, name='api_alerte_traiter'),
+]
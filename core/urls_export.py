@@ -0,0 +1,14 @@
+"""
+URLs des exports, à inclure dans core/urls.py:
+
+    path('export/', include('core.urls_export')),
+"""
+
+from django.urls import path
+
+from core.views_export import export_csv
+
+
+urlpatterns = [
+    path('<str:nom>.csv', export_csv, name='export_csv'),
+]
@@ -0,0 +1,14 @@
+"""
+URL du point d'exposition des métriques, à inclure dans config/urls.py:
+
+    path('', include('core.urls_metriques')),
+"""
+
+from django.urls import path
+
+from core.views_metriques import metriques_prometheus
+
+
+urlpatterns = [
+    path('metrics', metriques_prometheus, name='metrics'),
+]
@@ -0,0 +1,19 @@
+"""
+URLs des PDF (certificats, ordonnances), à inclure dans config/urls.py:
+
+    path('pdf/', include('core.urls_pdf')),
+"""
+
+from django.urls import path, re_path
+
+from core.views_pdf import etat_pdf, fichier_pdf, impression_pdf, soumettre_pdf, telecharger_pdf
+
+
+urlpatterns = [
+    path('impression/', impression_pdf, name='pdf_impression'),
+    # La clé sert de nom de fichier : seule une empreinte SHA-256 est acceptée
+    re_path(r'^travaux/(?P<cle>[0-9a-f]{64})/$', etat_pdf, name='pdf_travail'),
+    re_path(r'^travaux/(?P<cle>[0-9a-f]{64})/fichier/$', fichier_pdf, name='pdf_fichier'),
+    path('<str:type_document>/<int:pk>/', telecharger_pdf, name='pdf_document'),
+    path('<str:type_document>/<int:pk>/soumettre/', soumettre_pdf, name='pdf_soumettre'),
+]
@@ -0,0 +1,14 @@
+"""
+URLs de l'API de recherche, à inclure dans config/urls.py:
+
+    path('api/', include('core.urls_recherche')),
+"""
+
+from django.urls import path
+
+from core.views_recherche import recherche_patients_api
+
+
+urlpatterns = [
+    path('patients/search/', recherche_patients_api, name='api_patients_search'),
+]
@@ -0,0 +1,63 @@
+"""
+API du fil d'alertes du tableau de bord
+"""
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from core.models import Alerte
+from core.services import flux_alertes
+from core.services.pagination import CurseurInvalide
+
+
+def _non_authentifie(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentification requise'}, status=401)
+    return None
+
+
+@require_GET
+def alertes_api(request):
+    """GET /api/alertes/?statut=active&priorite=haute&curseur=...&taille=25"""
+    if refus := _non_authentifie(request):
+        return refus
+
+    statut = request.GET.get('statut', 'active')
+    priorite = request.GET.get('priorite') or None
+    if statut not in flux_alertes.STATUTS:
+        return JsonResponse({'detail': f'Statut inconnu: {statut}'}, status=400)
+    if priorite and priorite not in flux_alertes.PRIORITES:
+        return JsonResponse({'detail': f'Priorité inconnue: {priorite}'}, status=400)
+
+    try:
+        page = flux_alertes.page(statut, priorite, request.GET.get('curseur'), request.GET.get('taille'))
+    except (CurseurInvalide, ValueError):
+        return JsonResponse({'detail': 'Paramètre curseur ou taille invalide'}, status=400)
+
+    reponse = page.pour_api(flux_alertes.serialiser)
+    reponse['non_lues'] = flux_alertes.compteurs()
+    return JsonResponse(reponse)
+
+
+@require_GET
+def compteurs_api(request):
+    """GET /api/alertes/compteurs/ : alertes non lues par priorité"""
+    if refus := _non_authentifie(request):
+        return refus
+    return JsonResponse(flux_alertes.compteurs())
+
+
+@require_POST
+def traiter_alerte_api(request, pk):
+    """POST /api/alertes/<pk>/traiter/ : marque l'alerte comme lue"""
+    if refus := _non_authentifie(request):
+        return refus
+
+    alerte = get_object_or_404(Alerte, pk=pk)
+    if alerte.statut == 'active':
+        alerte.statut = 'traitee'
+        alerte.date_traitement = timezone.now()
+        alerte.save(update_fields=['statut', 'date_traitement'])
+    return JsonResponse(flux_alertes.serialiser(alerte))
@@ -0,0 +1,28 @@
+"""
+Vues d'export CSV en flux (comptabilité, registres des consultations)
+"""
+
+from datetime import MAXYEAR, MINYEAR
+
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+
+from core.services.export import EXPORTS, lignes_csv
+
+
+@login_required
+def export_csv(request, nom):
+    """Export CSV en flux d'une table, filtré par ?annee=AAAA"""
+    if nom not in EXPORTS:
+        raise Http404(f"Export inconnu: {nom}")
+
+    annee = request.GET.get('annee')
+    # Vérifiée avant la réponse : une erreur dans le flux tronquerait le fichier après le statut 200
+    if annee and not (annee.isascii() and annee.isdigit() and MINYEAR <= int(annee) < MAXYEAR):
+        return HttpResponseBadRequest("Paramètre annee invalide")
+
+    response = StreamingHttpResponse(
+        lignes_csv(nom, annee), content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nom}_{annee or "complet"}.csv"'
+    return response
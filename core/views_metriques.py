@@ -0,0 +1,35 @@
+"""
+Point d'exposition /metrics (format texte Prometheus)
+
+Histogrammes des vues (tous processus) et contre-pression de la file
+d'audit (processus qui répond, étiquette pid).
+
+Réservé aux adresses locales et à celles de PERF_METRIQUES_IPS : les
+noms de vues et les empreintes SQL décrivent l'application.
+
+Réglages (settings):
+    PERF_METRIQUES_IPS  adresses autorisées en plus de 127.0.0.1 et ::1 (défaut: INTERNAL_IPS)
+"""
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+
+from core.services import audit, metriques
+
+ADRESSES_LOCALES = {'127.0.0.1', '::1'}
+
+TYPE_PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def metriques_prometheus(request):
+    """GET /metrics ; ?format=json pour les histogrammes bruts et les requêtes lentes (SQL, vue, origine)"""
+    autorisees = ADRESSES_LOCALES | set(getattr(settings, 'PERF_METRIQUES_IPS', settings.INTERNAL_IPS))
+    if request.META.get('REMOTE_ADDR') not in autorisees:
+        return HttpResponseForbidden("Métriques réservées aux accès locaux")
+
+    total = metriques.charger()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(total.en_dict())
+    return HttpResponse(metriques.exposition(total) + audit.exposition(), content_type=TYPE_PROMETHEUS)
@@ -0,0 +1,127 @@
+"""
+Vues PDF : téléchargement direct et API de travaux (soumettre -> suivre -> télécharger)
+
+Le téléchargement direct sert le PDF en cache s'il existe ; sinon il
+soumet le rendu et l'attend au plus PDF_ATTENTE secondes avant de
+répondre 202 avec l'adresse de suivi. Le rendu lui-même tourne dans le
+pool de core.services.travaux_pdf, jamais dans le worker HTTP.
+
+L'impression groupée envoie en flux un seul PDF pour tous les documents
+d'une période (core.services.impression).
+"""
+
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import (
+    FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+)
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from core.services import impression, travaux_pdf
+
+ATTENTE = 10
+
+
+def _soumettre(type_document, pk):
+    if type_document not in travaux_pdf.SOURCES:
+        raise Http404(f"Document inconnu: {type_document}")
+    queryset = travaux_pdf.SOURCES[type_document][0]
+    try:
+        return travaux_pdf.soumettre(type_document, pk)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"{type_document} {pk} introuvable")
+
+
+def _etat(cle):
+    etat = travaux_pdf.etat(cle)
+    reponse = {'cle': cle, 'etat': etat, 'suivi': reverse('pdf_travail', args=[cle])}
+    if etat == 'termine':
+        reponse['fichier'] = reverse('pdf_fichier', args=[cle])
+    elif etat == 'erreur':
+        reponse['erreur'] = travaux_pdf.erreur(cle)
+    return reponse
+
+
+def _fichier(cle, nom):
+    return FileResponse(
+        open(travaux_pdf.chemin(cle), 'rb'), content_type='application/pdf', filename=nom
+    )
+
+
+@login_required
+@require_POST
+def soumettre_pdf(request, type_document, pk):
+    """POST /pdf/<type>/<id>/soumettre/ -> 202 {cle, etat, suivi}"""
+    cle = _soumettre(type_document, pk)
+    return JsonResponse(_etat(cle), status=202)
+
+
+@login_required
+@require_GET
+def etat_pdf(request, cle):
+    """GET /pdf/travaux/<cle>/ -> {cle, etat, fichier|erreur}"""
+    return JsonResponse(_etat(cle))
+
+
+@login_required
+@require_GET
+def fichier_pdf(request, cle):
+    """GET /pdf/travaux/<cle>/fichier/ -> le PDF rendu"""
+    if travaux_pdf.etat(cle) != 'termine':
+        raise Http404("PDF non disponible")
+    return _fichier(cle, f'{cle[:12]}.pdf')
+
+
+@login_required
+@require_GET
+def telecharger_pdf(request, type_document, pk):
+    """
+    GET /pdf/<type>/<id>/ : le PDF, depuis le cache ou après un rendu court.
+
+    ?attendre=0 rend la main immédiatement (202 tant que le rendu n'est pas fini) ;
+    l'attente ne dépasse jamais PDF_ATTENTE, quelle que soit la valeur demandée.
+    """
+    cle = _soumettre(type_document, pk)
+    plafond = getattr(settings, 'PDF_ATTENTE', ATTENTE)
+    try:
+        delai = float(request.GET.get('attendre', plafond))
+    except ValueError:
+        delai = 0
+    # min() d'abord : 'inf' devient le plafond, 'nan' échoue à delai > 0
+    delai = min(delai, plafond)
+    if travaux_pdf.etat(cle) != 'termine' and delai > 0:
+        try:
+            travaux_pdf.attendre(cle, delai)
+        except Exception:
+            # Délai dépassé ou échec du rendu : rapportés par l'état du travail
+            pass
+    if travaux_pdf.etat(cle) != 'termine':
+        return JsonResponse(_etat(cle), status=202)
+    return _fichier(cle, f'{type_document}_{pk}.pdf')
+
+
+@login_required
+@require_GET
+def impression_pdf(request):
+    """
+    GET /pdf/impression/?debut=AAAA-MM-JJ&fin=AAAA-MM-JJ : ordonnances et
+    certificats de la période en un seul PDF, envoyé en flux (aujourd'hui par défaut).
+    """
+    aujourd_hui = timezone.localdate().isoformat()
+    try:
+        debut = date.fromisoformat(request.GET.get('debut') or aujourd_hui)
+        fin = date.fromisoformat(request.GET.get('fin') or request.GET.get('debut') or aujourd_hui)
+    except ValueError:
+        return HttpResponseBadRequest("Dates attendues au format AAAA-MM-JJ")
+    if fin < debut:
+        return HttpResponseBadRequest("La fin de la période précède son début")
+    if not impression.compter(debut, fin):
+        raise Http404("Aucune ordonnance ni aucun certificat sur la période")
+
+    response = StreamingHttpResponse(impression.flux_pdf(debut, fin), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="impression_{debut}_{fin}.pdf"'
+    return response
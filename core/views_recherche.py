@@ -0,0 +1,86 @@
+"""
+Recherche de patients en direct (autocomplétion de l'accueil)
+
+L'anti-rebond est côté navigateur : la requête ne part que 120 ms après la
+dernière frappe, et la précédente est annulée (AbortController). Le serveur
+répond sans attendre ; une attente côté serveur ne servirait à rien sous
+gunicorn en workers synchrones (une requête à la fois par worker, état par
+processus) et retarderait chaque recherche.
+
+    let minuteur, controleur;
+    champ.addEventListener('input', () => {
+        clearTimeout(minuteur);
+        minuteur = setTimeout(async () => {
+            controleur?.abort();
+            controleur = new AbortController();
+            const reponse = await fetch(`/api/patients/search/?q=${encodeURIComponent(champ.value)}`,
+                                        {signal: controleur.signal});
+            afficher((await reponse.json()).results);
+        }, 120);
+    });
+
+Les saisies qui prolongent la précédente sont servies par le cache de
+préfixes, sans requête SQL.
+
+La vue est asynchrone, ce qui ne profite qu'à un déploiement ASGI (uvicorn,
+daphne) : une requête annulée par le navigateur y annule la tâche de la
+vue. Sous WSGI (config.wsgi, le déploiement actuel), Django l'exécute par
+async_to_sync, comme une vue synchrone.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from core.services import recherche_patients
+from core.services.recherche_patients import CachePrefixes, classer, mots
+
+LONGUEUR_MAX = 100
+MOTS_MAX = 5
+
+cache_prefixes = CachePrefixes()
+
+_compteurs = {'saisies': 0, 'requetes_sql': 0, 'cache': 0, 'annulees': 0}
+
+
+def statistiques():
+    """Répartition des saisies : servies par la base, par le cache, annulées (ASGI)"""
+    return dict(_compteurs)
+
+
+def _limite(valeur):
+    try:
+        return max(1, min(int(valeur), recherche_patients.LIMITE_MAX))
+    except (TypeError, ValueError):
+        return recherche_patients.LIMITE
+
+
+@require_GET
+async def recherche_patients_api(request):
+    """GET /api/patients/search/?q=...&limit=20"""
+    utilisateur = await request.auser()
+    if not utilisateur.is_authenticated:
+        return JsonResponse({'detail': 'Authentification requise'}, status=401)
+
+    termes = mots(request.GET.get('q', '')[:LONGUEUR_MAX])[:MOTS_MAX]
+    if not termes:
+        return JsonResponse({'results': []})
+    limite = _limite(request.GET.get('limit'))
+
+    _compteurs['saisies'] += 1
+    try:
+        candidats = cache_prefixes.chercher(utilisateur.pk, termes)
+        if candidats is None:
+            _compteurs['requetes_sql'] += 1
+            candidats = await sync_to_async(recherche_patients.candidats)(termes)
+            cache_prefixes.ajouter(utilisateur.pk, termes, candidats)
+        else:
+            _compteurs['cache'] += 1
+
+        return JsonResponse({'results': classer(candidats, termes, limite)})
+    except asyncio.CancelledError:
+        # Sous ASGI, déconnexion du client pendant la requête SQL
+        _compteurs['annulees'] += 1
+        raise
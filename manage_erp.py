@@ -12,8 +12,14 @@ Actions disponibles:
     cleanup     - Nettoie les fichiers temporaires
     backup      - Sauvegarde la base de données
     health      - Vérifie la santé du système
-    demo        - Crée des données de démonstration
+    demo        - Crée des données de démonstration (--scale, --seed, --workers)
     stats       - Affiche les statistiques
+    indexes     - Vérifie les index des requêtes critiques (--explain)
+    export      - Exporte une table en CSV (--modele, --annee, --sortie)
+    bench       - Budget de requêtes des pages principales (--scale, --baseline, --enregistrer)
+    imprimer    - Ordonnances et certificats d'une période en un seul PDF (--debut, --fin, --sortie)
+    perf        - Temps de réponse par vue et requêtes SQL lentes (--limite)
+    limiteur    - Coût par requête de la limitation par IP, par stockage
 """
 
 import os
@@ -26,15 +32,58 @@ from datetime import datetime, timedelta
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
-from django.core.management import call_command
 from django.test.utils import get_runner
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ImproperlyConfigured
+from django.apps import apps
+from django.db import connection
 
 # Imports locaux
 from core.models import Patient, RendezVous, Consultation, Facture
 from core.services import statistics_service, maintenance_service
+from core.services import bench_pages, cache_kpi, impression, kpi_journalier, limitation, metriques
+from core.services.apercu import apercu_systeme
+from core.services.export import EXPORTS, lignes_csv
+from core.services.fusion_pdf import FusionPdf
+from core.services.generateur_demo import HISTORIQUE_JOURS, HORIZON_JOURS, generer
+from core.services.periodes import bornes_periode, filtre_periode
+from core.services.sauvegarde import sauvegarder
+from validate_and_clean import executer_validation
+
+
+# Index attendus (voir core/migrations/0009 et 0010)
+INDEX_ATTENDUS = [
+    ('core_rendezvous', ['statut', 'date_heure']),
+    ('core_rendezvous', ['date_heure']),
+    ('core_facture', ['date_facture', 'statut']),
+    ('core_consultation', ['date_consultation']),
+    ('core_alerte', ['statut', 'priorite', 'date_expiration']),
+    ('core_alerte', ['statut', 'priorite', 'date_creation', 'id']),
+    ('core_alerte', ['statut', 'date_creation', 'id']),
+]
+
+
+def requetes_critiques():
+    """Requêtes des statistiques et contrôles de santé dont le plan est surveillé"""
+    Alerte = apps.get_model('core', 'Alerte')
+    now = timezone.now()
+    mois = bornes_periode('mois')
+    
+    return [
+        ("RDV passés encore programmés",
+         RendezVous.objects.filter(date_heure__lt=now, statut='prevu')),
+        ("RDV du mois",
+         RendezVous.objects.filter(filtre_periode(RendezVous, 'date_heure', *mois))),
+        ("Revenus du mois",
+         Facture.objects.filter(filtre_periode(Facture, 'date_facture', *mois), statut='payee')),
+        ("Consultations du jour",
+         Consultation.objects.filter(
+             filtre_periode(Consultation, 'date_consultation', *bornes_periode('jour'))
+         )),
+        ("Alertes actives non expirées",
+         Alerte.objects.filter(statut='active', priorite='haute', date_expiration__gt=now)),
+    ]
 
 
 class ERPManager:
@@ -62,23 +111,20 @@ class ERPManager:
         try:
             # Tests de connectivité base de données
             print("📊 Test de connectivité base de données...")
-            patients_count = Patient.objects.count()
-            rdv_count = RendezVous.objects.count()
-            consultations_count = Consultation.objects.count()
-            factures_count = Facture.objects.count()
+            apercu = apercu_systeme()
             
             print(f"   ✅ Base de données accessible")
-            print(f"   📋 Patients: {patients_count}")
-            print(f"   📅 Rendez-vous: {rdv_count}")
-            print(f"   🩺 Consultations: {consultations_count}")
-            print(f"   💰 Factures: {factures_count}")
+            print(f"   📋 Patients: {apercu['patients']}")
+            print(f"   📅 Rendez-vous: {apercu['rendez_vous']}")
+            print(f"   🩺 Consultations: {apercu['consultations']}")
+            print(f"   💰 Factures: {apercu['factures']}")
             
             # Tests des modèles
             print("\n🔍 Test de l'intégrité des modèles...")
             
             # Vérifier les relations
-            orphan_consultations = Consultation.objects.filter(patient__isnull=True).count()
-            orphan_rdv = RendezVous.objects.filter(patient__isnull=True).count()
+            orphan_consultations = apercu['consultations_orphelines']
+            orphan_rdv = apercu['rdv_orphelins']
             
             if orphan_consultations == 0 and orphan_rdv == 0:
                 print("   ✅ Intégrité des relations OK")
@@ -130,7 +176,7 @@ class ERPManager:
         
         return True
     
-    def validate_system(self):
+    def validate_system(self, workers=1):
         """Valide l'intégrité complète du système"""
         print("🔍 VALIDATION DU SYSTÈME")
         print("=" * 50)
@@ -166,10 +212,15 @@ class ERPManager:
             # Validation des données
             print("\n📋 Validation des données...")
             
-            # Patients avec données manquantes
-            patients_no_name = Patient.objects.filter(nom='').count()
-            if patients_no_name > 0:
-                issues_found.append(f"{patients_no_name} patients sans nom")
+            # Règles de validation des modèles (nom vide, montants négatifs...)
+            rapport = executer_validation(workers=workers)
+            print(f"   ⚡ {rapport['lignes']} lignes validées en {rapport['duree_s']:.2f}s "
+                  f"({workers} worker(s))")
+            for rapport_modele in rapport['modeles']:
+                for entree in rapport_modele['erreurs']:
+                    issues_found.append(
+                        f"{entree['nombre']} {rapport_modele['modele']} - {entree['regle']}"
+                    )
             
             # RDV dans le passé avec statut 'prevu'
             past_rdv = RendezVous.objects.filter(
@@ -179,11 +230,6 @@ class ERPManager:
             if past_rdv > 0:
                 issues_found.append(f"{past_rdv} RDV passés encore programmés")
             
-            # Factures avec montant négatif
-            negative_factures = Facture.objects.filter(montant_total__lt=0).count()
-            if negative_factures > 0:
-                issues_found.append(f"{negative_factures} factures avec montant négatif")
-            
             # Validation de la sécurité
             print("\n🔒 Validation de la sécurité...")
             
@@ -272,25 +318,32 @@ class ERPManager:
         
         return True
     
-    def backup_database(self):
+    def backup_database(self, conserver=7):
         """Crée une sauvegarde de la base de données"""
         print("💾 SAUVEGARDE DE LA BASE DE DONNÉES")
         print("=" * 50)
         
         try:
-            success, result = maintenance_service.backup_database()
-            
-            if success:
+            if connection.vendor not in ('sqlite', 'postgresql'):
+                success, result = maintenance_service.backup_database()
+                if not success:
+                    print(f"❌ Échec de la sauvegarde: {result}")
+                    return False
                 print(f"✅ Sauvegarde créée avec succès!")
                 print(f"📁 Fichier: {result}")
-                
-                # Afficher la taille du fichier
-                if os.path.exists(result):
-                    size_mb = os.path.getsize(result) / (1024 * 1024)
-                    print(f"💾 Taille: {size_mb:.2f} MB")
-            else:
-                print(f"❌ Échec de la sauvegarde: {result}")
-                return False
+                return True
+            
+            # Sauvegarde en ligne : la base reste utilisable pendant la copie
+            rapport = sauvegarder(conserver=conserver)
+            
+            print(f"✅ Sauvegarde créée avec succès!")
+            print(f"📁 Fichier: {rapport['fichier']}")
+            print(f"💾 Taille: {rapport['octets_source'] / (1024 * 1024):.2f} MB "
+                  f"→ {rapport['octets_compresses'] / (1024 * 1024):.2f} MB compressés")
+            print(f"⏱️  Durée: {rapport['duree_s']:.2f}s "
+                  f"({(rapport['octets_par_s'] or 0) / (1024 * 1024):.1f} MB/s)")
+            for ancien in rapport['supprimees']:
+                print(f"🗑️  Ancienne sauvegarde supprimée: {ancien}")
                 
         except Exception as e:
             print(f"❌ ERREUR LORS DE LA SAUVEGARDE: {e}")
@@ -369,55 +422,65 @@ class ERPManager:
         
         return True
     
-    def create_demo_data(self, count=10):
-        """Crée des données de démonstration"""
-        print(f"📊 CRÉATION DE DONNÉES DE DÉMONSTRATION ({count} éléments)")
+    def create_demo_data(self, count=10, graine=42, workers=1):
+        """Crée des données de démonstration (count patients et leur historique)"""
+        print(f"📊 CRÉATION DE DONNÉES DE DÉMONSTRATION ({count:,} patients, graine {graine})")
         print("=" * 50)
         
+        def progression(totaux):
+            print(f"   ⏳ {totaux['patients']:,}/{count:,} patients", end='\r', flush=True)
+        
         try:
-            # Utiliser la commande Django
-            call_command('erp_manager', 'create_sample_data', '--count', str(count))
+            reference = timezone.localdate()
+            rapport = generer(count, graine=graine, workers=workers, reference=reference, progression=progression)
+            print()
+            for table, nombre in rapport['tables'].items():
+                print(f"   • {table}: {nombre:,}")
+            print(f"   ⏱️  {rapport['lignes']:,} lignes en {rapport['duree_s']}s ({rapport['lignes_par_s']:,} lignes/s, {rapport['workers']} processus)")
+            
+            self._rafraichir_kpi(reference)
             print("✅ Données de démonstration créées avec succès!")
             
         except Exception as e:
-            print(f"❌ ERREUR LORS DE LA CRÉATION: {e}")
+            print(f"\n❌ ERREUR LORS DE LA CRÉATION: {e}")
             return False
         
         return True
     
+    def _rafraichir_kpi(self, reference):
+        """bulk_create n'émet pas de signaux : cumul KPI et cache sont remis à jour d'un bloc"""
+        debut = reference - timedelta(days=HISTORIQUE_JOURS)
+        fin = reference + timedelta(days=HORIZON_JOURS + 2)
+        kpi_journalier.reconstruire(debut, fin)
+        cache_kpi.invalider_jours([debut + timedelta(days=n) for n in range((fin - debut).days)])
+    
     def show_statistics(self):
         """Affiche les statistiques complètes"""
         print("📈 STATISTIQUES DU SYSTÈME")
         print("=" * 50)
         
         try:
-            # Statistiques générales
-            total_patients = Patient.objects.count()
-            total_rdv = RendezVous.objects.count()
-            total_consultations = Consultation.objects.count()
-            total_factures = Facture.objects.count()
+            # Tous les indicateurs en un seul aller-retour
+            apercu = apercu_systeme()
             
             print(f"📊 Vue d'ensemble:")
-            print(f"   👥 Patients: {total_patients}")
-            print(f"   📅 Rendez-vous: {total_rdv}")
-            print(f"   🩺 Consultations: {total_consultations}")
-            print(f"   💰 Factures: {total_factures}")
+            print(f"   👥 Patients: {apercu['patients']}")
+            print(f"   📅 Rendez-vous: {apercu['rendez_vous']}")
+            print(f"   🩺 Consultations: {apercu['consultations']}")
+            print(f"   💰 Factures: {apercu['factures']}")
             
             # Statistiques du jour
-            today_stats = statistics_service.get_daily_stats()
-            print(f"\n📅 Aujourd'hui ({today_stats.get('date', 'N/A')}):")
-            print(f"   🩺 Consultations: {today_stats.get('consultations_jour', 0)}")
-            print(f"   💰 Revenus: {today_stats.get('revenus_jour', 0)}€")
-            print(f"   📅 RDV programmés: {today_stats.get('rdv_programmes', 0)}")
+            print(f"\n📅 Aujourd'hui ({apercu['date']}):")
+            print(f"   🩺 Consultations: {apercu['consultations_jour']}")
+            print(f"   💰 Revenus: {apercu['revenus_jour']}€")
+            print(f"   📅 RDV programmés: {apercu['rdv_programmes']}")
             
             # Statistiques du mois
-            now = timezone.now()
-            monthly_stats = statistics_service.get_monthly_stats(now.year, now.month)
-            print(f"\n📆 Ce mois ({monthly_stats.get('periode', 'N/A')}):")
-            print(f"   🩺 Consultations: {monthly_stats.get('consultations_mois', 0)}")
-            print(f"   💰 Revenus: {monthly_stats.get('revenus_mois', 0)}€")
-            print(f"   📊 Revenu moyen: {monthly_stats.get('revenu_moyen', 0)}€")
-            print(f"   👥 Patients uniques: {monthly_stats.get('patients_uniques', 0)}")
+            print(f"\n📆 Ce mois ({apercu['periode']}):")
+            print(f"   🩺 Consultations: {apercu['consultations_mois']}")
+            print(f"   💰 Revenus: {apercu['revenus_mois']}€")
+            print(f"   📊 Revenu moyen: {apercu['revenu_moyen']}€")
+            print(f"   👥 Patients uniques: {apercu['patients_uniques']}")
             
             print("\n✅ Statistiques affichées avec succès!")
             
@@ -426,6 +489,245 @@ class ERPManager:
             return False
         
         return True
+    
+    def check_indexes(self, explain=False):
+        """Vérifie la présence des index composites et le plan des requêtes critiques"""
+        print("🗂️  INDEX DES REQUÊTES CRITIQUES")
+        print("=" * 50)
+        
+        try:
+            missing = []
+            with connection.cursor() as cursor:
+                for table, columns in INDEX_ATTENDUS:
+                    constraints = connection.introspection.get_constraints(cursor, table)
+                    found = any(
+                        info['index'] and info['columns'] == columns
+                        for info in constraints.values()
+                    )
+                    icon = "✅" if found else "❌"
+                    print(f"{icon} {table} ({', '.join(columns)})")
+                    if not found:
+                        missing.append(table)
+            
+            if missing:
+                print("\n💡 Appliquez les migrations: python manage.py migrate core")
+            
+            if explain:
+                # EXPLAIN ANALYZE exécute la requête : réservé aux moteurs qui le supportent
+                options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+                for label, queryset in requetes_critiques():
+                    print(f"\n🔎 {label}")
+                    print(f"   SQL: {queryset.query}")
+                    plan = queryset.explain(**options)
+                    for line in plan.splitlines():
+                        print(f"   {line}")
+            
+        except Exception as e:
+            print(f"❌ ERREUR LORS DE LA VÉRIFICATION DES INDEX: {e}")
+            return False
+        
+        return not missing
+    
+    def export_data(self, modele, annee=None, sortie=None):
+        """Exporte une table en CSV, en flux et à mémoire constante"""
+        print(f"📤 EXPORT CSV: {modele.upper()}")
+        print("=" * 50)
+        
+        sortie = sortie or f"{modele}_{annee or 'complet'}.csv"
+        
+        try:
+            start_time = datetime.now()
+            lignes = 0
+            with open(sortie, 'w', encoding='utf-8', newline='') as f:
+                for ligne in lignes_csv(modele, annee):
+                    f.write(ligne)
+                    lignes += 1
+            # Ni le BOM ni l'en-tête ne sont des lignes de données
+            lignes = max(lignes - 2, 0)
+            duree = (datetime.now() - start_time).total_seconds()
+            
+            print(f"✅ {lignes} ligne(s) exportée(s) en {duree:.2f}s")
+            if duree > 0:
+                print(f"⚡ {lignes / duree:.0f} lignes/s")
+            print(f"📁 Fichier: {sortie}")
+            
+        except Exception as e:
+            print(f"❌ ERREUR LORS DE L'EXPORT: {e}")
+            return False
+        
+        return True
+    
+    def print_documents(self, debut=None, fin=None, sortie=None):
+        """Écrit en un seul PDF les ordonnances et certificats de la période, document par document"""
+        debut = datetime.strptime(debut, '%Y-%m-%d').date() if debut else timezone.localdate()
+        fin = datetime.strptime(fin, '%Y-%m-%d').date() if fin else debut
+        print(f"🖨️  IMPRESSION DU {debut:%d/%m/%Y} AU {fin:%d/%m/%Y}")
+        print("=" * 50)
+        
+        nombre = impression.compter(debut, fin)
+        if not nombre:
+            print("ℹ️  Aucune ordonnance ni aucun certificat sur la période")
+            return True
+        
+        sortie = sortie or f"impression_{debut}_{fin}.pdf"
+        
+        try:
+            start_time = datetime.now()
+            fusion = FusionPdf()
+            with open(sortie, 'wb') as f:
+                for morceau in impression.flux_pdf(debut, fin, fusion):
+                    f.write(morceau)
+            duree = (datetime.now() - start_time).total_seconds()
+            
+            print(f"✅ {fusion.documents} document(s), {len(fusion.pages)} page(s) en {duree:.2f}s")
+            print(f"📁 Fichier: {sortie}")
+            
+        except Exception as e:
+            print(f"❌ ERREUR LORS DE L'IMPRESSION: {e}")
+            return False
+        
+        return True
+    
+    def show_performance(self, limite=15):
+        """Résumé des métriques de PerformanceMiddleware, tous processus confondus"""
+        print("📈 PERFORMANCE DES VUES")
+        print("=" * 50)
+        
+        total = metriques.charger(inclure_courant=False)
+        vues = total.resume()
+        if not vues:
+            print(f"ℹ️  Aucune mesure dans {metriques.dossier()}")
+            print("💡 Activez core.middleware_performance.PerformanceMiddleware et laissez tourner le serveur")
+            return True
+        
+        def ms(valeurs):
+            return '/'.join('-' if valeur is None else f"{valeur:.0f}" for valeur in valeurs)
+        
+        print(f"{'Vue':<44}{'Appels':>8}  {'Durée ms p50/95/99':<20}{'SQL ms p50/95/99':<18}{'Requêtes p50/95/99':<18}")
+        for vue, nombre, quantiles in vues[:limite]:
+            print(f"{vue[:43]:<44}{nombre:>8}  {ms(quantiles['duree']):<20}{ms(quantiles['sql']):<18}"
+                  f"{ms(quantiles['requetes']):<18}")
+        if len(vues) > limite:
+            print(f"   ... {len(vues) - limite} autre(s) vue(s)")
+        
+        lentes = total.requetes_lentes()
+        print(f"\n🐢 REQUÊTES SQL LENTES ({len(lentes)} empreinte(s))")
+        for lente in lentes[:limite]:
+            print(f"   • {lente['nombre']} x, {lente['total_ms']:.0f} ms au total, max {lente['max_ms']:.0f} ms"
+                  f" — {lente['vue']}")
+            print(f"     {lente['sql'][:200]}")
+            print(f"     depuis {lente['origine']}")
+        
+        return True
+    
+    def bench_limiter(self):
+        """Microbenchmark de SecurityMiddleware : coût d'un appel par stockage des compteurs"""
+        import shutil
+        import tempfile
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from core.middleware_securite import SecurityMiddleware
+        
+        print(f"🚦 LIMITATION PAR IP (budget {limitation.BUDGET_US} µs par requête)")
+        print("=" * 50)
+        
+        # Compteurs à part : ni le fichier SQLite ni les clés du cache de production ne sont touchés
+        dossier = tempfile.mkdtemp()
+        
+        def isole(backend):
+            if backend == 'sqlite':
+                return limitation.LimiteurSqlite(limite=10**9, chemin=os.path.join(dossier, 'bench.sqlite3'))
+            if backend == 'cache':
+                return limitation.LimiteurCache(limite=10**9, prefixe=f'bench-limite:{os.getpid()}')
+            return limitation.LimiteurMemoire(limite=10**9)
+        
+        limiteurs = []
+        for backend in limitation.BACKENDS:
+            nom = f"cache ({getattr(settings, 'LIMITE_CACHE_ALIAS', 'default')})" if backend == 'cache' else backend
+            limiteurs.append((nom, isole(backend)))
+        # Le middleware complet (type de stockage configuré), avec une vue qui ne fait rien
+        middleware = SecurityMiddleware(lambda request: HttpResponse())
+        middleware.limiteur = isole(getattr(settings, 'LIMITE_BACKEND', 'memoire'))
+        requete = RequestFactory().get('/patients/')
+        
+        class _Appel:
+            def verifier(self, cle):
+                requete.META['REMOTE_ADDR'] = cle
+                return middleware(requete)
+        
+        limiteurs.append((f"middleware ({getattr(settings, 'LIMITE_BACKEND', 'memoire')})", _Appel()))
+        
+        succes = True
+        try:
+            for nom, limiteur in limiteurs:
+                try:
+                    cout = limitation.mesurer(limiteur)
+                except Exception as e:
+                    print(f"❌ {nom:<24} {e}")
+                    succes = False
+                    continue
+                dans_budget = cout <= limitation.BUDGET_US
+                succes = succes and dans_budget
+                print(f"{'✅' if dans_budget else '❌'} {nom:<24} {cout:>8.1f} µs")
+        finally:
+            for _, limiteur in limiteurs[:-1]:
+                limiteur.fermer()
+            middleware.limiteur.fermer()
+            shutil.rmtree(dossier, ignore_errors=True)
+        
+        return succes
+    
+    def run_benchmark(self, echelle=1000, fichier='bench_baseline.json', enregistrer=False):
+        """Mesure les pages principales sur une base de test générée, et vérifie leur budget"""
+        from django.contrib.auth import get_user_model
+        from django.test import Client
+        from django.test.utils import setup_test_environment, teardown_test_environment
+        
+        print(f"⏱️  BENCHMARK DES PAGES ({echelle:,} patients de démo)")
+        print("=" * 50)
+        
+        # Base de test jetable : la base réelle n'est ni lue ni modifiée
+        setup_test_environment()
+        ancien_nom = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            reference = timezone.localdate()
+            generer(echelle, reference=reference)
+            self._rafraichir_kpi(reference)
+            
+            utilisateur = get_user_model().objects.create_superuser('bench', 'bench@example.com', 'bench')
+            client = Client()
+            client.force_login(utilisateur)
+            mesures = bench_pages.mesurer(client)
+        except Exception as e:
+            print(f"❌ ERREUR LORS DU BENCHMARK: {e}")
+            return False
+        finally:
+            connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+            teardown_test_environment()
+        
+        print(f"{'Page':<16}{'Statut':>7}{'Requêtes':>10}{'SQL ms':>10}{'Total ms':>10}{'Mémoire Mo':>12}")
+        for nom, mesure in mesures.items():
+            print(f"{nom:<16}{mesure['statut']:>7}{mesure['requetes']:>10}{mesure['sql_ms']:>10}"
+                  f"{mesure['temps_ms']:>10}{mesure['memoire_mo']:>12}")
+        
+        precedente = bench_pages.charger_reference(fichier)
+        echecs = bench_pages.comparer(mesures, None if enregistrer else precedente)
+        if precedente is None and not enregistrer:
+            print(f"ℹ️  Pas de référence {fichier} : seuls les budgets sont vérifiés (--enregistrer pour la créer)")
+        
+        if echecs:
+            print(f"\n❌ {len(echecs)} dépassement(s):")
+            for nom, message in echecs:
+                print(f"   • {nom}: {message}")
+        else:
+            print("\n✅ Toutes les pages respectent leur budget")
+        
+        if enregistrer:
+            bench_pages.enregistrer_reference(fichier, mesures, echelle)
+            print(f"💾 Référence enregistrée: {fichier}")
+        
+        return not echecs
 
 
 def main():
@@ -437,7 +739,7 @@ def main():
     
     parser.add_argument(
         'action',
-        choices=['test', 'validate', 'cleanup', 'backup', 'health', 'demo', 'stats'],
+        choices=['test', 'validate', 'cleanup', 'backup', 'health', 'demo', 'stats', 'indexes', 'export', 'bench', 'imprimer', 'perf', 'limiteur'],
         help='Action à exécuter'
     )
     
@@ -448,12 +750,92 @@ def main():
         help='Nombre d\'éléments pour les données de démo'
     )
     
+    parser.add_argument(
+        '--scale',
+        type=float,
+        help='Nombre de patients de démo ou du benchmark, notation scientifique acceptée (ex: 1e6)'
+    )
+    
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=42,
+        help='Graine des données de démo (même graine, mêmes données)'
+    )
+    
     parser.add_argument(
         '--force',
         action='store_true',
         help='Force l\'exécution sans confirmation'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Nombre de processus pour la validation et les données de démo'
+    )
+    
+    parser.add_argument(
+        '--explain',
+        action='store_true',
+        help='Affiche le plan d\'exécution des requêtes critiques'
+    )
+    
+    parser.add_argument(
+        '--modele',
+        choices=list(EXPORTS),
+        default='factures',
+        help='Table à exporter'
+    )
+    
+    parser.add_argument(
+        '--annee',
+        type=int,
+        help='Année à exporter (toutes par défaut)'
+    )
+    
+    parser.add_argument(
+        '--sortie',
+        help='Fichier de sortie (CSV de l\'export, PDF de l\'impression)'
+    )
+    
+    parser.add_argument(
+        '--debut',
+        help='Premier jour à imprimer, AAAA-MM-JJ (aujourd\'hui par défaut)'
+    )
+    
+    parser.add_argument(
+        '--fin',
+        help='Dernier jour à imprimer, AAAA-MM-JJ (--debut par défaut)'
+    )
+    
+    parser.add_argument(
+        '--conserver',
+        type=int,
+        default=7,
+        help='Nombre de sauvegardes conservées'
+    )
+    
+    parser.add_argument(
+        '--baseline',
+        default='bench_baseline.json',
+        help='Fichier JSON de référence du benchmark'
+    )
+    
+    parser.add_argument(
+        '--enregistrer',
+        action='store_true',
+        help='Enregistre les mesures du benchmark comme nouvelle référence'
+    )
+    
+    parser.add_argument(
+        '--limite',
+        type=int,
+        default=15,
+        help='Nombre de vues et de requêtes lentes affichées par perf'
+    )
+    
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -472,17 +854,29 @@ def main():
     if args.action == 'test':
         success = manager.test_system(args.verbose)
     elif args.action == 'validate':
-        success = manager.validate_system()
+        success = manager.validate_system(args.workers)
     elif args.action == 'cleanup':
         success = manager.cleanup_system(args.force)
     elif args.action == 'backup':
-        success = manager.backup_database()
+        success = manager.backup_database(args.conserver)
     elif args.action == 'health':
         success = manager.check_health()
     elif args.action == 'demo':
-        success = manager.create_demo_data(args.count)
+        success = manager.create_demo_data(int(args.scale or args.count), args.seed, args.workers)
     elif args.action == 'stats':
         success = manager.show_statistics()
+    elif args.action == 'indexes':
+        success = manager.check_indexes(args.explain)
+    elif args.action == 'export':
+        success = manager.export_data(args.modele, args.annee, args.sortie)
+    elif args.action == 'bench':
+        success = manager.run_benchmark(int(args.scale or 1000), args.baseline, args.enregistrer)
+    elif args.action == 'imprimer':
+        success = manager.print_documents(args.debut, args.fin, args.sortie)
+    elif args.action == 'perf':
+        success = manager.show_performance(args.limite)
+    elif args.action == 'limiteur':
+        success = manager.bench_limiter()
     
     # Code de sortie
     if success:
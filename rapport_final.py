@@ -81,7 +81,7 @@ def rapport_final():
     # 5. EXEMPLES DE PDF
     print("\n📄 5. EXEMPLES DE PDF DISPONIBLES")
     print("-" * 30)
-    certificats = CertificatMedical.objects.all()
+    certificats = CertificatMedical.objects.select_related('patient')
     for cert in certificats:
         print(f"   📋 {cert.numero_certificat} - {cert.patient} ({cert.get_type_certificat_display()})")
         print(f"      🔗 http://127.0.0.1:8000/certificats/{cert.id}/pdf/")
@@ -58,7 +58,7 @@ def show_available_certificates():
     
     from core.models_certificates import CertificatMedical
     
-    certificats = CertificatMedical.objects.all()
+    certificats = CertificatMedical.objects.select_related('patient')
     for cert in certificats:
         print(f"   ID: {cert.id} - {cert.numero_certificat} - {cert.patient} - {cert.type_certificat}")
 
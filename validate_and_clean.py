@@ -4,7 +4,13 @@ Script de validation et de nettoyage pour l'application Cabinet Médical
 
 import os
 import sys
+import json
+import time
+import argparse
 import django
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
 from django.conf import settings
 from django.core.management import execute_from_command_line
 
@@ -12,65 +18,422 @@ from django.core.management import execute_from_command_line
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
+from django.core.validators import (
+    MinValueValidator, MaxValueValidator, MaxLengthValidator, DecimalValidator
+)
+from django.db import connections, models
+from django.db.models import Exists, Max, Min, OuterRef, Q
+from django.db.models.functions import Length
 from core.models import Patient, RendezVous, Consultation, Ordonnance, Facture
 from core.models_config import CabinetConfig, NotificationConfig
+from core.services.periodes import bornes_mois, filtre_periode
 
 
-def valider_donnees():
+# Taille des lots parcourus par clé primaire croissante
+TAILLE_LOT = 2000
+
+# Nombre maximum d'identifiants conservés par règle dans le rapport
+MAX_EXEMPLES = 100
+
+# Longueur maximale de la valeur fautive citée dans le message
+MAX_VALEUR = 80
+
+# Bornes métier de la durée prévue d'un rendez-vous (minutes)
+DUREE_PREVUE_MIN = 5
+DUREE_PREVUE_MAX = 480
+
+# Tranches de clés primaires par worker, pour lisser les écarts de charge
+TRANCHES_PAR_WORKER = 4
+
+# Modèles validés, dans l'ordre du rapport
+MODELES_VALIDES = [
+    ('Patient', Patient),
+    ('RDV', RendezVous),
+    ('Consultation', Consultation),
+    ('Facture', Facture),
+]
+
+# Règles métier exprimées directement en SQL, en plus de celles déduites
+# des champs (un nom de patient vide est couvert par blank=False).
+# Chaque règle : (libellé, prédicat, colonne dont la valeur est citée)
+REGLES_METIER = {
+    'RDV': [
+        (f"duree_prevue hors bornes [{DUREE_PREVUE_MIN}, {DUREE_PREVUE_MAX}]",
+         lambda qs: qs.filter(Q(duree_prevue__lt=DUREE_PREVUE_MIN) | Q(duree_prevue__gt=DUREE_PREVUE_MAX)),
+         'duree_prevue'),
+    ],
+    'Facture': [
+        ("montant_total négatif", lambda qs: qs.filter(montant_total__lt=0), 'montant_total'),
+    ],
+}
+
+
+def _message(colonne, valeur):
+    """Message d'une règle SQL : la valeur fautive, tronquée"""
+    # Chaînes entre guillemets, pour voir les espaces et les valeurs vides
+    texte = repr(valeur) if isinstance(valeur, str) else str(valeur)
+    if len(texte) > MAX_VALEUR:
+        texte = texte[:MAX_VALEUR - 1] + '…'
+    return f"{colonne} = {texte}"
+
+
+def _regles_champ(champ):
+    """
+    Traduit les contrôles de clean_fields() d'un champ en prédicats SQL.
+
+    Retourne (règles, complet) : chaque règle est (libellé, prédicat,
+    colonne citée dans le message) et complet indique que tous les contrôles
+    du champ sont couverts et qu'aucune vérification ligne à ligne n'est
+    nécessaire pour lui.
+    """
+    nom = champ.attname
+    regles = []
+    complet = True
+
+    if champ.is_relation:
+        cible = champ.related_model._base_manager.values('pk')
+        regles.append((
+            f"{champ.name}: référence inexistante",
+            lambda qs, nom=nom, cible=cible: qs.filter(
+                **{f'{nom}__isnull': False}
+            ).exclude(**{f'{nom}__in': cible}),
+            nom,
+        ))
+        return regles, complet
+
+    if not champ.blank and champ.empty_strings_allowed:
+        regles.append((
+            f"{champ.name}: champ obligatoire vide",
+            lambda qs, nom=nom: qs.filter(**{nom: ''}),
+            nom,
+        ))
+
+    if champ.choices:
+        valeurs = [valeur for valeur, _ in champ.flatchoices]
+        if champ.blank:
+            valeurs.append('')
+        regles.append((
+            f"{champ.name}: valeur hors choix",
+            lambda qs, nom=nom, valeurs=valeurs: qs.filter(
+                **{f'{nom}__isnull': False}
+            ).exclude(**{f'{nom}__in': valeurs}),
+            nom,
+        ))
+
+    for validateur in champ.validators:
+        if isinstance(validateur, MinValueValidator):
+            regles.append((
+                f"{champ.name}: inférieur à {validateur.limit_value}",
+                lambda qs, nom=nom, v=validateur.limit_value: qs.filter(**{f'{nom}__lt': v}),
+                nom,
+            ))
+        elif isinstance(validateur, MaxValueValidator):
+            regles.append((
+                f"{champ.name}: supérieur à {validateur.limit_value}",
+                lambda qs, nom=nom, v=validateur.limit_value: qs.filter(**{f'{nom}__gt': v}),
+                nom,
+            ))
+        elif isinstance(validateur, MaxLengthValidator):
+            regles.append((
+                f"{champ.name}: plus de {validateur.limit_value} caractères",
+                lambda qs, nom=nom, v=validateur.limit_value: qs.annotate(
+                    _longueur=Length(nom)
+                ).filter(_longueur__gt=v),
+                nom,
+            ))
+        elif isinstance(validateur, DecimalValidator) and validateur.max_digits is not None:
+            limite = Decimal(10) ** (validateur.max_digits - (validateur.decimal_places or 0))
+            regles.append((
+                f"{champ.name}: dépasse {validateur.max_digits} chiffres",
+                lambda qs, nom=nom, v=limite: qs.filter(
+                    Q(**{f'{nom}__gte': v}) | Q(**{f'{nom}__lte': -v})
+                ),
+                nom,
+            ))
+        else:
+            # Validateur arbitraire (regex, email...) : contrôle ligne à ligne
+            complet = False
+
+    return regles, complet
+
+
+def _regles_unicite(modele):
+    """
+    Traduit les contrôles de validate_unique() et validate_constraints() en
+    prédicats SQL : une ligne est en doublon si une autre ligne porte les
+    mêmes valeurs. Les contraintes conditionnelles ou portant sur des
+    expressions ne sont pas couvertes.
+    """
+    meta = modele._meta
+    ensembles = [(champ.name,) for champ in meta.concrete_fields if champ.unique and not champ.primary_key]
+    ensembles += [tuple(noms) for noms in meta.unique_together]
+    ensembles += [tuple(contrainte.fields) for contrainte in meta.total_unique_constraints]
+
+    regles = []
+    for noms in dict.fromkeys(ensembles):
+        colonnes = [meta.get_field(nom).attname for nom in noms]
+        # NULL n'est égal à rien en SQL : comme validate_unique(), les
+        # valeurs nulles ne comptent pas comme doublons
+        regles.append((
+            f"{', '.join(noms)}: valeur en double",
+            lambda qs, colonnes=colonnes: qs.filter(Exists(
+                modele._base_manager.filter(
+                    **{colonne: OuterRef(colonne) for colonne in colonnes}
+                ).exclude(pk=OuterRef('pk'))
+            )),
+            colonnes[0],
+        ))
+    return regles
+
+
+def _plan_validation(libelle, modele):
+    """Construit les règles SQL et la liste des champs à valider ligne à ligne"""
+    regles = list(REGLES_METIER.get(libelle, []))
+    regles.extend(_regles_unicite(modele))
+    champs_ligne = []
+
+    for champ in modele._meta.concrete_fields:
+        if champ.primary_key:
+            continue
+        regles_champ, complet = _regles_champ(champ)
+        regles.extend(regles_champ)
+        if not complet:
+            champs_ligne.append(champ)
+
+    # Un clean() surchargé ne peut pas être traduit en SQL
+    clean_personnalise = modele.clean is not models.Model.clean
+
+    return regles, champs_ligne, clean_personnalise
+
+
+def _bornes_lots(modele, taille_lot, pk_min=None, pk_max=None):
+    """Génère les intervalles [début, fin] de clés primaires, lot par lot"""
+    queryset = modele._base_manager.order_by('pk')
+    if pk_min is not None:
+        queryset = queryset.filter(pk__gte=pk_min)
+    if pk_max is not None:
+        queryset = queryset.filter(pk__lte=pk_max)
+
+    dernier = None
+    while True:
+        lot = queryset if dernier is None else queryset.filter(pk__gt=dernier)
+        pks = list(lot.values_list('pk', flat=True)[:taille_lot])
+        if not pks:
+            return
+        yield pks[0], pks[-1], len(pks)
+        dernier = pks[-1]
+
+
+def valider_modele(libelle, modele, taille_lot=TAILLE_LOT, pk_min=None, pk_max=None):
+    """
+    Valide un modèle lot par lot et retourne son rapport.
+
+    Les règles exprimables en SQL (unicité comprise) sont évaluées en une
+    requête par lot ; full_clean() n'est remplacé ligne à ligne que pour les
+    validateurs arbitraires et les clean() personnalisés.
+    """
+    regles, champs_ligne, clean_personnalise = _plan_validation(libelle, modele)
+    champs_exclus = [
+        champ.name for champ in modele._meta.concrete_fields
+        if champ not in champs_ligne
+    ]
+    relations = [champ.name for champ in modele._meta.concrete_fields if champ.is_relation]
+
+    erreurs = {}
+    lignes = 0
+    debut = time.perf_counter()
+
+    def noter(regle, pk, message):
+        entree = erreurs.setdefault(regle, {'regle': regle, 'nombre': 0, 'exemples': []})
+        entree['nombre'] += 1
+        if len(entree['exemples']) < MAX_EXEMPLES:
+            entree['exemples'].append({'id': pk, 'message': message})
+
+    for borne_min, borne_max, taille in _bornes_lots(modele, taille_lot, pk_min, pk_max):
+        lignes += taille
+        lot = modele._base_manager.filter(pk__gte=borne_min, pk__lte=borne_max)
+
+        for regle, predicat, colonne in regles:
+            for pk, valeur in predicat(lot).order_by('pk').values_list('pk', colonne):
+                noter(regle, pk, _message(colonne, valeur))
+
+        if not champs_ligne and not clean_personnalise:
+            continue
+
+        if clean_personnalise:
+            # clean() peut lire les relations : on les charge avec le lot
+            objets = lot.select_related(*relations).order_by('pk')
+        else:
+            objets = lot.only('pk', *[champ.attname for champ in champs_ligne]).order_by('pk')
+
+        for objet in objets:
+            try:
+                if champs_ligne:
+                    objet.clean_fields(exclude=champs_exclus)
+                if clean_personnalise:
+                    objet.clean()
+            except ValidationError as e:
+                for champ, messages in getattr(e, 'message_dict', {NON_FIELD_ERRORS: e.messages}).items():
+                    noter(f"{champ}: validation", objet.pk, "; ".join(messages))
+
+    duree = time.perf_counter() - debut
+    return {
+        'modele': libelle,
+        'lignes': lignes,
+        'duree_s': round(duree, 3),
+        'lignes_par_s': round(lignes / duree, 1) if duree > 0 else None,
+        'regles_sql': len(regles),
+        'champs_ligne_a_ligne': [champ.name for champ in champs_ligne],
+        'erreurs': sorted(erreurs.values(), key=lambda entree: entree['regle']),
+    }
+
+
+def _decouper_modele(modele, nombre_tranches):
+    """Découpe l'espace des clés primaires d'un modèle en tranches contiguës"""
+    bornes = modele._base_manager.aggregate(pk_min=Min('pk'), pk_max=Max('pk'))
+    if bornes['pk_min'] is None:
+        return [(None, None)]
+
+    pk_min, pk_max = bornes['pk_min'], bornes['pk_max']
+    pas = max(1, -(-(pk_max - pk_min + 1) // nombre_tranches))
+    return [
+        (debut, min(debut + pas - 1, pk_max))
+        for debut in range(pk_min, pk_max + 1, pas)
+    ]
+
+
+def _initialiser_worker():
+    """Ferme les connexions héritées : chaque worker ouvre la sienne"""
+    connections.close_all()
+
+
+def _valider_tranche(libelle, pk_min, pk_max, taille_lot):
+    """Tâche exécutée dans un worker : valide une tranche de clés primaires"""
+    modele = dict(MODELES_VALIDES)[libelle]
+    # Horloge murale : comparable d'un processus à l'autre, au contraire de perf_counter()
+    debut = time.time()
+    rapport = valider_modele(libelle, modele, taille_lot, pk_min, pk_max)
+    rapport['execution'] = (debut, time.time())
+    return rapport
+
+
+def _fusionner_rapports(libelle, rapports):
+    """
+    Fusionne les rapports des tranches d'un même modèle, dans l'ordre des pk.
+
+    duree_s est la durée murale du modèle, du début d'exécution de sa
+    première tranche à la fin de la dernière : c'est elle qui montre le gain
+    des workers, sans compter l'attente des modèles précédents dans la
+    file. duree_tranches_s est la somme des durées des tranches.
+    """
+    erreurs = {}
+    for rapport in rapports:
+        for entree in rapport['erreurs']:
+            fusion = erreurs.setdefault(entree['regle'], {'regle': entree['regle'], 'nombre': 0, 'exemples': []})
+            fusion['nombre'] += entree['nombre']
+            place = MAX_EXEMPLES - len(fusion['exemples'])
+            fusion['exemples'].extend(entree['exemples'][:place])
+
+    lignes = sum(rapport['lignes'] for rapport in rapports)
+    debuts, fins = zip(*(rapport['execution'] for rapport in rapports))
+    duree_murale = max(fins) - min(debuts)
+    duree_tranches = sum(rapport['duree_s'] for rapport in rapports)
+    return {
+        'modele': libelle,
+        'lignes': lignes,
+        'duree_s': round(duree_murale, 3),
+        'lignes_par_s': round(lignes / duree_murale, 1) if duree_murale > 0 else None,
+        'duree_tranches_s': round(duree_tranches, 3),
+        'tranches': len(rapports),
+        'regles_sql': rapports[0]['regles_sql'],
+        'champs_ligne_a_ligne': rapports[0]['champs_ligne_a_ligne'],
+        'erreurs': sorted(erreurs.values(), key=lambda entree: entree['regle']),
+    }
+
+
+def executer_validation(taille_lot=TAILLE_LOT, workers=1):
+    """
+    Valide tous les modèles et retourne le rapport global.
+
+    Avec workers > 1, chaque modèle est découpé en tranches de clés
+    primaires réparties sur un pool de processus ; les rapports sont
+    fusionnés dans l'ordre des modèles puis des tranches.
+    """
+    debut = time.perf_counter()
+
+    if workers > 1:
+        taches = [
+            (libelle, pk_min, pk_max)
+            for libelle, modele in MODELES_VALIDES
+            for pk_min, pk_max in _decouper_modele(modele, workers * TRANCHES_PAR_WORKER)
+        ]
+        # Les connexions du parent ne doivent pas être partagées après fork
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_worker) as pool:
+            futures = [
+                pool.submit(_valider_tranche, libelle, pk_min, pk_max, taille_lot)
+                for libelle, pk_min, pk_max in taches
+            ]
+            resultats = [future.result() for future in futures]
+
+        rapports = [
+            _fusionner_rapports(libelle, [
+                resultat for (tache_libelle, _, _), resultat in zip(taches, resultats)
+                if tache_libelle == libelle
+            ])
+            for libelle, _ in MODELES_VALIDES
+        ]
+    else:
+        rapports = [
+            valider_modele(libelle, modele, taille_lot)
+            for libelle, modele in MODELES_VALIDES
+        ]
+
+    duree = time.perf_counter() - debut
+    total_lignes = sum(rapport['lignes'] for rapport in rapports)
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'taille_lot': taille_lot,
+        'workers': workers,
+        'lignes': total_lignes,
+        'erreurs': sum(
+            entree['nombre'] for rapport in rapports for entree in rapport['erreurs']
+        ),
+        'duree_s': round(duree, 3),
+        'lignes_par_s': round(total_lignes / duree, 1) if duree > 0 else None,
+        'modeles': rapports,
+    }
+
+
+def valider_donnees(taille_lot=TAILLE_LOT, fichier_rapport=None, workers=1):
     """Valide toutes les données de l'application"""
     print("🔍 Validation des données en cours...")
     
-    erreurs = []
-    
-    # Validation des patients
-    patients_invalides = []
-    for patient in Patient.objects.all():
-        try:
-            patient.full_clean()
-        except ValidationError as e:
-            patients_invalides.append(f"Patient {patient.id}: {e}")
-    
-    if patients_invalides:
-        erreurs.extend(patients_invalides)
-    
-    # Validation des rendez-vous
-    rdv_invalides = []
-    for rdv in RendezVous.objects.all():
-        try:
-            rdv.full_clean()
-        except ValidationError as e:
-            rdv_invalides.append(f"RDV {rdv.id}: {e}")
-    
-    if rdv_invalides:
-        erreurs.extend(rdv_invalides)
-    
-    # Validation des consultations
-    consultations_invalides = []
-    for consultation in Consultation.objects.all():
-        try:
-            consultation.full_clean()
-        except ValidationError as e:
-            consultations_invalides.append(f"Consultation {consultation.id}: {e}")
-    
-    if consultations_invalides:
-        erreurs.extend(consultations_invalides)
-    
-    # Validation des factures
-    factures_invalides = []
-    for facture in Facture.objects.all():
-        try:
-            facture.full_clean()
-        except ValidationError as e:
-            factures_invalides.append(f"Facture {facture.id}: {e}")
-    
-    if factures_invalides:
-        erreurs.extend(factures_invalides)
-    
-    if erreurs:
+    rapport_global = executer_validation(taille_lot, workers)
+    rapports = rapport_global['modeles']
+    total_erreurs = rapport_global['erreurs']
+    
+    for rapport in rapports:
+        print(f"  📋 {rapport['modele']}: {rapport['lignes']} lignes "
+              f"en {rapport['duree_s']:.2f}s ({rapport['lignes_par_s'] or 0:.0f} lignes/s)")
+    
+    if fichier_rapport:
+        with open(fichier_rapport, 'w', encoding='utf-8') as f:
+            json.dump(rapport_global, f, ensure_ascii=False, indent=2)
+        print(f"  📁 Rapport JSON: {fichier_rapport}")
+    
+    print(f"  ⚡ {rapport_global['lignes']} lignes en {rapport_global['duree_s']:.2f}s "
+          f"({rapport_global['lignes_par_s'] or 0:.0f} lignes/s, {workers} worker(s))")
+    
+    if total_erreurs:
         print("❌ Erreurs de validation trouvées:")
-        for erreur in erreurs:
-            print(f"  - {erreur}")
+        for rapport in rapports:
+            for entree in rapport['erreurs']:
+                ids = ", ".join(str(exemple['id']) for exemple in entree['exemples'][:10])
+                suite = "..." if entree['nombre'] > 10 else ""
+                print(f"  - {rapport['modele']} [{entree['regle']}]: "
+                      f"{entree['nombre']} ligne(s) (ids {ids}{suite})")
         return False
     else:
         print("✅ Toutes les données sont valides!")
@@ -198,9 +561,9 @@ def afficher_statistiques():
     from django.db.models import Sum
     from django.utils import timezone
     
-    today = timezone.now().date()
+    today = timezone.localdate()
     revenus_mois = Facture.objects.filter(
-        date_facture__month=today.month,
+        filtre_periode(Facture, 'date_facture', *bornes_mois(today.year, today.month)),
         statut='payee'
     ).aggregate(total=Sum('montant_total'))['total'] or 0
     
@@ -212,8 +575,16 @@ def main():
     print("🏥 Validation et nettoyage de l'application Cabinet Médical")
     print("=" * 60)
     
+    parser = argparse.ArgumentParser(description="Validation et nettoyage du cabinet médical")
+    parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT,
+                        help="Nombre de lignes validées par lot")
+    parser.add_argument('--rapport', help="Fichier JSON du rapport de validation")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Nombre de processus de validation en parallèle")
+    args = parser.parse_args()
+    
     # Validation des données
-    donnees_valides = valider_donnees()
+    donnees_valides = valider_donnees(args.taille_lot, args.rapport, args.workers)
     
     # Vérification de la configuration
     config_complete = verifier_configuration()